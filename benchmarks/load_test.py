@@ -0,0 +1,489 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+"""
+Нагрузочный тест анализатора.
+
+Запускает локальную замену API ИИ (benchmarks.mock_openai) и приложение (uvicorn) в отдельных процессах,
+направляет анализатор на замену через AI_BASE_URL и нагружает `/analyzer/analyze`, `/analyzer/ai-analyze`
+и `/analyzer/ai-analyze-package` на заданных уровнях параллельности. По каждому сценарию и уровню
+измеряются пропускная способность, задержки p50/p95/p99 и пиковая память процессов приложения.
+Результаты записываются в JSON; с `--baseline` прогон сравнивается с результатами предыдущего релиза
+и завершается с кодом 1 при регрессии больше `--max-regression`.
+
+Запуск:
+    python -m benchmarks.load_test --concurrency 1,8,32 --requests 200 --output bench.json
+    python -m benchmarks.load_test --baseline bench-0.0.17.json --max-regression 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.mock_openai import MockSettings
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_CORPUS = ROOT / "smart_code_analyzer" / "backend"
+SCENARIOS = ("analyze", "ai-analyze", "ai-analyze-package")
+DEFAULT_CONCURRENCY = "1,4,16"
+DEFAULT_REQUESTS = 50
+DEFAULT_FILES_PER_REQUEST = 5
+DEFAULT_MAX_REGRESSION = 0.2
+STARTUP_TIMEOUT = 60.0
+MEMORY_SAMPLE_INTERVAL = 0.1
+
+
+@dataclass
+class ScenarioResult:
+    """Результат одного сценария на одном уровне параллельности"""
+
+    scenario: str
+    concurrency: int
+    requests: int
+    errors: int
+    duration_s: float
+    throughput_rps: float
+    latency_ms: Dict[str, float]
+    status_codes: Dict[str, int] = field(default_factory=dict)
+    rss_peak_mb: Optional[float] = None
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль q (0-100) с линейной интерполяцией между соседними значениями"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower, upper = math.floor(position), math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    """Сводка задержек в миллисекундах"""
+    values = [latency * 1000 for latency in latencies]
+    return {
+        "mean": round(sum(values) / len(values), 2) if values else 0.0,
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+        "max": round(max(values), 2) if values else 0.0,
+    }
+
+
+def process_tree_rss(pid: int) -> Optional[int]:
+    """Суммарная резидентная память процесса и его потомков (пул parsing-анализа) в байтах. Только Linux"""
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            with open(f"/proc/{current}/task/{current}/children") as children:
+                pending.extend(int(child) for child in children.read().split())
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            if current == pid:
+                return None
+    return total
+
+
+class MemorySampler:
+    """Фоновое измерение пиковой памяти процесса приложения"""
+
+    def __init__(self, pid: Optional[int], interval: float = MEMORY_SAMPLE_INTERVAL):
+        self.pid = pid
+        self.interval = interval
+        self.peak: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        if self.pid is None:
+            return
+        while not self._stop.is_set():
+            rss = process_tree_rss(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "MemorySampler":
+        if self.pid is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    @property
+    def peak_mb(self) -> Optional[float]:
+        return round(self.peak / 1024 / 1024, 1) if self.peak is not None else None
+
+
+def load_corpus(path: Path, limit: int = 0) -> List[Tuple[str, bytes]]:
+    """Python-файлы каталога (непустые, по возрастанию пути)"""
+    files = [
+        (str(file.relative_to(path)), file.read_bytes())
+        for file in sorted(path.rglob("*.py"))
+        if "__pycache__" not in file.parts and file.stat().st_size > 0
+    ]
+    if not files:
+        raise SystemExit(f"В каталоге {path} нет Python-файлов")
+    return files[:limit] if limit else files
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(url: str, process: Optional[subprocess.Popen], timeout: float = STARTUP_TIMEOUT) -> None:
+    """Ожидание готовности сервера"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"Процесс {process.args!r} завершился с кодом {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"Сервер {url} не запустился за {timeout:g} с")
+
+
+def start_process(args: List[str], env: Dict[str, str], log_path: Path) -> subprocess.Popen:
+    log = open(log_path, "wb")
+    return subprocess.Popen(args, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def stop_process(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def mock_args(settings: MockSettings, port: int) -> List[str]:
+    args = [sys.executable, "-m", "benchmarks.mock_openai", "--port", str(port)]
+    for name, value in asdict(settings).items():
+        if value is not None:
+            args += [f"--{name.replace('_', '-')}", str(value)]
+    return args
+
+
+def app_env(mock_url: str, workdir: Path, args: argparse.Namespace) -> Dict[str, str]:
+    """Окружение приложения: замена API ИИ, отдельные хранилища и выключенный кэш (если не указано иное)"""
+    env = dict(os.environ)
+    env.update(
+        {
+            "AI_BASE_URL": f"{mock_url}/v1",
+            "OPENAI_API_KEY": "benchmark",
+            "PROXYAPI_KEY": "benchmark",
+            "AI_WARMUP": "false",
+            "AI_CACHE_ENABLED": "true" if args.cache else "false",
+            "AI_CACHE_PATH": str(workdir / "ai_results.sqlite3"),
+            "RESULT_STORE_PATH": str(workdir / "results.sqlite3"),
+            "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")])),
+        }
+    )
+    if args.mode:
+        env["AI_ANALYSIS_MODE"] = args.mode
+    return env
+
+
+class LoadTest:
+    """Прогон сценариев против запущенного приложения"""
+
+    def __init__(self, base_url: str, corpus: List[Tuple[str, bytes]], files_per_request: int, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.corpus = corpus
+        self.files_per_request = files_per_request
+        self.timeout = timeout
+        self.analysis_id: Optional[str] = None
+
+    def _batch(self, index: int) -> List[Tuple[str, bytes]]:
+        start = index * self.files_per_request
+        return [self.corpus[(start + offset) % len(self.corpus)] for offset in range(self.files_per_request)]
+
+    async def _analyze(self, client: httpx.AsyncClient, index: int) -> httpx.Response:
+        files = [("files", (Path(name).name, data, "text/x-python")) for name, data in self._batch(index)]
+        return await client.post("/analyzer/analyze", files=files)
+
+    async def _ai_analyze(self, client: httpx.AsyncClient, index: int) -> httpx.Response:
+        name, data = self.corpus[index % len(self.corpus)]
+        return await client.post(
+            "/analyzer/ai-analyze",
+            files={"file": (Path(name).name, data, "text/x-python")},
+            data={"analysis_id": self.analysis_id},
+        )
+
+    async def _ai_analyze_package(self, client: httpx.AsyncClient, index: int) -> httpx.Response:
+        files = [
+            {"filename": Path(name).name, "content": data.decode("utf-8", "replace"), "relative_path": name}
+            for name, data in self._batch(index)
+        ]
+        return await client.post("/analyzer/ai-analyze-package", json={"files": files})
+
+    def _client(self, concurrency: int) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        return httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits)
+
+    async def prepare(self) -> None:
+        """Parsing-анализ всего корпуса: /ai-analyze берет код файлов из его результатов"""
+        files = [("files", (Path(name).name, data, "text/x-python")) for name, data in self.corpus]
+        async with self._client(1) as client:
+            response = await client.post("/analyzer/analyze", files=files, params={"lazy": "true"})
+        response.raise_for_status()
+        self.analysis_id = response.headers.get("X-Analysis-ID")
+
+    async def run(
+        self, scenario: str, concurrency: int, requests: int, warmup: int, pid: Optional[int]
+    ) -> ScenarioResult:
+        """Выполнение requests запросов сценария не более чем по concurrency одновременно"""
+        send: Callable[[httpx.AsyncClient, int], Any] = {
+            "analyze": self._analyze,
+            "ai-analyze": self._ai_analyze,
+            "ai-analyze-package": self._ai_analyze_package,
+        }[scenario]
+        latencies: List[float] = []
+        status_codes: Dict[str, int] = {}
+        errors = 0
+        counter = iter(range(requests))
+
+        async with self._client(concurrency) as client:
+            for index in range(warmup):
+                try:
+                    await send(client, index)
+                except httpx.HTTPError:
+                    pass
+
+            async def worker() -> None:
+                nonlocal errors
+                for index in counter:
+                    started = time.perf_counter()
+                    try:
+                        response = await send(client, index)
+                        status = str(response.status_code)
+                        failed = response.status_code >= 400
+                    except httpx.HTTPError as e:
+                        status, failed = type(e).__name__, True
+                    latencies.append(time.perf_counter() - started)
+                    status_codes[status] = status_codes.get(status, 0) + 1
+                    errors += failed
+
+            with MemorySampler(pid) as memory:
+                started = time.perf_counter()
+                await asyncio.gather(*(worker() for _ in range(min(concurrency, requests))))
+                duration = time.perf_counter() - started
+
+        return ScenarioResult(
+            scenario=scenario,
+            concurrency=concurrency,
+            requests=requests,
+            errors=errors,
+            duration_s=round(duration, 3),
+            throughput_rps=round((requests - errors) / duration, 2) if duration else 0.0,
+            latency_ms=latency_summary(latencies),
+            status_codes=status_codes,
+            rss_peak_mb=memory.peak_mb,
+        )
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], max_regression: float) -> List[str]:
+    """
+    Регрессии относительно базового прогона
+
+    Регрессией считается падение пропускной способности или рост задержки p95 больше чем на max_regression
+    (доля), а также появление ошибок там, где их не было.
+    """
+    previous = {(item["scenario"], item["concurrency"]): item for item in baseline}
+    regressions = []
+    for item in results:
+        base = previous.get((item["scenario"], item["concurrency"]))
+        if base is None:
+            continue
+        label = f"{item['scenario']} x{item['concurrency']}"
+        if base["throughput_rps"] and item["throughput_rps"] < base["throughput_rps"] * (1 - max_regression):
+            regressions.append(f"{label}: {base['throughput_rps']} -> {item['throughput_rps']} rps")
+        if base["latency_ms"]["p95"] and item["latency_ms"]["p95"] > base["latency_ms"]["p95"] * (1 + max_regression):
+            regressions.append(f"{label}: p95 {base['latency_ms']['p95']} -> {item['latency_ms']['p95']} мс")
+        if item["errors"] and not base["errors"]:
+            regressions.append(f"{label}: {item['errors']} ошибок (в базовом прогоне ошибок не было)")
+    return regressions
+
+
+def git_revision() -> Optional[str]:
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+    except OSError:
+        return None
+    return output.stdout.strip() or None
+
+
+def package_version() -> Optional[str]:
+    for line in (ROOT / "pyproject.toml").read_text(encoding="utf-8").splitlines():
+        if line.startswith("version"):
+            return line.split("=", 1)[1].strip().strip('"')
+    return None
+
+
+def print_table(results: List[ScenarioResult]) -> None:
+    print(
+        f"{'сценарий':<20}{'параллельно':>12}{'rps':>10}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}"
+        f"{'ошибки':>8}{'RSS, МБ':>10}"
+    )
+    for result in results:
+        latency = result.latency_ms
+        print(
+            f"{result.scenario:<20}{result.concurrency:>12}{result.throughput_rps:>10}{latency['p50']:>10}"
+            f"{latency['p95']:>10}{latency['p99']:>10}{result.errors:>8}{str(result.rss_peak_mb):>10}"
+        )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест анализатора с локальной заменой API ИИ")
+    parser.add_argument(
+        "--scenarios", default=",".join(SCENARIOS), help=f"Сценарии через запятую: {', '.join(SCENARIOS)}"
+    )
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCY, help="Уровни параллельности через запятую")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="Запросов на сценарий и уровень")
+    parser.add_argument("--warmup", type=int, default=2, help="Запросов прогрева (не учитываются)")
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS, help="Каталог с Python-файлами для анализа")
+    parser.add_argument("--corpus-limit", type=int, default=0, help="Ограничение количества файлов корпуса")
+    parser.add_argument("--files-per-request", type=int, default=DEFAULT_FILES_PER_REQUEST)
+    parser.add_argument("--mode", default=None, help="Режим ИИ-анализа (AI_ANALYSIS_MODE)")
+    parser.add_argument("--cache", action="store_true", help="Не выключать кэш ИИ-анализа")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Таймаут одного запроса, с")
+    parser.add_argument("--app-url", default=None, help="Нагружать уже запущенное приложение (без замены API)")
+    parser.add_argument("--app-workers", type=int, default=1, help="Количество процессов uvicorn")
+    parser.add_argument("--output", type=Path, default=None, help="Файл для результатов в JSON")
+    parser.add_argument("--baseline", type=Path, default=None, help="Результаты предыдущего прогона для сравнения")
+    parser.add_argument("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION)
+    defaults = MockSettings()
+    parser.add_argument("--mock-latency", type=float, default=defaults.latency)
+    parser.add_argument("--mock-jitter", type=float, default=defaults.jitter)
+    parser.add_argument("--mock-tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--mock-error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--mock-rate-limit-rate", type=float, default=defaults.rate_limit_rate)
+    parser.add_argument("--mock-retry-after", type=float, default=defaults.retry_after)
+    parser.add_argument("--mock-truncation-rate", type=float, default=defaults.truncation_rate)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Неизвестные сценарии: {', '.join(sorted(unknown))}")
+    return args
+
+
+async def run_scenarios(args: argparse.Namespace, base_url: str, pid: Optional[int]) -> List[ScenarioResult]:
+    load_test = LoadTest(base_url, load_corpus(args.corpus, args.corpus_limit), args.files_per_request, args.timeout)
+    scenarios = args.scenarios.split(",")
+    if "ai-analyze" in scenarios:
+        await load_test.prepare()
+    results = []
+    for scenario in scenarios:
+        for concurrency in (int(level) for level in args.concurrency.split(",")):
+            result = await load_test.run(scenario, concurrency, args.requests, args.warmup, pid)
+            print(f"{scenario} x{concurrency}: {result.throughput_rps} rps, p95 {result.latency_ms['p95']} мс")
+            results.append(result)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    mock_settings = MockSettings(
+        latency=args.mock_latency,
+        jitter=args.mock_jitter,
+        tokens_per_second=args.mock_tokens_per_second,
+        error_rate=args.mock_error_rate,
+        rate_limit_rate=args.mock_rate_limit_rate,
+        retry_after=args.mock_retry_after,
+        truncation_rate=args.mock_truncation_rate,
+        seed=args.seed,
+    )
+    processes: List[subprocess.Popen] = []
+    with tempfile.TemporaryDirectory(prefix="sca-bench-") as workdir:
+        try:
+            if args.app_url:
+                base_url, pid = args.app_url, None
+            else:
+                mock_port, app_port = free_port(), free_port()
+                mock_url = f"http://127.0.0.1:{mock_port}"
+                mock = start_process(mock_args(mock_settings, mock_port), dict(os.environ), Path(workdir) / "mock.log")
+                processes.append(mock)
+                wait_ready(f"{mock_url}/v1/models", mock)
+
+                base_url = f"http://127.0.0.1:{app_port}"
+                app_args = [
+                    sys.executable, "-m", "uvicorn", "smart_code_analyzer.backend.main:app",
+                    "--host", "127.0.0.1", "--port", str(app_port), "--workers", str(args.app_workers),
+                    "--log-level", "warning",
+                ]  # fmt: skip
+                app = start_process(app_args, app_env(mock_url, Path(workdir), args), Path(workdir) / "app.log")
+                processes.append(app)
+                wait_ready(f"{base_url}/openapi.json", app)
+                pid = app.pid
+
+            results = asyncio.run(run_scenarios(args, base_url, pid))
+        finally:
+            for process in reversed(processes):
+                stop_process(process)
+
+    report: Dict[str, Any] = {
+        "version": package_version(),
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "scenarios": args.scenarios.split(","),
+            "requests": args.requests,
+            "files_per_request": args.files_per_request,
+            "corpus_files": len(load_corpus(args.corpus, args.corpus_limit)),
+            "mode": args.mode,
+            "cache": args.cache,
+            "app_workers": args.app_workers,
+            "mock": None if args.app_url else asdict(mock_settings),
+        },
+        "results": [asdict(result) for result in results],
+    }
+    print_table(results)
+    if args.output:
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Результаты записаны в {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare(report["results"], baseline["results"], args.max_regression)
+        for regression in regressions:
+            print(f"Регрессия: {regression}")
+        if regressions:
+            return 1
+        print(f"Регрессий относительно {args.baseline} нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+"""
+Локальная замена OpenAI-совместимого API для нагрузочных тестов.
+
+Отвечает на `POST /v1/chat/completions` правдоподобным JSON того этапа анализа, который узнается по промпту
+(стиль, SOLID, проблемы, рекомендации, символы, совмещенный анализ, структура пакета), с настраиваемой
+задержкой, долей ошибок `500`, ответов `429` с заголовком Retry-After и обрезанных ответов
+(`finish_reason: length`). Запросы с `stream: true` получают ответ потоком Server-Sent Events частями
+по STREAM_CHUNK_CHARS символов со скоростью tokens_per_second. Запрос продолжения (сообщение assistant
+с началом ответа и следующее за ним сообщение user) получает оставшуюся часть того же ответа. Кэш префиксов
+промптов моделируется как у OpenAI: начало промпта, уже встречавшееся в предыдущих запросах, от PREFIX_CACHE_MIN_TOKENS
+токенов и с шагом PREFIX_CACHE_BLOCK_TOKENS, возвращается в usage.prompt_tokens_details.cached_tokens. Анализатор
+направляется на сервер переменной окружения AI_BASE_URL.
+
+Запуск:
+    python -m benchmarks.mock_openai --port 8100 --latency 0.5 --rate-limit-rate 0.05
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Размер части потокового ответа в символах
+STREAM_CHUNK_CHARS = 16
+
+# Минимальная длина и шаг кэшируемого префикса промпта в токенах
+PREFIX_CACHE_MIN_TOKENS = 1024
+PREFIX_CACHE_BLOCK_TOKENS = 128
+
+
+@dataclass
+class MockSettings:
+    """Поведение сервера"""
+
+    latency: float = 0.2  # Базовая задержка ответа в секундах
+    jitter: float = 0.1  # Случайная добавка к задержке (0..jitter) в секундах
+    tokens_per_second: float = 0.0  # Скорость «генерации» ответа (0 — без задержки на генерацию)
+    error_rate: float = 0.0  # Доля ответов 500
+    rate_limit_rate: float = 0.0  # Доля ответов 429
+    retry_after: float = 1.0  # Значение заголовка Retry-After для ответов 429
+    truncation_rate: float = 0.0  # Доля обрезанных ответов (finish_reason: length)
+    seed: Optional[int] = None  # Начальное значение генератора случайных чисел (для воспроизводимых прогонов)
+
+
+def estimate_tokens(text: str) -> int:
+    """Приблизительное количество токенов текста (как у OpenAI для латиницы — 4 символа на токен)"""
+    return max(1, len(text) // 4)
+
+
+def detect_stage(prompt: str) -> str:
+    """Этап анализа по схеме ответа в промпте"""
+    if '"code_style"' in prompt and '"solid_principles"' in prompt:
+        return "fused"
+    if '"architecture"' in prompt:
+        return "package"
+    if '"issues"' in prompt:
+        return "symbols"
+    if '"SRP"' in prompt:
+        return "solid_principles"
+    if '"formatting"' in prompt or '"naming"' in prompt:
+        return "code_style"
+    if '"recommendation"' in prompt:
+        return "potential_issues"
+    return "recommendations"
+
+
+def _issues(count: int) -> List[Dict[str, str]]:
+    return [
+        {
+            "type": "maintainability",
+            "description": f"Функция {index + 1} выполняет несколько несвязанных действий",
+            "line": str(index + 1),
+            "recommendation": "Выделить независимые шаги в отдельные функции",
+        }
+        for index in range(count)
+    ]
+
+
+def _recommendations(count: int) -> List[str]:
+    return [f"Рекомендация {index + 1}: добавить аннотации типов и тесты публичных функций" for index in range(count)]
+
+
+def stage_response(stage: str, prompt: str) -> Any:
+    """Ответ этапа анализа. Количество проблем и рекомендаций растет с размером кода в промпте"""
+    count = min(10, 1 + len(prompt) // 4000)
+    style = {key: "Хорошо, замечаний нет" for key in ("formatting", "naming", "documentation", "structure")}
+    solid = {key: "Соблюдается" for key in ("SRP", "OCP", "LSP", "ISP", "DIP")}
+    if stage == "fused":
+        return {
+            "code_style": style,
+            "solid_principles": solid,
+            "potential_issues": _issues(count),
+            "recommendations": _recommendations(count),
+        }
+    if stage == "package":
+        return {
+            key: "Модули разделены по слоям, циклических зависимостей нет"
+            for key in ("architecture", "module_relations", "strong_points", "weak_points", "recommendations")
+        }
+    if stage == "symbols":
+        return {
+            "issues": _issues(count),
+            "recommendations": [
+                {"line": str(index + 1), "text": text} for index, text in enumerate(_recommendations(count))
+            ],
+        }
+    if stage == "solid_principles":
+        return solid
+    if stage == "code_style":
+        return style
+    if stage == "potential_issues":
+        return _issues(count)
+    return _recommendations(count)
+
+
+class PrefixCache:
+    """Кэш префиксов промптов: хэши начал промптов на границах блоков"""
+
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self.prefixes: Set[str] = set()
+
+    def lookup(self, prompt: str) -> int:
+        """Токены самого длинного уже встречавшегося префикса промпта (префиксы промпта запоминаются)"""
+        if len(self.prefixes) > self.max_entries:
+            self.prefixes.clear()
+        # Граница блока считается в символах по той же оценке 4 символа на токен, что и estimate_tokens
+        first, step = PREFIX_CACHE_MIN_TOKENS * 4, PREFIX_CACHE_BLOCK_TOKENS * 4
+        digest, position, cached = hashlib.sha1(), 0, 0
+        for end in range(first, len(prompt) + 1, step):
+            digest.update(prompt[position:end].encode("utf-8"))
+            position = end
+            key = digest.copy().hexdigest()
+            if key in self.prefixes:
+                cached = end
+            else:
+                self.prefixes.add(key)
+        return cached // 4
+
+
+def usage_body(prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> Dict[str, Any]:
+    """Поле usage ответа"""
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+    }
+
+
+def completion(
+    model: str, content: str, prompt_tokens: int, finish_reason: str = "stop", cached_tokens: int = 0
+) -> Dict[str, Any]:
+    """Тело ответа chat.completions"""
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason,
+            }
+        ],
+        "usage": usage_body(prompt_tokens, estimate_tokens(content), cached_tokens),
+    }
+
+
+def stream_completion(
+    model: str,
+    content: str,
+    prompt_tokens: int,
+    finish_reason: str,
+    include_usage: bool,
+    tokens_per_second: float,
+    cached_tokens: int = 0,
+) -> AsyncIterator[str]:
+    """События потокового ответа chat.completions (chat.completion.chunk) с завершающим [DONE]"""
+    completion_id, created = f"chatcmpl-{uuid.uuid4().hex}", int(time.time())
+
+    def event(choices: List[Dict[str, Any]], usage: Optional[Dict[str, int]] = None) -> str:
+        body = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model}
+        return f"data: {json.dumps({**body, 'choices': choices, 'usage': usage}, ensure_ascii=False)}\n\n"
+
+    async def events() -> AsyncIterator[str]:
+        yield event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        for start in range(0, len(content), STREAM_CHUNK_CHARS):
+            piece = content[start : start + STREAM_CHUNK_CHARS]
+            if tokens_per_second > 0:
+                await asyncio.sleep(estimate_tokens(piece) / tokens_per_second)
+            yield event([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+        yield event([{"index": 0, "delta": {}, "finish_reason": finish_reason}])
+        if include_usage:
+            yield event([], usage_body(prompt_tokens, estimate_tokens(content), cached_tokens))
+        yield "data: [DONE]\n\n"
+
+    return events()
+
+
+def _error(status: int, message: str, kind: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse(status_code=status, content={"error": {"message": message, "type": kind}}, headers=headers)
+
+
+def create_app(settings: Optional[MockSettings] = None) -> FastAPI:
+    """Приложение сервера с заданным поведением"""
+    settings = settings or MockSettings()
+    rng = random.Random(settings.seed)
+    app = FastAPI(title="Mock OpenAI API")
+    app.state.settings = settings
+    app.state.stats = {
+        "requests": 0,
+        "errors": 0,
+        "rate_limited": 0,
+        "truncated": 0,
+        "continuations": 0,
+        "prompt_tokens": 0,
+        "cached_prompt_tokens": 0,
+        "stages": {},
+    }
+    prefix_cache = PrefixCache()
+
+    def pick_outcome() -> Tuple[str, float]:
+        """Исход запроса (ok, error, rate_limited, truncated) и задержка ответа"""
+        delay = settings.latency + rng.uniform(0, settings.jitter)
+        roll = rng.random()
+        for outcome, rate in (
+            ("rate_limited", settings.rate_limit_rate),
+            ("error", settings.error_rate),
+            ("truncated", settings.truncation_rate),
+        ):
+            if roll < rate:
+                return outcome, delay
+            roll -= rate
+        return "ok", delay
+
+    @app.get("/v1/models")
+    async def list_models() -> Dict[str, Any]:
+        return {"object": "list", "data": [{"id": "mock", "object": "model", "created": 0, "owned_by": "mock"}]}
+
+    @app.get("/stats")
+    async def get_stats() -> Dict[str, Any]:
+        return {"settings": asdict(settings), **app.state.stats}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages") or []
+        stats = app.state.stats
+        partial = ""
+        if len(messages) >= 3 and messages[-2].get("role") == "assistant":
+            # Продолжение обрезанного ответа: этап и ответ определяются исходным промптом
+            partial = str(messages[-2].get("content") or "")
+            messages = messages[:-2]
+            stats["continuations"] += 1
+        prompt = "\n".join(str(message.get("content", "")) for message in messages)
+        stats["requests"] += 1
+
+        outcome, delay = pick_outcome()
+        if outcome == "rate_limited":
+            stats["rate_limited"] += 1
+            return _error(
+                429,
+                "Rate limit reached for requests",
+                "rate_limit_exceeded",
+                headers={"Retry-After": f"{settings.retry_after:g}"},
+            )
+        await asyncio.sleep(delay)
+        if outcome == "error":
+            stats["errors"] += 1
+            return _error(500, "The server had an error while processing your request", "server_error")
+
+        stage = detect_stage(prompt)
+        stats["stages"][stage] = stats["stages"].get(stage, 0) + 1
+        # Промпт с точки зрения кэша — все сообщения запроса, включая начало продолжаемого ответа
+        full_prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages") or [])
+        prompt_tokens, cached_tokens = estimate_tokens(full_prompt), prefix_cache.lookup(full_prompt)
+        stats["prompt_tokens"] += prompt_tokens
+        stats["cached_prompt_tokens"] += cached_tokens
+        content = json.dumps(stage_response(stage, prompt), ensure_ascii=False)
+        if partial and content.startswith(partial):
+            content = content[len(partial) :]
+        finish_reason = "stop"
+        max_tokens = body.get("max_tokens")
+        if outcome == "truncated" or (max_tokens and estimate_tokens(content) > max_tokens):
+            stats["truncated"] += 1
+            limit = min(len(content) // 2, max_tokens * 4 if max_tokens else len(content))
+            content, finish_reason = content[:limit], "length"
+        if body.get("stream"):
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            events = stream_completion(
+                body.get("model", "mock"),
+                content,
+                prompt_tokens,
+                finish_reason,
+                include_usage,
+                settings.tokens_per_second,
+                cached_tokens,
+            )
+            return StreamingResponse(events, media_type="text/event-stream")
+        if settings.tokens_per_second > 0:
+            await asyncio.sleep(estimate_tokens(content) / settings.tokens_per_second)
+        return completion(body.get("model", "mock"), content, prompt_tokens, finish_reason, cached_tokens)
+
+    return app
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Локальная замена OpenAI-совместимого API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    defaults = MockSettings()
+    parser.add_argument("--latency", type=float, default=defaults.latency, help="Базовая задержка ответа, с")
+    parser.add_argument("--jitter", type=float, default=defaults.jitter, help="Случайная добавка к задержке, с")
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="Доля ответов 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=defaults.rate_limit_rate, help="Доля ответов 429")
+    parser.add_argument("--retry-after", type=float, default=defaults.retry_after)
+    parser.add_argument("--truncation-rate", type=float, default=defaults.truncation_rate)
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    settings = MockSettings(
+        latency=args.latency,
+        jitter=args.jitter,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        truncation_rate=args.truncation_rate,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
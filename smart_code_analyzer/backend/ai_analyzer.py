@@ -1,16 +1,54 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 # ---------------------------------------------------------------------------------------------------------------------
+import asyncio
+import importlib.util
 import json
 import logging
 import os
-from typing import Dict, List, Optional
+import statistics
+import time
+from concurrent.futures import Executor
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 import httpx
 from dotenv import load_dotenv
-from openai import AsyncOpenAI
 
+from smart_code_analyzer.backend import metrics
+from smart_code_analyzer.backend.ai_cache import AIResultCache
+from smart_code_analyzer.backend.chunking import (
+    CodeChunk,
+    build_skeleton,
+    merge_issues,
+    merge_recommendations,
+    split_code,
+)
+from smart_code_analyzer.backend.env import get_env_bool, get_env_float, get_env_int
+from smart_code_analyzer.backend.import_graph import build_import_graph, summarize_graph
+from smart_code_analyzer.backend.incremental import (
+    Symbol,
+    from_memo,
+    group_symbols,
+    module_context,
+    split_symbols,
+    to_memo,
+)
+from smart_code_analyzer.backend.json_stream import JSONStreamParser, Path, continuation_text, loads_lenient
 from smart_code_analyzer.backend.models import AIAnalysisResult
+from smart_code_analyzer.backend.prompts import PROMPT_VERSION, render_prompt
+from smart_code_analyzer.backend.providers import ProviderPool
+from smart_code_analyzer.backend.resilience import CircuitOpenError, RequestGuard
+from smart_code_analyzer.backend.routing import (
+    STAGE_ALIASES,
+    ModelRouter,
+    RouteDecision,
+    measure_complexity,
+    plan_key,
+    record_plan,
+)
+from smart_code_analyzer.backend.static_analyzer import STATIC_ISSUE_TYPES, StaticFindings, analyze_static
+from smart_code_analyzer.backend.token_budget import compact_code, count_tokens, truncate_to_tokens
 
 # Настраиваем логирование
 logger = logging.getLogger("uvicorn.error")
@@ -19,6 +57,70 @@ logger.setLevel(logging.DEBUG)
 load_dotenv()
 
 DEFAULT_TEMPERATURE = 0.3
+DEFAULT_ANALYSIS_MODE = "concurrent"
+DEFAULT_STAGE_TIMEOUT = 60.0
+DEFAULT_MAX_TOKENS = 1000
+FUSED_MAX_TOKENS = 3000
+DEFAULT_OUTPUT_TOKENS_RATIO = 0.5
+DEFAULT_MAX_OUTPUT_TOKENS = 4096
+DEFAULT_MAX_CONTINUATIONS = 2
+DEFAULT_CHUNK_TOKENS = 3000
+DEFAULT_LARGE_FILE_TOKENS = 6000
+DEFAULT_CHUNK_CONCURRENCY = 4
+DEFAULT_MAX_PROMPT_TOKENS = 12000
+DEFAULT_BULK_CONCURRENCY = 4
+DEFAULT_PACKAGE_SUMMARY_TOKENS = 4000
+DEFAULT_HTTP_MAX_CONNECTIONS = 100
+DEFAULT_HTTP_MAX_KEEPALIVE = 20
+DEFAULT_HTTP_KEEPALIVE_EXPIRY = 30.0
+
+# Счетчик токенов текущего анализа. Задачи asyncio наследуют контекст, поэтому параллельные этапы
+# одного анализа пишут в один и тот же словарь, а разные анализы не смешиваются.
+_token_usage: ContextVar[Optional[Dict[str, int]]] = ContextVar("token_usage", default=None)
+
+# Статистика сжатия кода текущего анализа по этапам: токены исходного и отправленного модели кода
+_compaction_stats: ContextVar[Optional[Dict[str, Dict[str, int]]]] = ContextVar("compaction_stats", default=None)
+
+# Результаты локального статического анализа текущего файла: дополняют ответы модели и сужают промпты
+_static_findings: ContextVar[Optional[StaticFindings]] = ContextVar("static_findings", default=None)
+
+# Модели этапов анализа текущего файла, выбранные по его сложности (None — все этапы выполняет основная модель)
+_route_plan: ContextVar[Optional[Dict[str, RouteDecision]]] = ContextVar("route_plan", default=None)
+
+# Обработчик завершения этапа анализа: имя этапа и его результат (None, если этап не удался)
+StageCallback = Callable[[str, Any], None]
+
+# Обработчик элемента результата, полученного из потока ответа модели до завершения этапа:
+# этап (potential_issues или recommendations) и проблема или рекомендация
+ItemCallback = Callable[[str, Any], None]
+
+# Обработчик элементов текущего анализа
+_item_callback: ContextVar[Optional[ItemCallback]] = ContextVar("item_callback", default=None)
+
+# Массивы JSON-ответов этапов, элементы которых передаются обработчику элементов по мере получения:
+# путь массива в ответе -> этап результата
+STREAM_ITEM_PATHS: Dict[str, Dict[Path, str]] = {
+    "potential_issues": {(): "potential_issues"},
+    "potential_issues_chunk": {(): "potential_issues"},
+    "recommendations": {(): "recommendations"},
+    "fused": {("potential_issues",): "potential_issues", ("recommendations",): "recommendations"},
+    "symbols": {("issues",): "potential_issues", ("recommendations",): "recommendations"},
+}
+
+# Обработчик завершения анализа файла в пакетном режиме: имя файла и результат (None, если анализ не удался)
+FileCallback = Callable[[str, Optional[AIAnalysisResult]], None]
+
+# Этапы со списками в ответе: лимит токенов ответа растет с размером промпта
+SCALED_OUTPUT_STAGES = ("potential_issues", "potential_issues_chunk", "recommendations", "fused", "symbols")
+
+# Запрос продолжения ответа, обрезанного по лимиту токенов
+CONTINUATION_PROMPT = (
+    "Ответ обрезан по лимиту длины. Продолжи его точно с места обрыва: без повторения уже написанного, "
+    "без пояснений и markdown, так чтобы вместе с предыдущей частью получился корректный JSON."
+)
+
+# Границы интервалов распределения оценок пакетного анализа
+SCORE_BUCKETS = (0.2, 0.4, 0.6, 0.8, 1.0)
 
 
 class AIAnalyzer:
@@ -33,14 +135,33 @@ class AIAnalyzer:
         "gpt-4o-mini": "GPT-4o Mini (быстрая базовая модель)",
     }
 
-    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
+    # Доступные режимы выполнения анализа
+    ANALYSIS_MODES = {
+        "sequential": "Последовательное выполнение этапов, ошибка любого этапа прерывает анализ",
+        "concurrent": "Параллельное выполнение этапов с таймаутом на каждый этап и частичным результатом",
+        "fused": "Все этапы одним запросом к модели с единым JSON-ответом",
+        "chunked": "Большие файлы: анализ фрагментов по границам классов и функций с объединением результатов",
+        "fast": "Только локальный статический анализ Python-кода без обращения к модели",
+        "incremental": "Как chunked, но модели отправляются только классы и функции, изменившиеся с прошлого анализа",
+    }
+
+    # Этапы анализа (совпадают с именами полей AIAnalysisResult)
+    STAGES = ("code_style", "solid_principles", "potential_issues", "recommendations")
+
+    def __init__(
+        self, api_key: Optional[str] = None, model: Optional[str] = None, cache: Optional[AIResultCache] = None
+    ):
         """
         Инициализация анализатора
 
         Args:
             api_key: API ключ для OpenAI (если не указан, берется из .env)
             model: Модель для анализа (если не указана, берется из .env или используется gpt-4.1)
+            cache: Кэш результатов анализа (если не указан, результаты не кэшируются)
         """
+        self.cache = cache
+        self.prompt_version = PROMPT_VERSION
+
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         if not self.api_key:
             message = "API ключ не найден. Укажите его в .env файле или передайте в конструктор."
@@ -48,7 +169,7 @@ class AIAnalyzer:
             raise ValueError(message)
 
         # Получаем модель из параметра или .env
-        self.model = model or os.getenv("AI_MODEL", "gpt-4.1")
+        self.model: str = model or os.getenv("AI_MODEL") or "gpt-4.1"
 
         # Проверяем корректность модели
         if self.model not in self.AVAILABLE_MODELS:
@@ -79,16 +200,74 @@ class AIAnalyzer:
                 self.temperature = DEFAULT_TEMPERATURE
         logger.info(f"Используемая температура: {self.temperature}")
 
-        # Получаем ключ ProxyAPI
-        proxy_api_key = os.getenv("PROXYAPI_KEY")
-        if not proxy_api_key:
-            message = "PROXYAPI_KEY не найден. Укажите его в .env файле."
-            logger.error(message)
-            raise ValueError(message)
+        # Получаем режим анализа из .env или используем значение по умолчанию
+        self.analysis_mode = self._validate_mode(os.getenv("AI_ANALYSIS_MODE", DEFAULT_ANALYSIS_MODE))
+        logger.info(f"Режим анализа по умолчанию: {self.analysis_mode}")
+
+        # Получаем таймаут одного этапа анализа из .env или используем значение по умолчанию
+        self.stage_timeout = get_env_float("AI_STAGE_TIMEOUT", DEFAULT_STAGE_TIMEOUT, min_value=1.0)
+
+        # Параметры режима больших файлов: размер фрагмента, порог автоматического включения и параллельность
+        self.chunk_tokens = get_env_int("AI_CHUNK_TOKENS", DEFAULT_CHUNK_TOKENS, min_value=100)
+        self.large_file_tokens = get_env_int("AI_LARGE_FILE_TOKENS", DEFAULT_LARGE_FILE_TOKENS, min_value=100)
+        self.chunk_concurrency = get_env_int("AI_CHUNK_CONCURRENCY", DEFAULT_CHUNK_CONCURRENCY, min_value=1)
+
+        # Сжатие кода перед отправкой модели и потолок токенов кода на один запрос
+        self.compaction_enabled = get_env_bool("AI_COMPACTION_ENABLED", True)
+        self.max_prompt_tokens = get_env_int("AI_MAX_PROMPT_TOKENS", DEFAULT_MAX_PROMPT_TOKENS, min_value=100)
+        logger.info(f"Сжатие кода: {self.compaction_enabled}, потолок токенов кода: {self.max_prompt_tokens}")
+
+        # Инкрементальный анализ больших файлов (нужен кэш: в нем хранятся результаты отдельных символов)
+        self.incremental_enabled = get_env_bool("AI_INCREMENTAL_ENABLED", True)
+
+        # Локальный статический анализ перед запросами к модели
+        self.static_tier_enabled = get_env_bool("AI_STATIC_TIER_ENABLED", True)
+
+        # Выбор быстрой модели для простых файлов (None — все файлы анализирует основная модель)
+        self.router = ModelRouter.from_env(self.model, self.AVAILABLE_MODELS)
+
+        # Потоковое получение ответов модели (проблемы и рекомендации передаются по мере генерации)
+        self.streaming = get_env_bool("AI_STREAMING", True)
+
+        # Лимит токенов ответа этапов со списками: доля токенов промпта в пределах от лимита этапа до потолка
+        self.output_tokens_ratio = get_env_float("AI_OUTPUT_TOKENS_RATIO", DEFAULT_OUTPUT_TOKENS_RATIO, min_value=0.0)
+        self.max_output_tokens = get_env_int("AI_MAX_OUTPUT_TOKENS", DEFAULT_MAX_OUTPUT_TOKENS, min_value=1)
+
+        # Сколько раз дозапрашивается продолжение ответа, обрезанного по лимиту токенов (0 — не дозапрашивается)
+        self.max_continuations = get_env_int("AI_MAX_CONTINUATIONS", DEFAULT_MAX_CONTINUATIONS, min_value=0)
+
+        # Сколько файлов пакетного анализа обрабатывается одновременно (общий лимит для всех запросов процесса)
+        self.bulk_concurrency = get_env_int("AI_BULK_CONCURRENCY", DEFAULT_BULK_CONCURRENCY, min_value=1)
+        self._bulk_semaphore = asyncio.Semaphore(self.bulk_concurrency)
+
+        # Потолок токенов сводки графа импортов в промпте анализа структуры пакета
+        self.package_summary_tokens = get_env_int(
+            "AI_PACKAGE_SUMMARY_TOKENS", DEFAULT_PACKAGE_SUMMARY_TOKENS, min_value=100
+        )
+
+        # Ограничение скорости, повторы и предохранитель для запросов к API
+        self.guard = RequestGuard.from_env()
+
+        # Настройка HTTP клиента. Клиент и пул соединений живут столько же, сколько анализатор,
+        # поэтому один экземпляр анализатора переиспользует keep-alive соединения между запросами
+        limits = httpx.Limits(
+            max_connections=get_env_int("AI_HTTP_MAX_CONNECTIONS", DEFAULT_HTTP_MAX_CONNECTIONS, min_value=1),
+            max_keepalive_connections=get_env_int("AI_HTTP_MAX_KEEPALIVE", DEFAULT_HTTP_MAX_KEEPALIVE, min_value=0),
+            keepalive_expiry=get_env_float("AI_HTTP_KEEPALIVE_EXPIRY", DEFAULT_HTTP_KEEPALIVE_EXPIRY, min_value=0.0),
+        )
+        http2 = get_env_bool("AI_HTTP2", False)
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning(
+                "AI_HTTP2 включен, но пакет h2 не установлен (pip install httpx[http2]). Используется HTTP/1.1"
+            )
+            http2 = False
+        logger.info(f"Пул соединений ИИ: {limits}, HTTP/2: {http2}")
 
-        # Настройка HTTP клиента
         transport = httpx.AsyncHTTPTransport(
-            verify=False, retries=3  # Отключаем проверку SSL  # Количество попыток переподключения
+            verify=False,  # Отключаем проверку SSL
+            retries=3,  # Количество попыток установить соединение (повторы запросов выполняет RequestGuard)
+            limits=limits,
+            http2=http2,
         )
 
         self.http_client = httpx.AsyncClient(
@@ -97,11 +276,17 @@ class AIAnalyzer:
             follow_redirects=True,  # Разрешаем следовать по редиректам
         )
 
-        self.client = AsyncOpenAI(
-            api_key=proxy_api_key,  # Используем ключ ProxyAPI
-            http_client=self.http_client,
-            base_url="https://api.proxyapi.ru/openai/v1",  # Используем базовый URL ProxyAPI
-        )
+        # Провайдеры API (по умолчанию ProxyAPI с ключом PROXYAPI_KEY) используют общий пул соединений
+        self.providers = ProviderPool.from_env(self.http_client)
+
+    async def warmup(self) -> bool:
+        """
+        Прогрев пула соединений: устанавливает TCP/TLS соединения с провайдерами API заранее, до первого анализа.
+
+        Returns:
+            bool: True, если ответил хотя бы один провайдер
+        """
+        return await self.providers.warmup()
 
     async def close(self):
         """Закрытие HTTP клиента"""
@@ -117,99 +302,363 @@ class AIAnalyzer:
 
     async def _analyze_code_style(self, code: str) -> Dict[str, str]:
         """Анализ стиля кода"""
-        prompt = f"""
-        Проанализируй стиль следующего кода и дай рекомендации по улучшению.
-        Ответ должен быть в формате JSON:
-        {{
-            "formatting": "оценка и рекомендации",
-            "naming": "оценка и рекомендации",
-            "documentation": "оценка и рекомендации",
-            "structure": "оценка и рекомендации"
-        }}
-
-        Код для анализа:
-        {code}
-        """
+        code = self._prepare_code(code, "code_style")
+        # Документацию оценивает статический анализ, поэтому модели этот вопрос не задается
+        documentation = "" if _static_findings.get() else '\n    "documentation": "оценка и рекомендации",'
+        prompt = render_prompt("code_style", code, documentation=documentation)
 
-        response = await self._get_ai_response(prompt)
-        return self._parse_style_analysis(response)
+        response = await self._get_ai_response(prompt, stage="code_style")
+        return self._apply_static("code_style", self._parse_style_analysis(response))
 
     async def _check_solid_principles(self, code: str) -> Dict[str, str]:
         """Проверка соответствия принципам SOLID"""
-        prompt = f"""
-        Проверь соответствие следующего кода принципам SOLID.
-        Ответ должен быть в формате JSON:
-        {{
-            "SRP": "оценка и объяснение",
-            "OCP": "оценка и объяснение",
-            "LSP": "оценка и объяснение",
-            "ISP": "оценка и объяснение",
-            "DIP": "оценка и объяснение"
-        }}
-
-        Код для анализа:
-        {code}
-        """
-
-        response = await self._get_ai_response(prompt)
+        code = self._prepare_code(code, "solid_principles")
+        prompt = render_prompt("solid_principles", code)
+
+        response = await self._get_ai_response(prompt, stage="solid_principles")
         return self._parse_solid_analysis(response)
 
     async def _find_potential_issues(self, code: str) -> List[Dict[str, str]]:
         """Поиск потенциальных проблем в коде"""
-        prompt = f"""
-        Найди потенциальные проблемы в следующем коде.
-        Ответ должен быть в формате JSON массив объектов:
-        [
-            {{
-                "type": "тип проблемы",
-                "description": "описание проблемы",
-                "line": "строка кода",
-                "recommendation": "рекомендация по исправлению"
-            }}
-        ]
-
-        Код для анализа:
-        {code}
-        """
+        code = self._prepare_code(code, "potential_issues")
+        prompt = render_prompt("potential_issues", code, static_note=self._static_issues_note())
 
-        response = await self._get_ai_response(prompt)
-        return self._parse_issues(response)
+        response = await self._get_ai_response(prompt, stage="potential_issues")
+        return self._apply_static("potential_issues", self._parse_issues(response))
 
     async def _generate_recommendations(self, code: str) -> List[str]:
         """Генерация рекомендаций по улучшению кода"""
-        prompt = f"""
-        Дай рекомендации по улучшению следующего кода.
-        Ответ должен быть в формате JSON массив строк:
-        [
-            "рекомендация 1",
-            "рекомендация 2",
-            ...
-        ]
+        code = self._prepare_code(code, "recommendations")
+        prompt = render_prompt("recommendations", code)
+
+        response = await self._get_ai_response(prompt, stage="recommendations")
+        return self._apply_static("recommendations", self._parse_recommendations(response))
+
+    async def _find_chunk_issues(self, chunk: CodeChunk) -> List[Dict[str, str]]:
+        """Поиск потенциальных проблем во фрагменте большого файла (номера строк пересчитываются в исходные)"""
+        # Сжатие сохраняет нумерацию строк, чтобы номера из ответа модели совпадали с исходным файлом
+        text = self._prepare_code(chunk.text, "potential_issues", preserve_lines=True)
+        numbered = CodeChunk(text, chunk.start_line, chunk.end_line).numbered()
+        prompt = render_prompt(
+            "potential_issues_chunk", numbered, title=chunk.title, static_note=self._static_issues_note()
+        )
+
+        response = await self._get_ai_response(prompt, stage="potential_issues_chunk")
+        issues = self._parse_issues(response)
+        for issue in issues:
+            issue["line"] = chunk.map_line(issue["line"])
+        return self._apply_static("potential_issues", issues, chunk)
 
-        Код для анализа:
-        {code}
+    async def _find_symbol_findings(
+        self, batch: List[Symbol], context: str
+    ) -> List[Tuple[List[Dict[str, str]], List[str]]]:
         """
+        Поиск проблем и рекомендаций для пакета символов модуля
 
-        response = await self._get_ai_response(prompt)
-        return self._parse_recommendations(response)
+        Returns:
+            List[Tuple[List[Dict[str, str]], List[str]]]: Проблемы и рекомендации каждого символа пакета
 
-    async def _get_ai_response(self, prompt: str) -> str:
-        """Получение ответа от ИИ"""
+        Raises:
+            RuntimeError: Если ответ модели не удалось разобрать (такой результат не запоминается)
+        """
+        code = "\n\n".join(
+            CodeChunk(
+                self._prepare_code(symbol.chunk.text, "potential_issues", preserve_lines=True),
+                symbol.chunk.start_line,
+                symbol.chunk.end_line,
+            ).numbered()
+            for symbol in batch
+        )
+        # Контекст модуля общий для всех пакетов символов, поэтому идет первым
+        prompt = render_prompt("symbols", code, context=context, static_note=self._static_issues_note())
+
+        response = await self._get_ai_response(prompt, max_tokens=FUSED_MAX_TOKENS, stage="symbols")
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,  # Используем выбранную модель
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Ты - эксперт по анализу кода. Твоя задача - анализировать код и давать конкретные "
-                        "рекомендации. Всегда отвечай в формате JSON.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=self.temperature,
-                max_tokens=1000,
+            data = self._load_json(response, "{", "symbols")
+        except json.JSONDecodeError as e:
+            data = None
+            logger.error(f"Ошибка парсинга анализа символов: {str(e)}")
+        if not isinstance(data, dict):
+            metrics.AI_PARSE_FAILURES.labels(parser="symbols").inc()
+            raise RuntimeError(f"Не удалось разобрать ответ модели для символов {', '.join(s.name for s in batch)}")
+
+        def owner(line: object) -> Tuple[Symbol, str]:
+            """Символ, к которому относится строка из ответа модели (и номер строки в исходном файле)"""
+            for symbol in batch:
+                mapped = symbol.chunk.map_line(line)
+                if symbol.contains(mapped):
+                    return symbol, mapped
+            return batch[0], str(line)
+
+        findings: Dict[int, Tuple[List[Dict[str, str]], List[str]]] = {id(symbol): ([], []) for symbol in batch}
+        raw_issues = data.get("issues")
+        for issue in self._parse_issues(json.dumps(raw_issues if isinstance(raw_issues, list) else [])):
+            symbol, issue["line"] = owner(issue["line"])
+            findings[id(symbol)][0].append(issue)
+        raw_recommendations = data.get("recommendations")
+        for recommendation in raw_recommendations if isinstance(raw_recommendations, list) else []:
+            if isinstance(recommendation, dict):
+                symbol, _ = owner(recommendation.get("line", ""))
+                text = recommendation.get("text")
+            else:
+                symbol, text = batch[0], recommendation
+            if text:
+                findings[id(symbol)][1].append(str(text))
+        return [findings[id(symbol)] for symbol in batch]
+
+    async def _analyze_fused(self, code: str) -> Dict[str, str]:
+        """Все этапы анализа одним запросом. Возвращает сырые JSON-тексты разделов ответа"""
+        code = self._prepare_code(code, "fused")
+        prompt = render_prompt("fused", code, static_note=self._static_issues_note())
+
+        response = await self._get_ai_response(prompt, max_tokens=FUSED_MAX_TOKENS, stage="fused")
+        try:
+            sections = self._load_json(response, "{", "fused")
+        except json.JSONDecodeError as e:
+            logger.error(f"Ошибка парсинга совмещенного анализа: {str(e)}")
+            logger.error(f"Ответ модели: {response}")
+            sections = None
+        if not isinstance(sections, dict):
+            metrics.AI_PARSE_FAILURES.labels(parser="fused").inc()
+            # Разделы разберутся в значения-заглушки парсерами отдельных этапов
+            return {stage: "" for stage in self.STAGES}
+        return {stage: json.dumps(sections[stage], ensure_ascii=False) for stage in self.STAGES if stage in sections}
+
+    @staticmethod
+    def _static_issues_note() -> str:
+        """Уточнение промпта поиска проблем: категории, которые уже проверил статический анализ"""
+        if _static_findings.get() is None:
+            return ""
+        return f" Не ищи {', '.join(STATIC_ISSUE_TYPES)}: их уже проверил статический анализ."
+
+    @staticmethod
+    def _apply_static(stage: str, result: Any, chunk: Optional[CodeChunk] = None) -> Any:
+        """
+        Дополнение результата этапа результатами статического анализа
+
+        Args:
+            stage: Этап анализа
+            result: Разобранный ответ модели
+            chunk: Фрагмент файла (добавляются только проблемы из строк фрагмента)
+        """
+        static = _static_findings.get()
+        if static is None:
+            return result
+        if stage == "code_style":
+            return {**result, "documentation": static.documentation}
+        if stage == "potential_issues":
+            issues = static.issues
+            if chunk is not None:
+                issues = [issue for issue in issues if chunk.start_line <= int(issue["line"]) <= chunk.end_line]
+            return merge_issues(issues + result)
+        if stage == "recommendations":
+            return merge_recommendations(result + static.recommendations)
+        return result
+
+    def _prepare_code(self, code: str, stage: str, preserve_lines: bool = False) -> str:
+        """
+        Подготовка кода к отправке модели: сжатие для этапа и ограничение потолком токенов
+
+        Args:
+            code: Исходный код
+            stage: Этап анализа, для которого готовится код
+            preserve_lines: Сохранять нумерацию строк при сжатии
+
+        Returns:
+            str: Код для промпта. Токены исходного и подготовленного кода учитываются в статистике анализа.
+        """
+        original_tokens = count_tokens(code, self.model)
+        prepared = compact_code(code, stage, preserve_lines) if self.compaction_enabled else code
+        prepared_tokens = count_tokens(prepared, self.model)
+        if prepared_tokens > self.max_prompt_tokens:
+            logger.warning(
+                f"Код для этапа {stage} превышает потолок ({prepared_tokens} > {self.max_prompt_tokens} токенов) "
+                f"и будет обрезан"
             )
-            return response.choices[0].message.content
+            prepared = truncate_to_tokens(prepared, self.max_prompt_tokens, self.model)
+            prepared_tokens = count_tokens(prepared, self.model)
+
+        stats = _compaction_stats.get()
+        if stats is not None:
+            stage_stats = stats.setdefault(stage, {"original_tokens": 0, "compacted_tokens": 0})
+            stage_stats["original_tokens"] += original_tokens
+            stage_stats["compacted_tokens"] += prepared_tokens
+        return prepared
+
+    @staticmethod
+    def _cached_prompt_tokens(usage: Any) -> int:
+        """Токены промпта, взятые провайдером из кэша префиксов (usage.prompt_tokens_details.cached_tokens)"""
+        details = getattr(usage, "prompt_tokens_details", None)
+        return getattr(details, "cached_tokens", 0) or 0
+
+    @staticmethod
+    def _record_token_usage(usage: Any) -> None:
+        """Учет токенов ответа в счетчике текущего анализа"""
+        counter = _token_usage.get()
+        if counter is None or usage is None:
+            return
+        counter["requests"] = counter.get("requests", 0) + 1
+        for field in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            counter[field] = counter.get(field, 0) + (getattr(usage, field, 0) or 0)
+        cached = AIAnalyzer._cached_prompt_tokens(usage)
+        counter["cached_prompt_tokens"] = counter.get("cached_prompt_tokens", 0) + cached
+
+    def _stage_model(self, stage: str) -> str:
+        """Модель этапа анализа текущего файла"""
+        plan = _route_plan.get()
+        if not plan:
+            return self.model
+        if stage == "fused":
+            # Один запрос за все этапы: быстрая модель, только если она выбрана для всех этапов
+            models = {decision.model for decision in plan.values()}
+            return models.pop() if len(models) == 1 else self.model
+        decision = plan.get(STAGE_ALIASES.get(stage, stage))
+        return decision.model if decision is not None else self.model
+
+    def _delta_handler(self, stage: str, emitted: Dict[Path, int]) -> Optional[Callable[[str], None]]:
+        """
+        Обработчик частей потокового ответа этапа: разбирает JSON по мере получения и передает завершенные
+        проблемы и рекомендации обработчику элементов анализа (None — ответ запрашивается целиком)
+
+        Args:
+            emitted: Количество элементов каждого массива, уже переданных обработчику предыдущими попытками
+                запроса. Повтор разбирает ответ с начала, и эти элементы не передаются повторно.
+        """
+        if not self.streaming:
+            return None
+        callback = _item_callback.get()
+        paths = STREAM_ITEM_PATHS.get(stage, {})
+        if callback is None or not paths:
+            return lambda text: None
+        on_item: ItemCallback = callback
+        parser = JSONStreamParser()
+        seen: Dict[Path, int] = {}
+
+        def on_delta(text: str) -> None:
+            for path, item in parser.feed(text):
+                seen[path] = seen.get(path, 0) + 1
+                if seen[path] <= emitted.get(path, 0):
+                    continue
+                emitted[path] = seen[path]
+                target = paths.get(path)
+                item = self._stream_item(target, item) if target is not None else None
+                if target is None or item is None:
+                    continue
+                try:
+                    on_item(target, item)
+                except Exception as e:
+                    logger.warning(f"Ошибка обработчика элемента этапа {target}: {str(e)}")
+
+        return on_delta
+
+    @staticmethod
+    def _stream_item(stage: str, item: Any) -> Any:
+        """Проблема или рекомендация из потока ответа в том же виде, что и в результате этапа (None — пропустить)"""
+        if stage == "potential_issues":
+            return AIAnalyzer._normalize_issue(item) if isinstance(item, dict) else None
+        if isinstance(item, dict):
+            item = item.get("text")
+        return str(item) if item else None
+
+    def _output_budget(self, stage: str, prompt_tokens: int, max_tokens: int) -> int:
+        """
+        Лимит токенов ответа: для этапов со списками растет с размером промпта (AI_OUTPUT_TOKENS_RATIO),
+        но не меньше лимита этапа max_tokens и не больше потолка AI_MAX_OUTPUT_TOKENS
+        """
+        if stage not in SCALED_OUTPUT_STAGES:
+            return max_tokens
+        return max(max_tokens, min(self.max_output_tokens, int(prompt_tokens * self.output_tokens_ratio)))
+
+    async def _request_completion(
+        self,
+        stage: str,
+        model: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        on_delta: Callable[[], Optional[Callable[[str], None]]],
+    ) -> Any:
+        """
+        Один запрос к модели с ограничениями RequestGuard и учетом токенов
+
+        Args:
+            on_delta: Фабрика обработчика частей потокового ответа (вызывается для каждой попытки,
+                чтобы повтор разбирал ответ с начала)
+        """
+        # Оценка токенов нужна только ограничителю токенов в минуту
+        estimated_tokens = 0
+        if self.guard.token_bucket:
+            estimated_tokens = sum(count_tokens(message["content"], model) for message in messages) + max_tokens
+        started = time.perf_counter()
+        response = await self.guard.call(
+            lambda: self.providers.complete(
+                stage=stage,
+                on_delta=on_delta(),
+                model=model,  # Модель, выбранная для этапа
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=max_tokens,
+            ),
+            estimated_tokens=estimated_tokens,
+        )
+        metrics.AI_STAGE_LATENCY.labels(model=model, stage=stage).observe(time.perf_counter() - started)
+        self._record_token_usage(response.usage)
+        if response.usage is not None:
+            metrics.AI_TOKENS.labels(model=model, kind="prompt").inc(response.usage.prompt_tokens or 0)
+            metrics.AI_TOKENS.labels(model=model, kind="cached_prompt").inc(self._cached_prompt_tokens(response.usage))
+            metrics.AI_TOKENS.labels(model=model, kind="completion").inc(response.usage.completion_tokens or 0)
+        self.guard.settle_tokens(estimated_tokens, getattr(response.usage, "total_tokens", 0) or estimated_tokens)
+        return response
+
+    async def _get_ai_response(
+        self, messages: List[Dict[str, str]], max_tokens: int = DEFAULT_MAX_TOKENS, stage: str = "other"
+    ) -> str:
+        """
+        Получение ответа от ИИ на сообщения шаблона промпта (stage — этап анализа для выбора модели и метрик)
+
+        Лимит токенов ответа рассчитывается по размеру промпта (_output_budget). Если ответ обрезан
+        по лимиту (finish_reason == "length"), дозапрашивается его продолжение, не больше AI_MAX_CONTINUATIONS раз;
+        части склеиваются в один ответ.
+        """
+        model = self._stage_model(stage)
+        prompt_tokens = sum(count_tokens(message["content"], model) for message in messages)
+        max_tokens = self._output_budget(stage, prompt_tokens, max_tokens)
+        handlers: List[Optional[Callable[[str], None]]] = []
+        emitted: Dict[Path, int] = {}
+
+        def stage_handler() -> Optional[Callable[[str], None]]:
+            handlers.append(self._delta_handler(stage, emitted))
+            return handlers[-1]
+
+        def silent_handler() -> Optional[Callable[[str], None]]:
+            # Продолжение может повторять конец ответа: разбору оно передается после склейки
+            return (lambda text: None) if self.streaming else None
+
+        try:
+            response = await self._request_completion(stage, model, messages, max_tokens, stage_handler)
+            text = response.choices[0].message.content or ""
+            rounds = 0
+            while getattr(response.choices[0], "finish_reason", None) == "length":
+                if rounds >= self.max_continuations:
+                    metrics.AI_TRUNCATED_RESPONSES.labels(stage=stage).inc()
+                    logger.warning(
+                        f"Ответ этапа {stage} обрезан по лимиту {max_tokens} токенов и после {rounds} продолжений"
+                    )
+                    break
+                rounds += 1
+                metrics.AI_CONTINUATIONS.labels(stage=stage).inc()
+                logger.info(f"Ответ этапа {stage} обрезан по лимиту {max_tokens} токенов, продолжение {rounds}")
+                continuation = messages + [
+                    {"role": "assistant", "content": text},
+                    {"role": "user", "content": CONTINUATION_PROMPT},
+                ]
+                response = await self._request_completion(stage, model, continuation, max_tokens, silent_handler)
+                addition = continuation_text(text, response.choices[0].message.content)
+                text += addition
+                if handlers and handlers[-1] is not None:
+                    handlers[-1](addition)
+            return text
+        except CircuitOpenError:
+            raise
         except Exception as e:
             raise RuntimeError(f"Ошибка при получении ответа от ИИ: {str(e)}")
 
@@ -217,9 +666,9 @@ class AIAnalyzer:
     def _parse_style_analysis(response: str) -> Dict[str, str]:
         """Парсинг анализа стиля кода"""
         try:
-            cleaned = AIAnalyzer._clean_json_markdown(response)
-            return json.loads(cleaned)
+            return AIAnalyzer._load_json(response, "{", "code_style")
         except json.JSONDecodeError:
+            metrics.AI_PARSE_FAILURES.labels(parser="code_style").inc()
             return {
                 "formatting": "Ошибка парсинга ответа",
                 "naming": "Ошибка парсинга ответа",
@@ -231,8 +680,7 @@ class AIAnalyzer:
     def _parse_solid_analysis(response: str) -> Dict[str, str]:
         """Парсинг анализа SOLID принципов"""
         try:
-            cleaned = AIAnalyzer._clean_json_markdown(response)
-            result = json.loads(cleaned)
+            result = AIAnalyzer._load_json(response, "{", "solid_principles")
 
             # Проверяем наличие всех необходимых ключей
             required_keys = ["SRP", "OCP", "LSP", "ISP", "DIP"]
@@ -242,6 +690,7 @@ class AIAnalyzer:
 
             return result
         except json.JSONDecodeError as e:
+            metrics.AI_PARSE_FAILURES.labels(parser="solid_principles").inc()
             logger.error(f"Ошибка парсинга SOLID анализа: {str(e)}")
             logger.error(f"Ответ модели: {response}")
             return {
@@ -252,28 +701,46 @@ class AIAnalyzer:
                 "DIP": "Ошибка парсинга ответа",
             }
 
+    @staticmethod
+    def _load_json(response: str, root: str, parser: str) -> Any:
+        """
+        Терпимый разбор JSON-ответа модели: текст и markdown вокруг JSON пропускаются, у обрезанного
+        или испорченного ответа берется корректное начало (такие ответы учитываются в метрике ai_parse_recoveries)
+
+        Args:
+            response: Ответ модели
+            root: Ожидаемый тип корня ("{" или "[")
+            parser: Имя парсера для метрик
+
+        Raises:
+            json.JSONDecodeError: Если в ответе нет корректного начала JSON
+        """
+        value, complete = loads_lenient(response or "", root)
+        if not complete:
+            metrics.AI_PARSE_RECOVERIES.labels(parser=parser).inc()
+            logger.warning(f"Ответ модели ({parser}) разобран частично: использовано корректное начало JSON")
+        return value
+
+    @staticmethod
+    def _normalize_issue(issue: Dict[str, Any]) -> Dict[str, str]:
+        """Проблема с обязательными полями (отсутствующие заполняются значениями по умолчанию)"""
+        return {
+            "type": issue.get("type", "Неизвестная проблема"),
+            "description": issue.get("description", "Нет описания"),
+            "line": issue.get("line", "Не указана"),
+            "recommendation": issue.get("recommendation", "Нет рекомендации"),
+        }
+
     @staticmethod
     def _parse_issues(response: str) -> List[Dict[str, str]]:
         """Парсинг найденных проблем"""
         try:
-            cleaned = AIAnalyzer._clean_json_markdown(response)
-            issues = json.loads(cleaned)
+            issues = AIAnalyzer._load_json(response, "[", "potential_issues")
 
             # Проверяем структуру каждой проблемы
-            valid_issues = []
-            for issue in issues:
-                if isinstance(issue, dict):
-                    # Добавляем отсутствующие поля с дефолтными значениями
-                    valid_issue = {
-                        "type": issue.get("type", "Неизвестная проблема"),
-                        "description": issue.get("description", "Нет описания"),
-                        "line": issue.get("line", "Не указана"),
-                        "recommendation": issue.get("recommendation", "Нет рекомендации"),
-                    }
-                    valid_issues.append(valid_issue)
-
-            return valid_issues
+            return [AIAnalyzer._normalize_issue(issue) for issue in issues if isinstance(issue, dict)]
         except json.JSONDecodeError as e:
+            metrics.AI_PARSE_FAILURES.labels(parser="potential_issues").inc()
             logger.error(f"Ошибка парсинга проблем: {str(e)}")
             logger.error(f"Ответ модели: {response}")
             return [
@@ -289,17 +756,18 @@ class AIAnalyzer:
     def _parse_recommendations(response: str) -> List[str]:
         """Парсинг рекомендаций"""
         try:
-            cleaned = AIAnalyzer._clean_json_markdown(response)
-            recommendations = json.loads(cleaned)
+            recommendations = AIAnalyzer._load_json(response, "[", "recommendations")
 
             # Проверяем, что это список строк
             if isinstance(recommendations, list):
                 return [str(rec) for rec in recommendations if rec]
             else:
+                metrics.AI_PARSE_FAILURES.labels(parser="recommendations").inc()
                 logger.error(f"Неверный формат рекомендаций: {recommendations}")
                 return ["Ошибка: рекомендации должны быть списком строк"]
 
         except json.JSONDecodeError as e:
+            metrics.AI_PARSE_FAILURES.labels(parser="recommendations").inc()
             logger.error(f"Ошибка парсинга рекомендаций: {str(e)}")
             logger.error(f"Ответ модели: {response}")
             return ["Ошибка парсинга ответа"]
@@ -328,94 +796,566 @@ class AIAnalyzer:
         # Ограничиваем оценку от 0 до 1
         return max(0.0, min(1.0, score))
 
-    async def analyze_code_text(self, code: str, filename: str) -> AIAnalysisResult:
+    def _validate_mode(self, mode: str) -> str:
+        """Проверка режима анализа"""
+        if mode not in self.ANALYSIS_MODES:
+            message = f"Неподдерживаемый режим анализа. Доступные режимы: {', '.join(self.ANALYSIS_MODES.keys())}"
+            logger.error(message)
+            raise ValueError(message)
+        return mode
+
+    def _stage_handlers(self) -> Dict[str, Callable[[str], Awaitable[Any]]]:
+        """Соответствие этапов анализа методам, которые их выполняют"""
+        return {
+            "code_style": self._analyze_code_style,
+            "solid_principles": self._check_solid_principles,
+            "potential_issues": self._find_potential_issues,
+            "recommendations": self._generate_recommendations,
+        }
+
+    @staticmethod
+    def _notify_stage(on_stage: Optional[StageCallback], stage: str, result: Any) -> None:
+        """Уведомление о завершении этапа (ошибка обработчика не влияет на анализ)"""
+        if on_stage is None:
+            return
+        try:
+            on_stage(stage, result)
+        except Exception as e:
+            logger.warning(f"Ошибка обработчика завершения этапа {stage}: {str(e)}")
+
+    async def _run_stage(
+        self, stage: str, handler: Callable[[str], Awaitable[Any]], code: str, on_stage: Optional[StageCallback]
+    ) -> Any:
+        """Выполнение одного этапа с таймаутом и уведомлением о результате"""
+        try:
+            result = await asyncio.wait_for(handler(code), timeout=self.stage_timeout)
+        except Exception:
+            self._notify_stage(on_stage, stage, None)
+            raise
+        self._notify_stage(on_stage, stage, result)
+        return result
+
+    async def _run_stages_sequentially(
+        self, code: str, on_stage: Optional[StageCallback] = None
+    ) -> Tuple[Dict[str, Any], List[str]]:
+        """Последовательное выполнение этапов анализа (ошибка любого этапа прерывает анализ)"""
+        results = {}
+        for stage, handler in self._stage_handlers().items():
+            results[stage] = await handler(code)
+            self._notify_stage(on_stage, stage, results[stage])
+        return results, []
+
+    async def _run_stages_concurrently(
+        self, code: str, on_stage: Optional[StageCallback] = None
+    ) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Параллельное выполнение этапов анализа.
+
+        Каждый этап ограничен собственным таймаутом. Упавшие или не уложившиеся в таймаут этапы
+        не прерывают анализ, а возвращаются в списке пропущенных.
+        """
+        handlers = self._stage_handlers()
+        outcomes = await asyncio.gather(
+            *(self._run_stage(stage, handler, code, on_stage) for stage, handler in handlers.items()),
+            return_exceptions=True,
+        )
+
+        results, missing_stages = {}, []
+        for stage, outcome in zip(handlers, outcomes):
+            if isinstance(outcome, BaseException):
+                if isinstance(outcome, asyncio.TimeoutError):
+                    logger.warning(f"Этап {stage} не завершился за {self.stage_timeout} с")
+                else:
+                    logger.error(f"Ошибка на этапе {stage}: {str(outcome)}")
+                missing_stages.append(stage)
+            else:
+                results[stage] = outcome
+        return results, missing_stages
+
+    async def _run_stages_fused(
+        self, code: str, on_stage: Optional[StageCallback] = None
+    ) -> Tuple[Dict[str, Any], List[str]]:
+        """Выполнение всех этапов одним запросом и разбор разделов парсерами отдельных этапов"""
+        parsers = {
+            "code_style": self._parse_style_analysis,
+            "solid_principles": self._parse_solid_analysis,
+            "potential_issues": self._parse_issues,
+            "recommendations": self._parse_recommendations,
+        }
+        sections = await asyncio.wait_for(self._analyze_fused(code), timeout=self.stage_timeout)
+
+        results, missing_stages = {}, []
+        for stage, parser in parsers.items():
+            if stage in sections:
+                results[stage] = self._apply_static(stage, parser(sections[stage]))
+            else:
+                logger.warning(f"В совмещенном ответе модели отсутствует раздел {stage}")
+                missing_stages.append(stage)
+            self._notify_stage(on_stage, stage, results.get(stage))
+        return results, missing_stages
+
+    async def _limited(self, semaphore: asyncio.Semaphore, coroutine: Awaitable[Any]) -> Any:
+        """Выполнение запроса фрагмента под общим семафором и с таймаутом этапа"""
+        async with semaphore:
+            return await asyncio.wait_for(coroutine, timeout=self.stage_timeout)
+
+    async def _run_stages_chunked(
+        self, code: str, on_stage: Optional[StageCallback] = None
+    ) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Анализ большого файла по фрагментам (map-reduce).
+
+        Проблемы и рекомендации ищутся в каждом фрагменте параллельно (не больше chunk_concurrency запросов
+        одновременно) и объединяются без дубликатов. Стиль и SOLID оцениваются по скелету модуля.
+        Фрагменты, анализ которых не удался, попадают в список пропущенных как "этап:строки".
+        """
+        chunks = split_code(code, self.chunk_tokens, lambda text: count_tokens(text, self.model))
+        skeleton = build_skeleton(code) or chunks[0].text
+        logger.info(
+            f"Режим больших файлов: {len(chunks)} фрагментов, скелет {count_tokens(skeleton, self.model)} токенов"
+        )
+
+        semaphore = asyncio.Semaphore(self.chunk_concurrency)
+
+        async def run_whole_file(stage: str, handler: Callable[[str], Awaitable[Any]]) -> Tuple[str, Any]:
+            try:
+                result = await self._limited(semaphore, handler(skeleton))
+            except Exception as e:
+                logger.error(f"Ошибка на этапе {stage}: {str(e)}")
+                result = None
+            self._notify_stage(on_stage, stage, result)
+            return stage, result
+
+        async def run_chunks(stage: str, handler: Callable[[CodeChunk], Awaitable[Any]], merge) -> Tuple[str, Any]:
+            outcomes = await asyncio.gather(
+                *(self._limited(semaphore, handler(chunk)) for chunk in chunks), return_exceptions=True
+            )
+            parts, failed = [], []
+            for chunk, outcome in zip(chunks, outcomes):
+                if isinstance(outcome, BaseException):
+                    logger.error(f"Ошибка на этапе {stage} для фрагмента {chunk.title}: {str(outcome)}")
+                    failed.append(f"{stage}:{chunk.start_line}-{chunk.end_line}")
+                else:
+                    parts.extend(outcome)
+            result = merge(parts) if len(failed) < len(chunks) else None
+            self._notify_stage(on_stage, stage, result)
+            return stage, (result, failed)
+
+        outcomes = await asyncio.gather(
+            run_whole_file("code_style", self._analyze_code_style),
+            run_whole_file("solid_principles", self._check_solid_principles),
+            run_chunks("potential_issues", self._find_chunk_issues, merge_issues),
+            run_chunks(
+                "recommendations", lambda chunk: self._generate_recommendations(chunk.text), merge_recommendations
+            ),
+        )
+
+        results, missing_stages = {}, []
+        for stage, outcome in outcomes:
+            if stage in ("potential_issues", "recommendations"):
+                outcome, failed = outcome
+                if outcome is not None:
+                    missing_stages.extend(failed)
+            if outcome is None:
+                missing_stages.append(stage)
+            else:
+                results[stage] = outcome
+        return results, missing_stages
+
+    async def _run_stages_incremental(
+        self, code: str, on_stage: Optional[StageCallback] = None, report: Optional[Dict[str, List[str]]] = None
+    ) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Инкрементальный анализ по символам модуля.
+
+        Проблемы и рекомендации запоминаются в кэше по отпечатку каждого верхнеуровневого символа, модели
+        отправляются только символы без сохраненного результата (пакетами до chunk_tokens токенов). Стиль и SOLID
+        оцениваются по скелету модуля и пересчитываются только при изменении скелета. Для кода, который не удалось
+        разобрать, или без кэша выполняется обычный анализ по фрагментам.
+
+        Args:
+            report: Словарь, в который записываются пересчитанные (recomputed) и взятые из памяти (reused) части
+        """
+        symbols = split_symbols(code)
+        cache = self.cache
+        if symbols is None or cache is None:
+            logger.warning("Инкрементальный анализ невозможен (нет кэша или код не разбирается), режим chunked")
+            return await self._run_stages_chunked(code, on_stage)
+
+        report = report if report is not None else {}
+        report.update({"recomputed": [], "reused": []})
+        skeleton = build_skeleton(code) or code
+        semaphore = asyncio.Semaphore(self.chunk_concurrency)
+
+        def memo_key(kind: str, text: str, stage: str) -> str:
+            return cache.make_key(kind, text, self._stage_model(stage), self.temperature, self.prompt_version)
+
+        async def run_whole_file(stage: str, handler: Callable[[str], Awaitable[Any]]) -> Tuple[str, Any]:
+            key = memo_key(f"skeleton:{stage}", skeleton, stage)
+            memo = await asyncio.to_thread(cache.get, key)
+            if memo is not None:
+                # Статический анализ видит тела функций, которых нет в скелете, поэтому применяется заново
+                result = self._apply_static(stage, memo["result"])
+                report["reused"].append(stage)
+            else:
+                try:
+                    result = await self._limited(semaphore, handler(skeleton))
+                    await asyncio.to_thread(cache.set, key, {"result": result}, self.prompt_version)
+                    report["recomputed"].append(stage)
+                except Exception as e:
+                    logger.error(f"Ошибка на этапе {stage}: {str(e)}")
+                    result = None
+            self._notify_stage(on_stage, stage, result)
+            return stage, result
+
+        async def run_symbols() -> List[str]:
+            keys = [memo_key("symbol", symbol.chunk.text, "symbols") for symbol in symbols]
+            memos = await asyncio.to_thread(lambda: [cache.get(key) for key in keys])
+            findings: Dict[int, Dict[str, Any]] = {}
+            changed = []
+            for symbol, memo in zip(symbols, memos):
+                if memo is None:
+                    changed.append(symbol)
+                else:
+                    findings[id(symbol)] = from_memo(symbol, memo)
+                    report["reused"].append(symbol.title)
+
+            batches = group_symbols(changed, self.chunk_tokens, lambda text: count_tokens(text, self.model))
+            context = module_context(code)
+            outcomes = await asyncio.gather(
+                *(self._limited(semaphore, self._find_symbol_findings(batch, context)) for batch in batches),
+                return_exceptions=True,
+            )
+            failed: List[str] = []
+            for batch, outcome in zip(batches, outcomes):
+                if isinstance(outcome, BaseException):
+                    logger.error(f"Ошибка анализа символов {', '.join(s.name for s in batch)}: {str(outcome)}")
+                    failed.extend(f"{s.chunk.start_line}-{s.chunk.end_line}" for s in batch)
+                    continue
+                for symbol, (issues, recommendations) in zip(batch, outcome):
+                    memo = to_memo(symbol, issues, recommendations)
+                    await asyncio.to_thread(
+                        cache.set, memo_key("symbol", symbol.chunk.text, "symbols"), memo, self.prompt_version
+                    )
+                    findings[id(symbol)] = from_memo(symbol, memo)
+                    report["recomputed"].append(symbol.title)
+
+            for stage, field, merge in (
+                ("potential_issues", "issues", merge_issues),
+                ("recommendations", "recommendations", merge_recommendations),
+            ):
+                if findings:
+                    parts = [
+                        item for symbol in symbols if id(symbol) in findings for item in findings[id(symbol)][field]
+                    ]
+                    results[stage] = self._apply_static(stage, merge(parts))
+                    missing_stages.extend(f"{stage}:{lines}" for lines in failed)
+                else:
+                    missing_stages.append(stage)
+                self._notify_stage(on_stage, stage, results.get(stage))
+            return failed
+
+        results: Dict[str, Any] = {}
+        missing_stages: List[str] = []
+        outcomes = await asyncio.gather(
+            run_whole_file("code_style", self._analyze_code_style),
+            run_whole_file("solid_principles", self._check_solid_principles),
+            run_symbols(),
+        )
+        for stage, outcome in outcomes[:2]:
+            if outcome is None:
+                missing_stages.append(stage)
+            else:
+                results[stage] = outcome
+        logger.info(
+            f"Инкрементальный анализ: пересчитано {len(report['recomputed'])}, "
+            f"взято из памяти {len(report['reused'])} частей"
+        )
+        return results, missing_stages
+
+    def _build_result(
+        self,
+        filename: str,
+        results: Dict[str, Any],
+        missing_stages: List[str],
+        token_usage: Dict[str, int],
+        compaction: Dict[str, Dict[str, int]],
+        incremental: Optional[Dict[str, List[str]]] = None,
+        routing: Optional[Dict[str, Any]] = None,
+    ) -> AIAnalysisResult:
+        """Сборка результата анализа из результатов отдельных этапов"""
+        style_analysis = results.get("code_style", {})
+        solid_analysis = results.get("solid_principles", {})
+        issues = results.get("potential_issues", [])
+
+        return AIAnalysisResult(
+            filename=filename,
+            code_style=style_analysis,
+            solid_principles=solid_analysis,
+            potential_issues=issues,
+            recommendations=results.get("recommendations", []),
+            overall_score=self._calculate_overall_score(style_analysis, solid_analysis, issues),
+            missing_stages=missing_stages,
+            token_usage=token_usage,
+            compaction=compaction,
+            incremental=incremental or {},
+            routing=routing or {},
+        )
+
+    async def _run_fast(self, code: str, filename: str, on_stage: Optional[StageCallback] = None) -> AIAnalysisResult:
+        """Анализ только локальным статическим анализатором, без обращения к модели"""
+        static = await asyncio.to_thread(analyze_static, code)
+        if static is None:
+            raise RuntimeError(f"Режим fast поддерживает только Python-код, файл {filename} не удалось разобрать")
+        results = {
+            "code_style": static.code_style(),
+            "solid_principles": static.solid_principles(),
+            "potential_issues": static.issues,
+            "recommendations": static.recommendations,
+        }
+        for stage in self.STAGES:
+            self._notify_stage(on_stage, stage, results[stage])
+        logger.info(f"Статический анализ файла {filename} завершен, проблем: {len(static.issues)}")
+        return self._build_result(filename, results, [], {}, {})
+
+    async def analyze_code_text(
+        self,
+        code: str,
+        filename: str,
+        mode: Optional[str] = None,
+        on_stage: Optional[StageCallback] = None,
+        on_item: Optional[ItemCallback] = None,
+    ) -> AIAnalysisResult:
         """
         Анализ текста кода
 
         Args:
             code: Текст кода для анализа
             filename: Имя файла (для логирования и результата)
+            mode: Режим анализа (если не указан, используется режим по умолчанию)
+            on_stage: Обработчик завершения каждого этапа (имя этапа и разобранный результат или None)
+            on_item: Обработчик проблем и рекомендаций, разобранных из потока ответа модели до завершения этапа
+                (предварительные: окончательный список этапа передается on_stage)
 
         Returns:
-            AIAnalysisResult: Результат анализа
+            AIAnalysisResult: Результат анализа. В режиме "concurrent" может быть частичным,
+                пропущенные этапы перечислены в missing_stages. В режиме "fast" модель не вызывается.
 
         Raises:
-            ValueError: Если код пустой
+            ValueError: Если код пустой или режим не поддерживается
+            CircuitOpenError: Если API ИИ недоступен (открыт предохранитель)
+            RuntimeError: Если анализ не удался
         """
         if not code:
             raise ValueError("Код пуст")
+        mode = self._validate_mode(mode or self.analysis_mode)
+        if mode == "fast":
+            return await self._run_fast(code, filename, on_stage)
+        if mode not in ("chunked", "incremental") and count_tokens(code, self.model) > self.large_file_tokens:
+            mode = "incremental" if self.incremental_enabled and self.cache is not None else "chunked"
+            logger.info(f"Файл {filename} больше {self.large_file_tokens} токенов, используется режим {mode}")
 
-        try:
-            # Анализ стиля кода
-            style_analysis = await self._analyze_code_style(code)
-
-            # Проверка SOLID принципов
-            solid_analysis = await self._check_solid_principles(code)
+        plan, signals = None, None
+        if self.router is not None:
+            signals = await asyncio.to_thread(measure_complexity, code, self.model)
+            plan = self.router.plan(self.STAGES, signals)
 
-            # Поиск потенциальных проблем
-            issues = await self._find_potential_issues(code)
+        cache, cache_key = self.cache, None
+        if cache is not None:
+            model_key = plan_key(plan, self.model) if plan else self.model
+            # Режим входит в ключ: результаты и расход токенов разных режимов различаются
+            cache_key = cache.make_key(f"file:{mode}", code, model_key, self.temperature, self.prompt_version)
+            cached = await asyncio.to_thread(cache.get, cache_key)
+            if cached is not None:
+                logger.info(f"Результат ИИ-анализа файла {filename} взят из кэша")
+                for stage in self.STAGES:
+                    self._notify_stage(on_stage, stage, cached[stage])
+                return AIAnalysisResult(
+                    **{
+                        **cached,
+                        "filename": filename,
+                        "token_usage": {},
+                        "compaction": {},
+                        "incremental": {},
+                        "cached": True,
+                        "routing": {},
+                    }
+                )
 
-            # Генерация рекомендаций
-            recommendations = await self._generate_recommendations(code)
+        # Результат из кэша отдается и при открытом предохранителе, проверка нужна только перед вызовом модели
+        self.guard.ensure_available()
+        static = await asyncio.to_thread(analyze_static, code) if self.static_tier_enabled else None
+        token_usage: Dict[str, int] = {}
+        compaction: Dict[str, Dict[str, int]] = {}
+        incremental: Dict[str, List[str]] = {}
+        usage_token = _token_usage.set(token_usage)
+        compaction_token = _compaction_stats.set(compaction)
+        static_token = _static_findings.set(static)
+        route_token = _route_plan.set(plan)
+        item_token = _item_callback.set(on_item)
+        try:
+            if mode == "incremental":
+                results, missing_stages = await self._run_stages_incremental(code, on_stage, incremental)
+            elif mode == "chunked":
+                results, missing_stages = await self._run_stages_chunked(code, on_stage)
+            elif mode == "concurrent":
+                results, missing_stages = await self._run_stages_concurrently(code, on_stage)
+            elif mode == "fused":
+                results, missing_stages = await self._run_stages_fused(code, on_stage)
+            else:
+                results, missing_stages = await self._run_stages_sequentially(code, on_stage)
+        except Exception as e:
+            raise RuntimeError(f"Ошибка при анализе кода файла {filename}: {str(e)}")
+        finally:
+            _token_usage.reset(usage_token)
+            _compaction_stats.reset(compaction_token)
+            _static_findings.reset(static_token)
+            _route_plan.reset(route_token)
+            _item_callback.reset(item_token)
+        logger.info(f"Токены анализа файла {filename} (режим {mode}): {token_usage}, сжатие кода: {compaction}")
+        routing = record_plan(plan, signals) if plan and signals is not None else {}
+        if plan:
+            models = ", ".join(f"{stage}: {decision.model} ({decision.reason})" for stage, decision in plan.items())
+            logger.info(f"Модели этапов файла {filename}: {models}")
 
-            # Расчет общей оценки
-            overall_score = self._calculate_overall_score(style_analysis, solid_analysis, issues)
+        if not results:
+            raise RuntimeError(f"Ошибка при анализе кода файла {filename}: ни один этап анализа не завершился")
+        if missing_stages:
+            logger.warning(
+                f"Частичный результат анализа файла {filename}, пропущены этапы: {', '.join(missing_stages)}"
+            )
 
-            return AIAnalysisResult(
-                filename=filename,
-                code_style=style_analysis,
-                solid_principles=solid_analysis,
-                potential_issues=issues,
-                recommendations=recommendations,
-                overall_score=overall_score,
+        result = self._build_result(filename, results, missing_stages, token_usage, compaction, incremental, routing)
+        # Частичные результаты не кэшируем, чтобы при повторном запросе пропущенные этапы выполнились заново
+        if cache is not None and cache_key is not None and not missing_stages:
+            await asyncio.to_thread(
+                cache.set,
+                cache_key,
+                result.model_dump(exclude={"token_usage", "compaction", "incremental", "cached", "routing"}),
+                self.prompt_version,
             )
-        except Exception as e:
-            raise RuntimeError(f"Ошибка при анализе кода файла {filename}: {str(e)}")
+        return result
 
-    async def analyze_package_structure(self, files: List[dict]) -> dict:
+    async def analyze_code_batch(
+        self, files: Dict[str, str], mode: Optional[str] = None, on_file: Optional[FileCallback] = None
+    ) -> Tuple[Dict[str, AIAnalysisResult], Dict[str, str]]:
         """
-        Анализирует структуру пакета (проекта) с помощью ИИ.
+        Пакетный анализ нескольких файлов
+
+        Файлы анализируются параллельно, но не больше bulk_concurrency одновременно на весь процесс.
+        Ошибка анализа одного файла не прерывает анализ остальных.
+
         Args:
-            files: Список словарей вида {"filename": ...}
+            files: Словарь имя файла -> текст кода
+            mode: Режим анализа каждого файла (если не указан, используется режим по умолчанию)
+            on_file: Обработчик завершения анализа каждого файла
+
         Returns:
-            dict: Рекомендации и замечания по архитектуре и организации пакета
+            Tuple[Dict[str, AIAnalysisResult], Dict[str, str]]: Результаты по файлам и ошибки по файлам
+
+        Raises:
+            CircuitOpenError: Если API ИИ недоступен (открыт предохранитель)
         """
-        # Формируем краткое описание структуры
-        file_list = "\n".join(f"- {f['filename']}" for f in files)
-        prompt = f"""
-        Ты — эксперт по архитектуре Python-проектов. Проанализируй структуру Python-пакета, состоящего из следующих 
-        файлов и директорий:
-        {file_list}
+        mode = self._validate_mode(mode or self.analysis_mode)
+        if mode != "fast":
+            self.guard.ensure_available()
 
-        Не анализируй содержимое файлов, оценивай только по структуре и именам. 
-        Ответь строго в формате JSON, пример:
-        {{
-            "architecture": "Краткое описание архитектуры и организации модулей.",
-            "module_relations": "Как связаны модули между собой.",
-            "strong_points": "Сильные стороны структуры.",
-            "weak_points": "Слабые стороны структуры.",
-            "recommendations": "Рекомендации по улучшению архитектуры."
-        }}
+        async def analyze_file(filename: str, code: str) -> Optional[AIAnalysisResult]:
+            async with self._bulk_semaphore:
+                try:
+                    result = await self.analyze_code_text(code, filename=filename, mode=mode)
+                except Exception as e:
+                    logger.error(f"Ошибка пакетного анализа файла {filename}: {str(e)}")
+                    errors[filename] = str(e)
+                    result = None
+            if on_file is not None:
+                try:
+                    on_file(filename, result)
+                except Exception as e:
+                    logger.warning(f"Ошибка обработчика завершения анализа файла {filename}: {str(e)}")
+            return result
 
-        Если информации недостаточно, напиши в каждом поле: "Недостаточно данных для анализа".
+        errors: Dict[str, str] = {}
+        outcomes = await asyncio.gather(*(analyze_file(filename, code) for filename, code in files.items()))
+        results = {filename: result for filename, result in zip(files, outcomes) if result is not None}
+        logger.info(f"Пакетный анализ: {len(results)} файлов проанализировано, {len(errors)} с ошибкой")
+        return results, errors
 
+    @staticmethod
+    def summarize_batch(results: Dict[str, AIAnalysisResult], errors: Dict[str, str]) -> Dict[str, Any]:
         """
+        Сводка пакетного анализа: количество файлов, статистика и распределение оценок, суммарные токены
 
-        response = await self._get_ai_response(prompt)
-        cleaned_response = self._clean_json_markdown(response)
-        try:
-            return json.loads(cleaned_response)
-        except Exception:
-            return {"error": "Ошибка парсинга ответа ИИ", "raw": response}
+        Returns:
+            Dict[str, Any]: Сводка. Распределение оценок — количество файлов в интервалах "0.0-0.2" ... "0.8-1.0".
+        """
+        scores = [result.overall_score for result in results.values()]
+        # Интервалы полуоткрытые, кроме последнего: оценка 1.0 попадает в "0.8-1.0"
+        bounds = list(zip((0.0,) + SCORE_BUCKETS[:-1], SCORE_BUCKETS))
+        distribution = {f"{lower:.1f}-{upper:.1f}": 0 for lower, upper in bounds}
+        for score in scores:
+            lower, upper = next((b for b in bounds if score < b[1]), bounds[-1])
+            distribution[f"{lower:.1f}-{upper:.1f}"] += 1
 
-    @staticmethod
-    def _clean_json_markdown(response: str) -> str:
+        token_usage: Dict[str, int] = {}
+        for result in results.values():
+            for field, value in result.token_usage.items():
+                token_usage[field] = token_usage.get(field, 0) + value
+
+        return {
+            "total_files": len(results) + len(errors),
+            "analyzed": len(results),
+            "failed": len(errors),
+            "partial": sum(1 for result in results.values() if result.missing_stages),
+            "cached": sum(1 for result in results.values() if result.cached),
+            "score_min": min(scores) if scores else None,
+            "score_max": max(scores) if scores else None,
+            "score_mean": round(statistics.fmean(scores), 4) if scores else None,
+            "score_median": round(statistics.median(scores), 4) if scores else None,
+            "score_distribution": distribution,
+            "token_usage": token_usage,
+        }
+
+    async def analyze_package_structure(self, files: List[dict], executor: Optional[Executor] = None) -> dict:
         """
-        Удаляет markdown-обёртку ```json ... ``` из ответа, если она есть.
+        Анализирует структуру пакета (проекта) с помощью ИИ.
+
+        Содержимое файлов модели не отправляется: файлы локально разбираются в граф импортов, и модель получает
+        его сводку (циклы, входящие и исходящие зависимости, нарушения слоев, зависимости модулей), обрезанную
+        до AI_PACKAGE_SUMMARY_TOKENS токенов.
+
+        Args:
+            files: Список словарей вида {"filename": ..., "content": ..., "relative_path": ...}
+            executor: Пул процессов, в котором разбираются файлы пакета (если не указан, файлы разбираются в потоке)
+        Returns:
+            dict: Рекомендации и замечания по архитектуре и организации пакета и метрики графа импортов (import_graph)
         """
-        cleaned = response.strip()
-        if cleaned.startswith('```json'):
-            cleaned = cleaned[7:]
-        if cleaned.endswith('```'):
-            cleaned = cleaned[:-3]
-        return cleaned.strip()
+        cache, cache_key = self.cache, None
+        if cache is not None:
+            package_code = cache.package_code(files)
+            cache_key = cache.make_key("package", package_code, self.model, self.temperature, self.prompt_version)
+            cached = await asyncio.to_thread(cache.get, cache_key)
+            if cached is not None:
+                logger.info("Результат ИИ-анализа структуры пакета взят из кэша")
+                return cached
+
+        graph = await asyncio.to_thread(build_import_graph, files, executor)
+        summary = truncate_to_tokens(summarize_graph(graph), self.package_summary_tokens, self.model)
+        logger.info(
+            f"Граф импортов пакета: {len(graph.modules)} модулей, {graph.edge_count} зависимостей, "
+            f"сводка {count_tokens(summary, self.model)} токенов"
+        )
+        prompt = render_prompt("package", summary)
+
+        response = await self._get_ai_response(prompt, stage="package")
+        try:
+            result = self._load_json(response, "{", "package")
+        except Exception:
+            metrics.AI_PARSE_FAILURES.labels(parser="package").inc()
+            return {"error": "Ошибка парсинга ответа ИИ", "raw": response, "import_graph": graph.report()}
+
+        if isinstance(result, dict):
+            result["import_graph"] = graph.report()
+        if cache is not None and cache_key is not None and isinstance(result, dict):
+            await asyncio.to_thread(cache.set, cache_key, result, self.prompt_version)
+        return result
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+"""
+Кэш результатов ИИ-анализа.
+
+Ключ кэша — хэш нормализованного кода, модели, температуры и версии промптов, поэтому повторный анализ
+неизменного файла не обращается к модели. Кэш двухуровневый: ограниченный LRU в памяти процесса и
+SQLite-файл на диске, который переживает перезапуск приложения.
+
+SQLite-файл общий для процессов-воркеров. Каждая очистка кэша увеличивает в нем номер поколения, и воркер,
+заметивший новое поколение, очищает свой LRU: очищенные в одном воркере результаты не отдаются из памяти других.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from smart_code_analyzer.backend import metrics
+from smart_code_analyzer.backend.env import get_env_bool, get_env_int
+
+# Настраиваем логирование
+logger = logging.getLogger("uvicorn.error")
+
+DEFAULT_CACHE_SIZE = 256
+DEFAULT_CACHE_DISK_SIZE = 10000
+DEFAULT_CACHE_PATH = ".cache/ai_results.sqlite3"
+
+
+def normalize_code(code: str) -> str:
+    """Нормализация кода для ключа кэша: переводы строк, хвостовые пробелы, пустые строки по краям"""
+    lines = code.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+
+class AIResultCache:
+    """Двухуровневый (память + SQLite) кэш результатов ИИ-анализа"""
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_CACHE_SIZE,
+        path: Optional[str] = DEFAULT_CACHE_PATH,
+        max_disk_entries: int = DEFAULT_CACHE_DISK_SIZE,
+    ):
+        """
+        Инициализация кэша
+
+        Args:
+            max_entries: Максимальное количество записей в памяти
+            path: Путь к SQLite-файлу (если не указан, кэш хранится только в памяти)
+            max_disk_entries: Максимальное количество записей на диске
+        """
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.path = path
+        self._memory: "OrderedDict[str, Tuple[str, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        # Поколение кэша, которому соответствует LRU в памяти
+        self._generation = 0
+
+        if self.path:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            with self._connect() as connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS ai_results (key TEXT PRIMARY KEY, prompt_version TEXT NOT NULL, "
+                    "accessed_at REAL NOT NULL, value TEXT NOT NULL)"
+                )
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS ai_cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+                )
+                self._generation = self._read_generation(connection)
+                connection.execute("CREATE INDEX IF NOT EXISTS ai_results_version ON ai_results (prompt_version)")
+                connection.execute("CREATE INDEX IF NOT EXISTS ai_results_accessed ON ai_results (accessed_at)")
+
+    @classmethod
+    def from_env(cls) -> Optional["AIResultCache"]:
+        """Создание кэша по переменным окружения AI_CACHE_* (None, если кэш выключен)"""
+        if not get_env_bool("AI_CACHE_ENABLED", True):
+            logger.info("Кэш результатов ИИ-анализа выключен")
+            return None
+        cache = cls(
+            max_entries=get_env_int("AI_CACHE_SIZE", DEFAULT_CACHE_SIZE, min_value=1),
+            path=os.getenv("AI_CACHE_PATH", DEFAULT_CACHE_PATH) or None,
+            max_disk_entries=get_env_int("AI_CACHE_DISK_SIZE", DEFAULT_CACHE_DISK_SIZE, min_value=1),
+        )
+        logger.info(f"Кэш результатов ИИ-анализа: {cache.max_entries} записей в памяти, файл {cache.path}")
+        return cache
+
+    @staticmethod
+    def make_key(kind: str, code: str, model: str, temperature: float, prompt_version: str) -> str:
+        """
+        Ключ кэша
+
+        Args:
+            kind: Вид анализа (например, "file" или "package")
+            code: Анализируемый код
+            model: Модель ИИ
+            temperature: Температура генерации
+            prompt_version: Версия промптов
+        """
+        digest = hashlib.sha256()
+        for part in (kind, model, f"{temperature:.3f}", prompt_version, normalize_code(code)):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    @staticmethod
+    def package_code(files: Iterable[Dict[str, Any]]) -> str:
+        """Единый текст пакета для ключа кэша (порядок файлов не важен)"""
+        parts = sorted(f"{f.get('relative_path') or f['filename']}\0{f.get('content', '')}" for f in files)
+        return "\0\0".join(parts)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Соединение с SQLite-файлом кэша (транзакция фиксируется и соединение закрывается на выходе)"""
+        if not self.path:
+            raise sqlite3.OperationalError("Кэш ИИ-анализа хранится только в памяти")
+        connection = sqlite3.connect(self.path, timeout=5.0)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _read_generation(connection: sqlite3.Connection) -> int:
+        """Номер поколения кэша, общий для процессов-воркеров"""
+        row = connection.execute("SELECT value FROM ai_cache_meta WHERE name = 'generation'").fetchone()
+        return row[0] if row else 0
+
+    def _sync_generation(self, connection: sqlite3.Connection) -> None:
+        """Очистка LRU в памяти, если кэш очищен другим процессом-воркером"""
+        generation = self._read_generation(connection)
+        if generation != self._generation:
+            self._memory.clear()
+            self._generation = generation
+
+    def _remember(self, key: str, prompt_version: str, value: Dict[str, Any]) -> None:
+        self._memory[key] = (prompt_version, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Получение копии записи из кэша (None, если записи нет)"""
+        with self._lock:
+            row = None
+            if self.path:
+                try:
+                    with self._connect() as connection:
+                        self._sync_generation(connection)
+                        if key not in self._memory:
+                            row = connection.execute(
+                                "SELECT prompt_version, value FROM ai_results WHERE key = ?", (key,)
+                            ).fetchone()
+                            if row is not None:
+                                connection.execute(
+                                    "UPDATE ai_results SET accessed_at = ? WHERE key = ?", (time.time(), key)
+                                )
+                except sqlite3.Error as e:
+                    logger.warning(f"Ошибка чтения кэша ИИ-анализа: {str(e)}")
+
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                metrics.AI_CACHE_LOOKUPS.labels(result="memory_hit").inc()
+                # Вызывающий код может изменять результат, поэтому запись в памяти не отдается напрямую
+                return copy.deepcopy(self._memory[key][1])
+
+            if row is not None:
+                value = json.loads(row[1])
+                self._remember(key, row[0], copy.deepcopy(value))
+                self._counters["disk_hits"] += 1
+                metrics.AI_CACHE_LOOKUPS.labels(result="disk_hit").inc()
+                return value
+
+            self._counters["misses"] += 1
+            metrics.AI_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+
+    def set(self, key: str, value: Dict[str, Any], prompt_version: str) -> None:
+        """Сохранение записи в кэш"""
+        with self._lock:
+            self._remember(key, prompt_version, copy.deepcopy(value))
+            if not self.path:
+                return
+            try:
+                with self._connect() as connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO ai_results (key, prompt_version, accessed_at, value) "
+                        "VALUES (?, ?, ?, ?)",
+                        (key, prompt_version, time.time(), json.dumps(value, ensure_ascii=False)),
+                    )
+                    connection.execute(
+                        "DELETE FROM ai_results WHERE key IN ("
+                        "SELECT key FROM ai_results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                        (self.max_disk_entries,),
+                    )
+            except sqlite3.Error as e:
+                logger.warning(f"Ошибка записи кэша ИИ-анализа: {str(e)}")
+
+    def invalidate(self, prompt_version: Optional[str] = None) -> int:
+        """
+        Удаление записей из кэша
+
+        Другие процессы-воркеры очищают свой LRU в памяти при следующем обращении к кэшу.
+
+        Args:
+            prompt_version: Версия промптов, записи которой нужно удалить (если не указана, удаляются все записи)
+
+        Returns:
+            int: Количество удаленных записей (по большему из уровней кэша)
+        """
+        with self._lock:
+            memory_keys = [k for k, (v, _) in self._memory.items() if prompt_version is None or v == prompt_version]
+            for key in memory_keys:
+                del self._memory[key]
+
+            removed = len(memory_keys)
+            if self.path:
+                with self._connect() as connection:
+                    if prompt_version is None:
+                        cursor = connection.execute("DELETE FROM ai_results")
+                    else:
+                        cursor = connection.execute(
+                            "DELETE FROM ai_results WHERE prompt_version = ?", (prompt_version,)
+                        )
+                    removed = max(removed, cursor.rowcount)
+                    connection.execute(
+                        "INSERT INTO ai_cache_meta (name, value) VALUES ('generation', 1) "
+                        "ON CONFLICT (name) DO UPDATE SET value = value + 1"
+                    )
+                    self._generation = self._read_generation(connection)
+        logger.info(f"Из кэша ИИ-анализа удалено записей: {removed} (версия промптов: {prompt_version or 'все'})")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика кэша: попадания, промахи, доля попаданий и размер уровней"""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_entries"] = 0
+            if self.path:
+                with self._connect() as connection:
+                    stats["disk_entries"] = connection.execute("SELECT COUNT(*) FROM ai_results").fetchone()[0]
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        total = hits + stats["misses"]
+        stats["hits"] = hits
+        stats["hit_ratio"] = round(hits / total, 4) if total else 0.0
+        return stats
@@ -1,37 +1,233 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 # ---------------------------------------------------------------------------------------------------------------------
+import asyncio
+import hmac
+import json
 import logging
-from dataclasses import asdict
-from typing import Any, Dict, List
+import math
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 
-from code_analizer import FileBatchAnalyzer, HtmlFormatter, HtmlSummaryFormatter, LineProcessor
-from fastapi import APIRouter, File, HTTPException, Request, UploadFile
+from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, Query, Request, UploadFile
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
 
 from smart_code_analyzer.backend.ai_analyzer import AIAnalyzer
-from smart_code_analyzer.backend.models import AIAnalysisResponse, AnalysisResponse, PackageAnalysisRequest
+from smart_code_analyzer.backend.ai_cache import AIResultCache
+from smart_code_analyzer.backend.archive import ArchiveError, ArchiveLimitError, ArchiveReader
+from smart_code_analyzer.backend.http_responses import FastJSONResponse
+from smart_code_analyzer.backend.jobs import Job, JobFunction, JobQueue, QueueFullError
+from smart_code_analyzer.backend.models import (
+    AIAnalysisResponse,
+    AIBulkAnalysisResponse,
+    AnalysisIndexResponse,
+    AnalysisResponse,
+    PackageAnalysisRequest,
+)
+from smart_code_analyzer.backend.parse_pool import FileResult, ParsePool, Upload
+from smart_code_analyzer.backend.resilience import CircuitOpenError
+from smart_code_analyzer.backend.result_store import ResultStore
 
 router = APIRouter(prefix="/analyzer", tags=["analyzer"])
 
-# Настраиваем класс пакетного анализа списка файлов
-batch_analyzer = FileBatchAnalyzer(LineProcessor)
+# Количество файлов на странице оглавления parsing-анализа
+INDEX_PAGE_SIZE = 100
+INDEX_MAX_PAGE_SIZE = 1000
+
+# Тело запроса /analyzer/analyze-archive для OpenAPI: форма разбирается в обработчике, а не FastAPI
+ARCHIVE_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["archive"],
+                    "properties": {
+                        "archive": {
+                            "type": "string",
+                            "format": "binary",
+                            "description": "Архив проекта: zip, tar, tar.gz, tar.bz2 или tar.xz",
+                        }
+                    },
+                }
+            }
+        },
+    }
+}
 
 # Настраиваем логирование
 logger = logging.getLogger("uvicorn.error")
 logger.setLevel(logging.DEBUG)
 
 
-@router.post("/analyze", response_model=Dict[str, AnalysisResponse])
-async def analyze_code(request: Request, files: List[UploadFile] = File(...)):
+def get_ai_analyzer(request: Request) -> AIAnalyzer:
+    """Общий для процесса ИИ-анализатор, созданный в lifespan приложения"""
+    analyzer = getattr(request.app.state, "ai_analyzer", None)
+    if analyzer is None:
+        raise HTTPException(status_code=503, detail="ИИ-анализатор не настроен, проверьте переменные окружения")
+    return analyzer
+
+
+def get_ai_cache(request: Request) -> AIResultCache:
+    """Общий для процесса кэш результатов ИИ-анализа"""
+    cache = getattr(request.app.state, "ai_cache", None)
+    if cache is None:
+        raise HTTPException(status_code=404, detail="Кэш результатов ИИ-анализа выключен")
+    return cache
+
+
+def get_result_store(request: Request) -> ResultStore:
+    """Общее для всех процессов-воркеров хранилище результатов анализа"""
+    return request.app.state.result_store
+
+
+def get_job_queue(request: Request) -> JobQueue:
+    """Очередь фоновых заданий процесса"""
+    return request.app.state.job_queue
+
+
+def get_parse_pool(request: Request) -> ParsePool:
+    """Пул процессов для parsing-анализа"""
+    return request.app.state.parse_pool
+
+
+def get_archive_reader(request: Request) -> ArchiveReader:
+    """Чтение архивов проекта с лимитами из переменных окружения"""
+    return request.app.state.archive_reader
+
+
+def submit_job(queue: JobQueue, kind: str, func: JobFunction) -> JSONResponse:
+    """Постановка задания в очередь и ответ 202 с идентификатором задания"""
+    try:
+        job = queue.submit(kind, func)
+    except QueueFullError as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job.job_id, "status": job.status, "status_url": f"{router.prefix}/status/{job.job_id}"},
+    )
+
+
+def upload_filename(file: UploadFile) -> str:
+    """Имя загруженного файла (400, если клиент его не передал)"""
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="Не указано имя загруженного файла")
+    return file.filename
+
+
+async def load_file_code(store: ResultStore, filename: str, analysis_id: Optional[str]) -> str:
+    """Код файла из сохраненного parsing-анализа"""
+    if not analysis_id:
+        # Без идентификатора анализа можно отдать код из чужого анализа с тем же именем файла
+        raise HTTPException(status_code=400, detail="Не указан analysis_id (заголовок X-Analysis-ID ответа /analyze)")
+
+    code = await asyncio.to_thread(store.get_file_content, analysis_id, filename)
+    if code is None:
+        raise HTTPException(status_code=404, detail=f"Результаты анализа для файла {filename} не найдены")
+
+    if not code:
+        logger.error(f"Код для файла {filename} не найден")
+        raise HTTPException(status_code=404, detail="Код не найден")
+    return code
+
+
+def circuit_open_error(error: CircuitOpenError) -> HTTPException:
+    """Ответ 503 с Retry-After, пока предохранитель API ИИ открыт"""
+    logger.warning(str(error))
+    return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": str(math.ceil(error.retry_after))})
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Сообщение в формате Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def require_admin(authorization: Optional[str] = Header(None)) -> None:
+    """Проверка токена администратора (заголовок `Authorization: Bearer <ADMIN_TOKEN>`)"""
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="Административные операции отключены: ADMIN_TOKEN не задан")
+    if not authorization or not hmac.compare_digest(authorization, f"Bearer {admin_token}"):
+        raise HTTPException(status_code=401, detail="Неверный токен администратора")
+
+
+async def save_parsing_results(
+    store: ResultStore, file_results: List[FileResult], summary_data: Dict[str, Any], summary_html: str
+) -> Tuple[str, Dict[str, AnalysisResponse]]:
+    """Сохранение результатов parsing-анализа в хранилище. Возвращает идентификатор анализа и результаты"""
+    results_analysis = {
+        filename: AnalysisResponse(status="completed", data=data, html=html) for filename, data, html in file_results
+    }
+
+    # Добавляем summary_data в результаты
+    results_analysis["summary"] = AnalysisResponse(status="completed", data=summary_data, html=summary_html)
+
+    # Сохраняем результаты для последующего ИИ-анализа
+    analysis_id = await asyncio.to_thread(
+        store.save_analysis, {name: result.model_dump() for name, result in results_analysis.items()}
+    )
+    return analysis_id, results_analysis
+
+
+async def run_parsing_analysis(
+    uploads: List[Upload], store: ResultStore, pool: ParsePool, render_html: bool = True
+) -> Tuple[str, Dict[str, AnalysisResponse]]:
+    """Parsing-анализ файлов в пуле процессов и сохранение результатов. Возвращает идентификатор анализа и результаты"""
+    return await save_parsing_results(store, *await pool.analyze(uploads, render_html=render_html))
+
+
+async def load_index(
+    store: ResultStore, analysis_id: str, offset: int = 0, limit: int = INDEX_PAGE_SIZE
+) -> AnalysisIndexResponse:
+    """Страница оглавления parsing-анализа"""
+    index = await asyncio.to_thread(store.get_index, analysis_id, offset, limit)
+    if index is None:
+        raise HTTPException(status_code=404, detail=f"Анализ {analysis_id} не найден")
+    return AnalysisIndexResponse(**index)
+
+
+async def parsing_response(
+    store: ResultStore, analysis_id: str, results_analysis: Dict[str, AnalysisResponse], lazy: bool
+) -> FastJSONResponse:
+    """Ответ parsing-анализа (полные результаты или оглавление) с заголовком X-Analysis-ID"""
+    content = await load_index(store, analysis_id) if lazy else results_analysis
+    # Готовый ответ не проходит повторную валидацию response_model и jsonable_encoder
+    return FastJSONResponse(content, headers={"X-Analysis-ID": analysis_id})
+
+
+@router.post(
+    "/analyze",
+    response_model=Union[Dict[str, AnalysisResponse], AnalysisIndexResponse],
+    responses={202: {"model": Dict[str, str]}},
+)
+async def analyze_code(
+    files: List[UploadFile] = File(...),
+    background: bool = Query(False, description="Выполнить в фоне и сразу вернуть идентификатор задания"),
+    lazy: bool = Query(False, description="Вернуть оглавление вместо полных результатов, HTML файлов — по запросу"),
+    store: ResultStore = Depends(get_result_store),
+    queue: JobQueue = Depends(get_job_queue),
+    pool: ParsePool = Depends(get_parse_pool),
+):
     """
     Анализирует загруженные файлы с исходным кодом.
 
     **Параметры:**
     - **files**: Список файлов для анализа (поддерживаются .py, .js, .java, .cpp, .c, .h, .hpp)
+    - **background**: Если `true`, анализ ставится в очередь, а ответ `202` содержит `job_id`.
+      Результат (`analysis_id` и `results` или `index`) доступен на `/analyzer/status/{job_id}`.
+    - **lazy**: Если `true`, HTML файлов не форматируется при анализе, а ответ — оглавление
+      (`AnalysisIndexResponse`: сводка и первая страница метаданных файлов с `file_id`). Данные и HTML файла
+      запрашиваются отдельно на `/analyzer/results/{analysis_id}/files/{file_id}[/html]`.
 
     **Возвращает:**
     - Словарь, где ключ — имя файла, значение — результат анализа (`AnalysisResponse`).
     - Ключ "summary" содержит сводную информацию по всем файлам.
+    - Для `lazy=true` — оглавление `AnalysisIndexResponse`.
+    - Заголовок `X-Analysis-ID` с идентификатором анализа для последующих ИИ-запросов.
 
     **Пример ответа:**
     {
@@ -49,62 +245,243 @@ async def analyze_code(request: Request, files: List[UploadFile] = File(...)):
     """
     try:
         logger.info(f"Загружено файлов для parsing-анализа: {len(files)}")
-        results_analysis = {}
-        datas_list = await batch_analyzer.analyze_files(files)
-        summary_data = batch_analyzer.get_summary()
-
-        code_formatter = HtmlFormatter()
-        summary_formatter = HtmlSummaryFormatter()
-
-        for code_data in datas_list:
-            formatted_html = code_formatter.format(code_data)
-            results_analysis[code_data.filename] = AnalysisResponse(
-                status="completed", data=asdict(code_data), html=formatted_html
-            )
-
-        # Добавляем summary_data в результаты
-        results_analysis["summary"] = AnalysisResponse(
-            status="completed", data=asdict(summary_data), html=summary_formatter.format(summary_data)
-        )
 
-        # Сохраняем результаты для последующего ИИ-анализа
-        request.app.state.results_cache = results_analysis
+        # Содержимое читается заранее: файлы передаются в процессы пула и закрываются вместе с запросом
+        uploads = [(upload_filename(file), await file.read()) for file in files]
+
+        if background:
+
+            async def run(job: Job) -> Dict[str, Any]:
+                analysis_id, results = await run_parsing_analysis(uploads, store, pool, render_html=not lazy)
+                if lazy:
+                    return {"analysis_id": analysis_id, "index": await load_index(store, analysis_id)}
+                return {"analysis_id": analysis_id, "results": results}
 
-        logger.info(f"Parsing-анализ завершен")
-        return results_analysis
+            return submit_job(queue, "analyze", run)
+
+        analysis_id, results_analysis = await run_parsing_analysis(uploads, store, pool, render_html=not lazy)
+
+        logger.info(f"Parsing-анализ {analysis_id} завершен")
+        return await parsing_response(store, analysis_id, results_analysis, lazy)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Ошибка при анализе кода: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def receive_archive(request: Request, reader: ArchiveReader) -> StarletteUploadFile:
+    """
+    Файл archive из multipart-формы запроса
+
+    Форма разбирается из request.stream() с подсчетом байт, а не заранее средствами FastAPI: запрос больше
+    ARCHIVE_MAX_BYTES отклоняется по Content-Length до чтения тела или сразу после получения лимита байт,
+    а не после сохранения всей загрузки во временный файл.
+
+    Raises:
+        ArchiveLimitError: Запрос с архивом больше лимита
+        HTTPException: 400, если запрос не multipart-форма или в ней нет файла archive
+    """
+    reader.check_length(request.headers.get("content-length"))
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise HTTPException(status_code=400, detail="Архив нужно передать полем archive формы multipart/form-data")
+    try:
+        form = await MultiPartParser(request.headers, reader.limit_stream(request.stream()), max_files=1).parse()
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+    archive = form.get("archive")
+    if not isinstance(archive, StarletteUploadFile):
+        await form.close()
+        raise HTTPException(status_code=400, detail="В форме нет файла archive")
+    return archive
+
+
+@router.post(
+    "/analyze-archive",
+    response_model=Union[Dict[str, AnalysisResponse], AnalysisIndexResponse],
+    openapi_extra=ARCHIVE_REQUEST_BODY,
+)
+async def analyze_archive(
+    request: Request,
+    lazy: bool = Query(False, description="Вернуть оглавление вместо полных результатов, HTML файлов — по запросу"),
+    reader: ArchiveReader = Depends(get_archive_reader),
+    store: ResultStore = Depends(get_result_store),
+    pool: ParsePool = Depends(get_parse_pool),
+):
+    """
+    Анализирует Python-файлы из архива проекта.
+
+    Архив не распаковывается целиком: файлы читаются по одному и сразу передаются в пул parsing-анализа.
+    Файлы из служебных каталогов (`__pycache__`, `.git`, `venv` и т.п.) пропускаются.
+
+    **Параметры:**
+    - **archive**: Архив проекта (zip, tar, tar.gz, tar.bz2, tar.xz)
+    - **lazy**: Если `true`, ответ — оглавление `AnalysisIndexResponse` (как у `/analyzer/analyze?lazy=true`)
+
+    **Возвращает:**
+    - Словарь в формате ответа `/analyzer/analyze`; ключ — путь файла внутри архива, ключ "summary" — сводка.
+    - Заголовок `X-Analysis-ID` с идентификатором анализа для последующих ИИ-запросов.
+    - `400` для поврежденного архива или неподдерживаемого формата, `413` при превышении лимитов ARCHIVE_*
+      (слишком большой архив отклоняется до окончания загрузки).
+    """
+    archive = None
+    try:
+        archive = await receive_archive(request, reader)
+        logger.info(f"Загружен архив для parsing-анализа: {archive.filename}")
+        members = reader.iter_members(archive.file)
+        analysis_id, results_analysis = await save_parsing_results(
+            store, *await pool.analyze_stream(members, render_html=not lazy)
+        )
+
+        logger.info(f"Parsing-анализ архива {analysis_id} завершен: {len(results_analysis) - 1} файлов")
+        return await parsing_response(store, analysis_id, results_analysis, lazy)
+    except HTTPException:
+        raise
+    except ArchiveLimitError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ArchiveError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Ошибка при анализе архива: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if archive is not None:
+            await archive.close()
+
+
+@router.get("/results/{analysis_id}", response_model=AnalysisIndexResponse)
+async def get_analysis_index(
+    analysis_id: str,
+    offset: int = Query(0, ge=0, description="Количество пропускаемых файлов"),
+    limit: int = Query(INDEX_PAGE_SIZE, ge=1, le=INDEX_MAX_PAGE_SIZE, description="Количество файлов на странице"),
+    store: ResultStore = Depends(get_result_store),
+):
+    """
+    Оглавление parsing-анализа: сводка и страница метаданных файлов.
+
+    **Параметры:**
+    - **analysis_id**: Идентификатор parsing-анализа (`X-Analysis-ID`).
+    - **offset**, **limit**: Страница оглавления.
+
+    **Возвращает:**
+    - Объект `AnalysisIndexResponse`: `total`, сводка `summary` и `files` — `file_id`, имя, статус, размер
+      и признак `html_ready` (HTML уже отформатирован).
+    """
+    return FastJSONResponse(await load_index(store, analysis_id, offset, limit))
+
+
+@router.get("/results/{analysis_id}/files/{file_id}", response_model=AnalysisResponse)
+async def get_analysis_file(analysis_id: str, file_id: int, store: ResultStore = Depends(get_result_store)):
+    """
+    Данные parsing-анализа одного файла (включая `file_content`) без HTML.
+
+    **Параметры:**
+    - **analysis_id**: Идентификатор parsing-анализа (`X-Analysis-ID`).
+    - **file_id**: Идентификатор файла из оглавления.
+    """
+    result = await asyncio.to_thread(store.get_file, analysis_id, file_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Файл {file_id} анализа {analysis_id} не найден")
+    return FastJSONResponse(AnalysisResponse(status=result["status"], data=result["data"]))
+
+
+@router.get("/results/{analysis_id}/files/{file_id}/html", response_class=HTMLResponse)
+async def get_analysis_file_html(
+    analysis_id: str,
+    file_id: int,
+    store: ResultStore = Depends(get_result_store),
+    pool: ParsePool = Depends(get_parse_pool),
+):
+    """
+    HTML parsing-анализа одного файла.
+
+    Если анализ выполнялся с `lazy=true`, HTML форматируется в пуле parsing-анализа при первом запросе
+    и сохраняется в хранилище, повторные запросы отдают сохраненный HTML.
+
+    **Параметры:**
+    - **analysis_id**: Идентификатор parsing-анализа (`X-Analysis-ID`).
+    - **file_id**: Идентификатор файла из оглавления.
+    """
+    result = await asyncio.to_thread(store.get_file, analysis_id, file_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Файл {file_id} анализа {analysis_id} не найден")
+
+    html = result["html"]
+    if html is None:
+        content = result["data"].get("file_content")
+        if content is None:
+            raise HTTPException(status_code=404, detail=f"Содержимое файла {result['filename']} не найдено")
+        html = await pool.render_file(result["filename"], content)
+        if html is None:
+            raise HTTPException(status_code=500, detail=f"Не удалось отформатировать файл {result['filename']}")
+        await asyncio.to_thread(store.set_file_html, analysis_id, file_id, html)
+        logger.info(f"HTML файла {result['filename']} анализа {analysis_id} отформатирован по запросу")
+    return HTMLResponse(html)
+
+
 @router.get("/status/{analysis_id}", response_model=Dict[str, Any])
-async def get_analysis_status(analysis_id: str) -> Dict[str, Any]:
+async def get_analysis_status(
+    analysis_id: str, store: ResultStore = Depends(get_result_store), queue: JobQueue = Depends(get_job_queue)
+) -> Dict[str, Any]:
     """
     Получает статус анализа по ID.
 
     **Параметры:**
-    - **analysis_id**: Строковый идентификатор анализа.
+    - **analysis_id**: Идентификатор фонового задания (`job_id`) или parsing-анализа (`X-Analysis-ID`).
 
     **Возвращает:**
-    - Словарь с текущим статусом анализа.
+    - Словарь с текущим статусом анализа: `queued`, `running`, `done` или `failed`.
+    - Для фоновых заданий: прогресс по этапам (`progress`), итоговый результат (`result`) или ошибку (`error`).
 
     **Пример ответа:**
     {
-        "analysis_id": "123456",
-        "status": "pending",
-        "message": "Статус анализа будет реализован"
+        "analysis_id": "3f2a...",
+        "kind": "ai-analyze",
+        "status": "running",
+        "progress": {
+            "code_style": "done",
+            "solid_principles": "running",
+            "potential_issues": "running",
+            "recommendations": "done"
+        },
+        "result": null,
+        "error": null
     }
     """
-    return {"analysis_id": analysis_id, "status": "pending", "message": "Статус анализа будет реализован"}
-
-
-@router.post("/ai-analyze", response_model=AIAnalysisResponse)
-async def ai_analyze_code(request: Request, file: UploadFile = File(...)):
+    job = await queue.get(analysis_id)
+    if job is not None:
+        return {"analysis_id": analysis_id, **job}
+
+    if await asyncio.to_thread(store.exists, analysis_id):
+        return {"analysis_id": analysis_id, "status": "done", "message": "Parsing-анализ завершен"}
+
+    raise HTTPException(status_code=404, detail=f"Анализ {analysis_id} не найден")
+
+
+@router.post("/ai-analyze", response_model=AIAnalysisResponse, responses={202: {"model": Dict[str, str]}})
+async def ai_analyze_code(
+    file: UploadFile = File(...),
+    analysis_id: Optional[str] = Form(None, description="Идентификатор анализа из заголовка X-Analysis-ID"),
+    mode: Optional[str] = Query(
+        None, description="Режим анализа: sequential, concurrent, fused, chunked, incremental или fast"
+    ),
+    background: bool = Query(False, description="Выполнить в фоне и сразу вернуть идентификатор задания"),
+    analyzer: AIAnalyzer = Depends(get_ai_analyzer),
+    store: ResultStore = Depends(get_result_store),
+    queue: JobQueue = Depends(get_job_queue),
+):
     """
     Анализирует файл с помощью искусственного интеллекта (ИИ).
 
     **Параметры:**
     - **file**: Один файл для ИИ-анализа (поддерживаются .py, .js, .java, .cpp, .c, .h, .hpp)
+    - **analysis_id**: Идентификатор parsing-анализа (заголовок `X-Analysis-ID` ответа `/analyze`).
+      Обязателен: без него запрос отклоняется с кодом `400`.
+    - **mode**: Режим анализа (`sequential`, `concurrent`, `fused`, `chunked`, `incremental` или `fast`).
+      По умолчанию берется из AI_ANALYSIS_MODE. Файлы больше AI_LARGE_FILE_TOKENS всегда анализируются
+      в режиме `incremental` или `chunked`.
+    - **background**: Если `true`, анализ ставится в очередь, а ответ `202` содержит `job_id`.
+      Прогресс по этапам и результат доступны на `/analyzer/status/{job_id}`.
 
     **Возвращает:**
     - Объект `AIAnalysisResponse` с результатами ИИ-анализа:
@@ -114,6 +491,8 @@ async def ai_analyze_code(request: Request, file: UploadFile = File(...)):
         - potential_issues: Список найденных потенциальных проблем
         - recommendations: Список рекомендаций по улучшению кода
         - overall_score: Общая оценка качества кода (0-100)
+        - missing_stages: Этапы, не давшие результата (частичный анализ)
+        - token_usage: Количество запросов и токенов, потраченных на анализ
 
     **Пример ответа:**
     {
@@ -122,51 +501,246 @@ async def ai_analyze_code(request: Request, file: UploadFile = File(...)):
         "solid_principles": { ... },
         "potential_issues": [ { ... } ],
         "recommendations": [ "..." ],
-        "overall_score": 87.5
+        "overall_score": 87.5,
+        "missing_stages": [],
+        "token_usage": {"requests": 4, "prompt_tokens": 2400, "completion_tokens": 900, "total_tokens": 3300}
     }
     """
     try:
-        filename = file.filename
+        filename = upload_filename(file)
         logger.info(f"ИИ-анализ для файла: {filename}")
 
-        results_cache = request.app.state.results_cache
-        if not results_cache or filename not in results_cache:
-            raise HTTPException(status_code=404, detail=f"Результаты анализа для файла {filename} не найдены")
-
-        code = results_cache[filename].data['file_content']
-
-        if not code:
-            logger.error(f"Код для файла {filename} не найден")
-            raise HTTPException(status_code=404, detail="Код не найден")
-
-        async with AIAnalyzer() as analyzer:
-            result = await analyzer.analyze_code_text(code, filename=filename)
-            if not result:
-                raise HTTPException(status_code=500, detail="Ошибка при ИИ-анализе")
-
-            logger.info(f"ИИ-анализ файла {filename} завершен")
-            return AIAnalysisResponse(
-                filename=filename,
-                code_style=result.code_style,
-                solid_principles=result.solid_principles,
-                potential_issues=result.potential_issues,
-                recommendations=result.recommendations,
-                overall_score=result.overall_score,
-            )
+        if mode and mode not in AIAnalyzer.ANALYSIS_MODES:
+            raise HTTPException(status_code=400, detail=f"Неподдерживаемый режим анализа: {mode}")
+
+        code = await load_file_code(store, filename, analysis_id)
+
+        if background:
+
+            async def run(job: Job) -> Dict[str, Any]:
+                for stage in analyzer.STAGES:
+                    queue.set_progress(job, stage, "running")
+
+                def on_stage(stage: str, stage_result: Any) -> None:
+                    queue.set_progress(job, stage, "done" if stage_result is not None else "failed")
+
+                job_result = await analyzer.analyze_code_text(code, filename=filename, mode=mode, on_stage=on_stage)
+                return AIAnalysisResponse(**job_result.model_dump()).model_dump()
+
+            return submit_job(queue, "ai-analyze", run)
+
+        result = await analyzer.analyze_code_text(code, filename=filename, mode=mode)
+        if not result:
+            raise HTTPException(status_code=500, detail="Ошибка при ИИ-анализе")
+
+        logger.info(f"ИИ-анализ файла {filename} завершен")
+        return AIAnalysisResponse(**result.model_dump())
     except HTTPException:
         raise
+    except CircuitOpenError as e:
+        raise circuit_open_error(e)
     except Exception as e:
         logger.error(f"Ошибка при ИИ-анализе: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/ai-analyze-package", response_model=Dict[str, Any])
-async def ai_analyze_package(request: PackageAnalysisRequest):
+@router.post("/ai-analyze/stream", response_class=StreamingResponse)
+async def ai_analyze_code_stream(
+    file: UploadFile = File(...),
+    analysis_id: Optional[str] = Form(None, description="Идентификатор анализа из заголовка X-Analysis-ID"),
+    mode: Optional[str] = Query(
+        None, description="Режим анализа: sequential, concurrent, fused, chunked, incremental или fast"
+    ),
+    analyzer: AIAnalyzer = Depends(get_ai_analyzer),
+    store: ResultStore = Depends(get_result_store),
+):
+    """
+    ИИ-анализ файла с потоковой выдачей результатов этапов (Server-Sent Events).
+
+    **Параметры:** те же, что у `/analyzer/ai-analyze`.
+
+    **Возвращает:**
+    - Поток `text/event-stream`. Каждый этап отправляется отдельным событием, как только он завершен:
+      `code_style`, `solid_principles`, `potential_issues`, `recommendations`.
+      Данные события: `{"stage": ..., "status": "done" | "failed", "result": ...}`.
+    - События `item` с отдельными проблемами и рекомендациями, как только модель закончила каждую из них
+      (при AI_STREAMING=true): `{"stage": "potential_issues" | "recommendations", "item": ...}`. Это предварительные
+      данные для быстрого отображения, окончательный список приходит в событии этапа.
+    - Итоговое событие `result` с полным `AIAnalysisResponse`, включая `overall_score`.
+    - Событие `error` с полем `detail`, если анализ не удался.
+
+    **Пример потока:**
+    event: item
+    data: {"stage": "potential_issues", "item": {"type": "...", "description": "...", "line": "12", ...}}
+
+    event: code_style
+    data: {"stage": "code_style", "status": "done", "result": {"formatting": "..."}}
+
+    event: result
+    data: {"filename": "main.py", ..., "overall_score": 0.85}
+    """
+    filename = upload_filename(file)
+    logger.info(f"Потоковый ИИ-анализ для файла: {filename}")
+
+    if mode and mode not in AIAnalyzer.ANALYSIS_MODES:
+        raise HTTPException(status_code=400, detail=f"Неподдерживаемый режим анализа: {mode}")
+    code = await load_file_code(store, filename, analysis_id)
+
+    async def events() -> AsyncIterator[str]:
+        queue: "asyncio.Queue[Optional[Tuple[str, Dict[str, Any]]]]" = asyncio.Queue()
+
+        def on_stage(stage: str, stage_result: Any) -> None:
+            status = "done" if stage_result is not None else "failed"
+            queue.put_nowait((stage, {"stage": stage, "status": status, "result": stage_result}))
+
+        def on_item(stage: str, item: Any) -> None:
+            queue.put_nowait(("item", {"stage": stage, "item": item}))
+
+        task = asyncio.create_task(
+            analyzer.analyze_code_text(code, filename=filename, mode=mode, on_stage=on_stage, on_item=on_item)
+        )
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield format_sse(*event)
+
+            result = task.result()
+            logger.info(f"Потоковый ИИ-анализ файла {filename} завершен")
+            yield format_sse("result", AIAnalysisResponse(**result.model_dump()).model_dump())
+        except Exception as e:
+            logger.error(f"Ошибка при потоковом ИИ-анализе: {str(e)}")
+            yield format_sse("error", {"detail": str(e)})
+        finally:
+            # Клиент мог отключиться раньше времени: прекращаем анализ, результат которого уже никто не ждет
+            task.cancel()
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def build_bulk_response(
+    results: Dict[str, Any], errors: Dict[str, str], read_errors: Dict[str, str]
+) -> AIBulkAnalysisResponse:
+    """Ответ пакетного анализа: ошибки чтения файлов объединяются с ошибками анализа"""
+    errors = {**read_errors, **errors}
+    return AIBulkAnalysisResponse(
+        results={name: AIAnalysisResponse(**result.model_dump()) for name, result in results.items()},
+        errors=errors,
+        summary=AIAnalyzer.summarize_batch(results, errors),
+    )
+
+
+@router.post("/ai-analyze-bulk", response_model=AIBulkAnalysisResponse, responses={202: {"model": Dict[str, str]}})
+async def ai_analyze_bulk(
+    files: Optional[List[UploadFile]] = File(None),
+    analysis_id: Optional[str] = Form(None, description="Идентификатор анализа из заголовка X-Analysis-ID"),
+    mode: Optional[str] = Query(
+        None, description="Режим анализа: sequential, concurrent, fused, chunked, incremental или fast"
+    ),
+    background: bool = Query(False, description="Выполнить в фоне и сразу вернуть идентификатор задания"),
+    analyzer: AIAnalyzer = Depends(get_ai_analyzer),
+    store: ResultStore = Depends(get_result_store),
+    queue: JobQueue = Depends(get_job_queue),
+):
+    """
+    Пакетный ИИ-анализ нескольких файлов одним запросом.
+
+    **Параметры:**
+    - **files**: Файлы для ИИ-анализа. Если не переданы, анализируются все файлы parsing-анализа `analysis_id`.
+    - **analysis_id**: Идентификатор parsing-анализа (заголовок `X-Analysis-ID` ответа `/analyze`).
+    - **mode**: Режим анализа каждого файла (`sequential`, `concurrent`, `fused`, `chunked`, `incremental` или `fast`).
+    - **background**: Если `true`, анализ ставится в очередь, а ответ `202` содержит `job_id`.
+      Прогресс по файлам и результат доступны на `/analyzer/status/{job_id}`.
+
+    Одновременно анализируется не больше AI_BULK_CONCURRENCY файлов. Ошибка анализа одного файла
+    не прерывает анализ остальных: такие файлы перечисляются в `errors`.
+
+    **Возвращает:**
+    - Объект `AIBulkAnalysisResponse`:
+        - results: Результаты ИИ-анализа по файлам (`AIAnalysisResponse`)
+        - errors: Ошибки по файлам
+        - summary: Количество файлов, статистика и распределение оценок, суммарные токены
+
+    **Пример ответа:**
+    {
+        "results": {"main.py": { ... }},
+        "errors": {"broken.py": "Код пуст"},
+        "summary": {
+            "total_files": 2,
+            "analyzed": 1,
+            "failed": 1,
+            "score_mean": 0.8,
+            "score_distribution": {"0.0-0.2": 0, "0.2-0.4": 0, "0.4-0.6": 0, "0.6-0.8": 0, "0.8-1.0": 1},
+            ...
+        }
+    }
+    """
+    try:
+        if mode and mode not in AIAnalyzer.ANALYSIS_MODES:
+            raise HTTPException(status_code=400, detail=f"Неподдерживаемый режим анализа: {mode}")
+
+        codes: Dict[str, str] = {}
+        read_errors: Dict[str, str] = {}
+        if files:
+            for file in files:
+                filename = upload_filename(file)
+                try:
+                    codes[filename] = (await file.read()).decode("utf-8")
+                except UnicodeDecodeError:
+                    read_errors[filename] = "Файл не является текстом в кодировке UTF-8"
+        elif analysis_id:
+            codes = await asyncio.to_thread(store.get_file_contents, analysis_id)
+            if not codes:
+                raise HTTPException(status_code=404, detail=f"Анализ {analysis_id} не найден")
+        else:
+            raise HTTPException(status_code=400, detail="Передайте файлы или analysis_id")
+        logger.info(f"Пакетный ИИ-анализ {len(codes)} файлов")
+
+        if background:
+
+            async def run(job: Job) -> Dict[str, Any]:
+                for filename in codes:
+                    queue.set_progress(job, filename, "queued")
+
+                def on_file(filename: str, file_result: Any) -> None:
+                    queue.set_progress(job, filename, "done" if file_result is not None else "failed")
+
+                job_results, job_errors = await analyzer.analyze_code_batch(codes, mode=mode, on_file=on_file)
+                return build_bulk_response(job_results, job_errors, read_errors).model_dump()
+
+            return submit_job(queue, "ai-analyze-bulk", run)
+
+        results, errors = await analyzer.analyze_code_batch(codes, mode=mode)
+        logger.info(f"Пакетный ИИ-анализ завершен: {len(results)} успешно, {len(errors) + len(read_errors)} с ошибкой")
+        return build_bulk_response(results, errors, read_errors)
+    except HTTPException:
+        raise
+    except CircuitOpenError as e:
+        raise circuit_open_error(e)
+    except Exception as e:
+        logger.error(f"Ошибка при пакетном ИИ-анализе: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/ai-analyze-package", response_model=Dict[str, Any], responses={202: {"model": Dict[str, str]}})
+async def ai_analyze_package(
+    request: PackageAnalysisRequest,
+    background: bool = Query(False, description="Выполнить в фоне и сразу вернуть идентификатор задания"),
+    analyzer: AIAnalyzer = Depends(get_ai_analyzer),
+    queue: JobQueue = Depends(get_job_queue),
+    pool: ParsePool = Depends(get_parse_pool),
+):
     """
     ИИ-анализ структуры пакета (проекта).
 
     **Параметры:**
     - **files**: Список файлов с полями filename, content, relative_path (см. модель FileContent).
+    - **background**: Если `true`, анализ ставится в очередь, а ответ `202` содержит `job_id`.
+      Результат доступен на `/analyzer/status/{job_id}`.
 
     **Возвращает:**
     - Словарь с результатами анализа архитектуры и структуры пакета.
@@ -177,22 +751,112 @@ async def ai_analyze_package(request: PackageAnalysisRequest):
         "module_relations": "Как связаны модули между собой.",
         "strong_points": "Сильные стороны структуры.",
         "weak_points": "Слабые стороны структуры.",
-        "recommendations": "Рекомендации по улучшению архитектуры."
+        "recommendations": "Рекомендации по улучшению архитектуры.",
+        "import_graph": {
+            "modules": 12,
+            "dependencies": 20,
+            "unparsed": [],
+            "cycles": [["pkg.a", "pkg.b"]],
+            "fan_in": {"pkg.models": 7},
+            "fan_out": {"pkg.api": 5},
+            "layer_violations": ["pkg.models -> pkg.api"],
+            "external": {"fastapi": 3}
+        }
     }
     """
     try:
-        files = [{"filename": f.filename, "content": f.content} for f in request.files]
+        files = [
+            {"filename": f.filename, "content": f.content, "relative_path": f.relative_path} for f in request.files
+        ]
         logger.info(f"ИИ-анализ структуры пакета {len(files)} файлов")
 
-        async with AIAnalyzer() as analyzer:
-            result = await analyzer.analyze_package_structure(files)
-            if not result:
-                raise HTTPException(status_code=500, detail="Ошибка при анализе структуры пакета")
+        if background:
 
-            logger.info(f"ИИ-анализ структуры пакета завершен")
-            return result
+            async def run(job: Job) -> Dict[str, Any]:
+                return await analyzer.analyze_package_structure(files, pool.executor)
+
+            return submit_job(queue, "ai-analyze-package", run)
+
+        result = await analyzer.analyze_package_structure(files, pool.executor)
+        if not result:
+            raise HTTPException(status_code=500, detail="Ошибка при анализе структуры пакета")
+
+        logger.info(f"ИИ-анализ структуры пакета завершен")
+        return result
     except HTTPException:
         raise
+    except CircuitOpenError as e:
+        raise circuit_open_error(e)
     except Exception as e:
         logger.error(f"Ошибка при анализе пакета: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/providers", response_model=List[Dict[str, Any]])
+async def get_providers(analyzer: AIAnalyzer = Depends(get_ai_analyzer)) -> List[Dict[str, Any]]:
+    """
+    Состояние и статистика провайдеров API ИИ в порядке выбора.
+
+    **Возвращает:**
+    - Для каждого провайдера: приоритет, доступность, отказы подряд, количество запросов и ошибок,
+      медиану и p95 задержки успешных ответов (в целом и по этапам анализа).
+
+    **Пример ответа:**
+    [
+        {
+            "name": "proxyapi",
+            "base_url": "https://api.proxyapi.ru/openai/v1",
+            "priority": 0,
+            "model": null,
+            "healthy": true,
+            "consecutive_failures": 0,
+            "requests": 120,
+            "errors": 2,
+            "latency_ms": {"all": {"samples": 118, "p50": 2100.5, "p95": 6400.0}}
+        }
+    ]
+    """
+    return analyzer.providers.snapshot()
+
+
+@router.get("/cache/stats", response_model=Dict[str, Any])
+async def get_ai_cache_stats(cache: AIResultCache = Depends(get_ai_cache)) -> Dict[str, Any]:
+    """
+    Статистика кэша результатов ИИ-анализа.
+
+    **Возвращает:**
+    - Количество попаданий (в памяти и на диске), промахов, долю попаданий и размеры уровней кэша.
+
+    **Пример ответа:**
+    {
+        "memory_hits": 12,
+        "disk_hits": 3,
+        "misses": 5,
+        "memory_entries": 10,
+        "disk_entries": 42,
+        "hits": 15,
+        "hit_ratio": 0.75
+    }
+    """
+    return await asyncio.to_thread(cache.stats)
+
+
+@router.post("/cache/invalidate", response_model=Dict[str, Any], dependencies=[Depends(require_admin)])
+async def invalidate_ai_cache(
+    prompt_version: Optional[str] = Query(None, description="Версия промптов (если не указана, кэш очищается целиком)"),
+    cache: AIResultCache = Depends(get_ai_cache),
+) -> Dict[str, Any]:
+    """
+    Удаление записей кэша ИИ-анализа (только для администратора).
+
+    **Параметры:**
+    - **prompt_version**: Версия промптов, результаты которой нужно удалить. Если не указана, кэш очищается целиком.
+
+    **Пример ответа:**
+    {
+        "prompt_version": "1",
+        "removed": 42
+    }
+    """
+    removed = await asyncio.to_thread(cache.invalidate, prompt_version)
+    return {"prompt_version": prompt_version, "removed": removed}
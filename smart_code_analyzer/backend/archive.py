@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+"""
+Чтение архивов проекта (zip, tar, tar.gz, tar.bz2, tar.xz) для parsing-анализа.
+
+Размер загрузки проверяется до чтения тела запроса (по Content-Length) и при чтении (по полученным байтам),
+поэтому слишком большой архив отклоняется, не дожидаясь его полной загрузки на диск. Архив не распаковывается
+целиком: участники читаются по одному из загруженного файла (Starlette держит его в SpooledTemporaryFile
+и переносит на диск после первого мегабайта), и каждый подходящий Python-файл сразу передается анализатору.
+Количество файлов, размер одного файла и суммарный распакованный объем ограничены, поэтому сжатый архив-бомба
+не расходует память.
+"""
+
+import logging
+import posixpath
+import tarfile
+import zipfile
+from typing import IO, AsyncGenerator, AsyncIterator, BinaryIO, Iterator, Optional, Tuple
+
+from smart_code_analyzer.backend.env import get_env_int
+
+# Настраиваем логирование
+logger = logging.getLogger("uvicorn.error")
+
+DEFAULT_ARCHIVE_MAX_BYTES = 100 * 1024 * 1024
+DEFAULT_ARCHIVE_MAX_MEMBERS = 2000
+DEFAULT_ARCHIVE_MAX_FILE_BYTES = 1024 * 1024
+DEFAULT_ARCHIVE_MAX_TOTAL_BYTES = 200 * 1024 * 1024
+
+# Расширения файлов, которые передаются анализатору
+ELIGIBLE_EXTENSIONS = (".py",)
+
+# Каталоги, файлы из которых не анализируются
+SKIPPED_DIRECTORIES = {"__pycache__", ".git", ".venv", "venv", "node_modules", ".tox", ".mypy_cache"}
+
+Member = Tuple[str, bytes]
+
+
+class ArchiveError(ValueError):
+    """Архив поврежден или имеет неподдерживаемый формат"""
+
+
+class ArchiveLimitError(ArchiveError):
+    """Архив превышает лимиты размера или количества файлов"""
+
+
+def member_path(name: str) -> Optional[str]:
+    """
+    Нормализованный относительный путь участника архива
+
+    Returns:
+        Optional[str]: Путь или None, если участник не подлежит анализу (абсолютный путь, выход за пределы архива,
+            служебный каталог, неподходящее расширение)
+    """
+    path = posixpath.normpath(name.replace("\\", "/")).lstrip("/")
+    parts = path.split("/")
+    if path in ("", ".") or ".." in parts or SKIPPED_DIRECTORIES.intersection(parts[:-1]):
+        return None
+    if not path.endswith(ELIGIBLE_EXTENSIONS):
+        return None
+    return path
+
+
+class ArchiveReader:
+    """Потоковое чтение Python-файлов из архива с ограничениями по размеру и количеству"""
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_ARCHIVE_MAX_BYTES,
+        max_members: int = DEFAULT_ARCHIVE_MAX_MEMBERS,
+        max_file_bytes: int = DEFAULT_ARCHIVE_MAX_FILE_BYTES,
+        max_total_bytes: int = DEFAULT_ARCHIVE_MAX_TOTAL_BYTES,
+    ):
+        """
+        Инициализация
+
+        Args:
+            max_bytes: Максимальный размер запроса с загружаемым (сжатым) архивом в байтах
+            max_members: Максимальное количество анализируемых файлов
+            max_file_bytes: Максимальный размер одного файла (файлы больше пропускаются)
+            max_total_bytes: Максимальный суммарный распакованный объем анализируемых файлов
+        """
+        self.max_bytes = max_bytes
+        self.max_members = max_members
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+
+    @classmethod
+    def from_env(cls) -> "ArchiveReader":
+        """Создание по переменным окружения ARCHIVE_*"""
+        return cls(
+            max_bytes=get_env_int("ARCHIVE_MAX_BYTES", DEFAULT_ARCHIVE_MAX_BYTES, min_value=1),
+            max_members=get_env_int("ARCHIVE_MAX_MEMBERS", DEFAULT_ARCHIVE_MAX_MEMBERS, min_value=1),
+            max_file_bytes=get_env_int("ARCHIVE_MAX_FILE_BYTES", DEFAULT_ARCHIVE_MAX_FILE_BYTES, min_value=1),
+            max_total_bytes=get_env_int("ARCHIVE_MAX_TOTAL_BYTES", DEFAULT_ARCHIVE_MAX_TOTAL_BYTES, min_value=1),
+        )
+
+    def check_length(self, content_length: Optional[str]) -> None:
+        """
+        Проверка заявленного размера запроса с архивом до чтения его тела
+
+        Args:
+            content_length: Значение заголовка Content-Length (None, если заголовка нет)
+
+        Raises:
+            ArchiveLimitError: Запрос больше max_bytes
+        """
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            raise ArchiveLimitError(f"Архив больше {self.max_bytes} байт")
+
+    async def limit_stream(self, chunks: AsyncIterator[bytes]) -> AsyncGenerator[bytes, None]:
+        """
+        Тело запроса с архивом, прерываемое, как только получено больше max_bytes
+
+        Content-Length может отсутствовать (chunked-загрузка) или не совпадать с телом, поэтому байты
+        считаются и при чтении.
+
+        Raises:
+            ArchiveLimitError: Получено больше max_bytes
+        """
+        received = 0
+        async for chunk in chunks:
+            received += len(chunk)
+            if received > self.max_bytes:
+                raise ArchiveLimitError(f"Архив больше {self.max_bytes} байт")
+            yield chunk
+
+    def iter_members(self, fileobj: BinaryIO) -> Iterator[Member]:
+        """
+        Python-файлы архива в порядке их следования в архиве
+
+        Args:
+            fileobj: Файл архива с произвольным доступом
+
+        Yields:
+            Member: Относительный путь и содержимое файла
+
+        Raises:
+            ArchiveError: Формат архива не поддерживается или архив поврежден
+            ArchiveLimitError: Превышен размер архива, количество файлов или суммарный объем
+        """
+        fileobj.seek(0, 2)
+        size = fileobj.tell()
+        fileobj.seek(0)
+        if size > self.max_bytes:
+            raise ArchiveLimitError(f"Архив больше {self.max_bytes} байт")
+
+        if zipfile.is_zipfile(fileobj):
+            fileobj.seek(0)
+            members = self._iter_zip(fileobj)
+        else:
+            fileobj.seek(0)
+            members = self._iter_tar(fileobj)
+
+        count, total = 0, 0
+        for path, data in members:
+            count += 1
+            total += len(data)
+            if count > self.max_members:
+                raise ArchiveLimitError(f"В архиве больше {self.max_members} Python-файлов")
+            if total > self.max_total_bytes:
+                raise ArchiveLimitError(f"Распакованный объем Python-файлов больше {self.max_total_bytes} байт")
+            yield path, data
+
+    def _read_limited(self, stream: IO[bytes], path: str) -> Optional[bytes]:
+        """Чтение участника не больше max_file_bytes (None, если файл больше лимита)"""
+        data = stream.read(self.max_file_bytes + 1)
+        if len(data) > self.max_file_bytes:
+            logger.warning(f"Файл {path} больше {self.max_file_bytes} байт и пропущен")
+            return None
+        return data
+
+    def _iter_zip(self, fileobj: BinaryIO) -> Iterator[Member]:
+        try:
+            with zipfile.ZipFile(fileobj) as archive:
+                for info in archive.infolist():
+                    path = member_path(info.filename)
+                    if info.is_dir() or path is None:
+                        continue
+                    with archive.open(info) as stream:
+                        data = self._read_limited(stream, path)
+                    if data is not None:
+                        yield path, data
+        except (zipfile.BadZipFile, zipfile.LargeZipFile, NotImplementedError, EOFError) as e:
+            raise ArchiveError(f"Поврежденный zip-архив: {str(e)}") from e
+
+    def _iter_tar(self, fileobj: BinaryIO) -> Iterator[Member]:
+        try:
+            # Потоковый режим: участники читаются последовательно, без построения полного оглавления
+            with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+                for info in archive:
+                    path = member_path(info.name)
+                    if not info.isfile() or path is None:
+                        continue
+                    stream = archive.extractfile(info)
+                    data = self._read_limited(stream, path) if stream is not None else None
+                    if data is not None:
+                        yield path, data
+        except (tarfile.TarError, EOFError, OSError) as e:
+            raise ArchiveError(f"Неподдерживаемый формат или поврежденный архив: {str(e)}") from e
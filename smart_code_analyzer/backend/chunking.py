@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+"""
+Разбиение больших файлов на фрагменты для ИИ-анализа.
+
+Python-код режется по границам верхнеуровневых классов и функций, фрагменты набираются до бюджета токенов.
+Каждый фрагмент помнит свои строки в исходном файле, чтобы номера строк из ответа модели можно было
+пересчитать обратно. Для оценок, которым нужен весь файл (стиль, SOLID), строится «скелет» модуля —
+сигнатуры и первые строки docstring без тел функций.
+"""
+
+import ast
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+# Грубая оценка: в среднем около четырех символов исходного кода на токен
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Приблизительное количество токенов в тексте"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+@dataclass
+class CodeChunk:
+    """Фрагмент исходного файла"""
+
+    text: str
+    start_line: int
+    end_line: int
+    symbols: List[str] = field(default_factory=list)
+
+    @property
+    def title(self) -> str:
+        """Краткое описание фрагмента для логов и промптов"""
+        return f"строки {self.start_line}-{self.end_line}"
+
+    def numbered(self) -> str:
+        """Текст фрагмента с номерами строк исходного файла"""
+        lines = self.text.split("\n")
+        return "\n".join(f"{self.start_line + i:>5}| {line}" for i, line in enumerate(lines))
+
+    def map_line(self, line: object) -> str:
+        """
+        Пересчет строки из ответа модели в номер строки исходного файла.
+
+        Модель может вернуть абсолютный номер (строки пронумерованы), номер относительно начала фрагмента
+        или текст строки кода. Если строку не удалось сопоставить, значение возвращается как есть.
+        """
+        value = str(line).strip()
+        match = re.match(r"^(\d+)", value)
+        if match:
+            number = int(match.group(1))
+            if self.start_line <= number <= self.end_line:
+                return str(number)
+            if 1 <= number <= self.end_line - self.start_line + 1:
+                return str(self.start_line + number - 1)
+            return value
+
+        snippet = value.strip("`").strip()
+        if snippet:
+            for i, code_line in enumerate(self.text.split("\n")):
+                if snippet in code_line:
+                    return str(self.start_line + i)
+        return value
+
+
+def _segment_starts(tree: ast.Module) -> Dict[int, str]:
+    """Первые строки верхнеуровневых узлов модуля (с учетом декораторов) и имена объявленных символов"""
+    starts = {}
+    for node in tree.body:
+        decorators = getattr(node, "decorator_list", [])
+        start = min([node.lineno] + [d.lineno for d in decorators])
+        name = getattr(node, "name", "")
+        starts[start] = name
+    return starts
+
+
+def _split_lines(
+    lines: List[str], start_line: int, max_tokens: int, symbols: List[str], count_tokens: Callable[[str], int]
+) -> List[CodeChunk]:
+    """Разбиение слишком большого сегмента на окна строк в пределах бюджета"""
+    chunks: List[CodeChunk] = []
+    current: List[str] = []
+    current_start = start_line
+    for offset, line in enumerate(lines):
+        if current and count_tokens("\n".join(current + [line])) > max_tokens:
+            chunks.append(CodeChunk("\n".join(current), current_start, current_start + len(current) - 1, symbols))
+            current, current_start = [], start_line + offset
+        current.append(line)
+    if current:
+        chunks.append(CodeChunk("\n".join(current), current_start, current_start + len(current) - 1, symbols))
+    return chunks
+
+
+def top_level_segments(code: str) -> List[CodeChunk]:
+    """
+    Сегменты модуля: строки от начала одного верхнеуровневого узла до начала следующего (с комментариями между ними)
+
+    Raises:
+        SyntaxError: Если код не удалось разобрать
+    """
+    lines = code.split("\n")
+    starts = _segment_starts(ast.parse(code))
+    boundaries = sorted(set([1] + list(starts)))
+    segments = []
+    for i, start in enumerate(boundaries):
+        end = boundaries[i + 1] - 1 if i + 1 < len(boundaries) else len(lines)
+        symbol = starts.get(start, "")
+        segments.append(CodeChunk("\n".join(lines[start - 1 : end]), start, end, [symbol] if symbol else []))
+    return segments
+
+
+def split_code(code: str, max_tokens: int, count_tokens: Callable[[str], int] = estimate_tokens) -> List[CodeChunk]:
+    """
+    Разбиение кода на фрагменты не больше max_tokens токенов.
+
+    Python-код режется по границам верхнеуровневых инструкций (классы, функции, блоки импортов),
+    соседние небольшие сегменты объединяются. Сегмент, который сам превышает бюджет, и код,
+    который не удалось разобрать, режутся по строкам.
+
+    Args:
+        code: Исходный код
+        max_tokens: Бюджет токенов на фрагмент
+        count_tokens: Подсчет токенов текста (тот же, которым анализатор проверяет бюджет запроса)
+
+    Returns:
+        List[CodeChunk]: Фрагменты, покрывающие весь файл без пропусков
+    """
+    try:
+        segments = top_level_segments(code)
+    except SyntaxError:
+        return _split_lines(code.split("\n"), 1, max_tokens, [], count_tokens)
+
+    chunks: List[CodeChunk] = []
+    current: Optional[CodeChunk] = None
+    for segment in segments:
+        if count_tokens(segment.text) > max_tokens:
+            if current is not None:
+                chunks.append(current)
+                current = None
+            lines = segment.text.split("\n")
+            chunks.extend(_split_lines(lines, segment.start_line, max_tokens, segment.symbols, count_tokens))
+            continue
+        if current is not None and count_tokens(current.text + "\n" + segment.text) <= max_tokens:
+            current = CodeChunk(
+                current.text + "\n" + segment.text,
+                current.start_line,
+                segment.end_line,
+                current.symbols + segment.symbols,
+            )
+        else:
+            if current is not None:
+                chunks.append(current)
+            current = segment
+    if current is not None:
+        chunks.append(current)
+    return chunks
+
+
+class _SkeletonTransformer(ast.NodeTransformer):
+    """Замена тел функций на первую строку docstring и многоточие"""
+
+    def _strip_body(self, node):
+        self.generic_visit(node)
+        docstring = ast.get_docstring(node)
+        body: List[ast.stmt] = []
+        if docstring:
+            body.append(ast.Expr(ast.Constant(docstring.strip().split("\n")[0])))
+        body.append(ast.Expr(ast.Constant(Ellipsis)))
+        node.body = body
+        return node
+
+    visit_FunctionDef = _strip_body
+    visit_AsyncFunctionDef = _strip_body
+
+
+def build_skeleton(code: str) -> Optional[str]:
+    """
+    Скелет модуля: импорты, классы, сигнатуры функций и первые строки docstring без тел функций.
+
+    Returns:
+        Optional[str]: Скелет или None, если код не удалось разобрать
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    return ast.unparse(ast.fix_missing_locations(_SkeletonTransformer().visit(tree)))
+
+
+def _normalize_text(text: object) -> str:
+    return re.sub(r"\s+", " ", str(text)).strip().lower()
+
+
+def merge_issues(issues: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Объединение проблем из разных фрагментов без дубликатов (тип, строка и описание), по порядку строк"""
+    merged, seen = [], set()
+    for issue in issues:
+        key = (_normalize_text(issue.get("type")), str(issue.get("line")), _normalize_text(issue.get("description")))
+        if key not in seen:
+            seen.add(key)
+            merged.append(issue)
+
+    def line_order(issue: Dict[str, str]) -> int:
+        value = str(issue.get("line", ""))
+        return int(value) if value.isdigit() else 0
+
+    return sorted(merged, key=line_order)
+
+
+def merge_recommendations(recommendations: List[str]) -> List[str]:
+    """Объединение рекомендаций из разных фрагментов без дубликатов"""
+    merged, seen = [], set()
+    for recommendation in recommendations:
+        key = _normalize_text(recommendation)
+        if key and key not in seen:
+            seen.add(key)
+            merged.append(recommendation)
+    return merged
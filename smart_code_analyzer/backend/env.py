@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+"""
+Чтение числовых и логических параметров из переменных окружения.
+
+Некорректное значение не прерывает запуск: в лог пишется предупреждение и используется значение по умолчанию.
+"""
+
+import logging
+import os
+from typing import Optional
+
+# Настраиваем логирование
+logger = logging.getLogger("uvicorn.error")
+
+TRUE_VALUES = ("1", "true", "yes", "on")
+FALSE_VALUES = ("0", "false", "no", "off")
+
+
+def get_env_float(name: str, default: float, min_value: Optional[float] = None) -> float:
+    """Чтение числа с плавающей точкой (не меньше min_value, если он указан)"""
+    value_str = os.getenv(name)
+    if not value_str:
+        return default
+    try:
+        value = float(value_str)
+        if min_value is not None and value < min_value:
+            raise ValueError(f"значение меньше {min_value}")
+        return value
+    except ValueError:
+        logger.warning(f"Некорректное значение {name}: {value_str}. Используется значение по умолчанию {default}")
+        return default
+
+
+def get_env_int(name: str, default: int, min_value: Optional[int] = None) -> int:
+    """Чтение целого числа (не меньше min_value, если он указан)"""
+    value_str = os.getenv(name)
+    if not value_str:
+        return default
+    try:
+        value = int(value_str)
+        if min_value is not None and value < min_value:
+            raise ValueError(f"значение меньше {min_value}")
+        return value
+    except ValueError:
+        logger.warning(f"Некорректное значение {name}: {value_str}. Используется значение по умолчанию {default}")
+        return default
+
+
+def get_env_bool(name: str, default: bool) -> bool:
+    """Чтение логического значения (1/0, true/false, yes/no, on/off)"""
+    value_str = os.getenv(name)
+    if not value_str:
+        return default
+    value = value_str.strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    logger.warning(f"Некорректное значение {name}: {value_str}. Используется значение по умолчанию {default}")
+    return default
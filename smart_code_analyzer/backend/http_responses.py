@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+"""
+Ответы API: быстрая сериализация JSON, сжатие и условные запросы.
+
+Результаты анализа — большие повторяющиеся JSON и HTML. FastJSONResponse сериализует их через orjson
+(если установлен) и Pydantic-модели без промежуточного jsonable_encoder. ResponseOptimizationMiddleware
+добавляет к ответам строгий ETag, отвечает `304 Not Modified` на повторный GET с совпадающим If-None-Match
+и сжимает тело (brotli, если установлен пакет brotli, иначе gzip) по заголовку Accept-Encoding.
+Потоковые ответы (Server-Sent Events, файлы по частям) проходят без изменений.
+"""
+
+import gzip
+import hashlib
+import importlib.util
+import json
+import logging
+from types import ModuleType
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from smart_code_analyzer.backend.env import get_env_bool, get_env_int
+
+# Настраиваем логирование
+logger = logging.getLogger("uvicorn.error")
+
+# Необязательные зависимости: без них ответы сериализуются стандартным json и сжимаются только gzip
+orjson: Optional[ModuleType] = importlib.import_module("orjson") if importlib.util.find_spec("orjson") else None
+brotli: Optional[ModuleType] = importlib.import_module("brotli") if importlib.util.find_spec("brotli") else None
+
+DEFAULT_COMPRESSION_MIN_SIZE = 1024
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_BROTLI_QUALITY = 4
+
+# Типы содержимого, которые имеет смысл сжимать
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+
+# Заголовки, которые сохраняются в ответе 304 (кроме заголовков CORS)
+NOT_MODIFIED_HEADERS = (b"etag", b"vary", b"cache-control", b"expires", b"content-location", b"date")
+
+
+def _to_jsonable(value: Any) -> Any:
+    """Преобразование Pydantic-моделей при сериализации JSON"""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Объект типа {type(value).__name__} не сериализуется в JSON")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON-ответ с быстрой сериализацией
+
+    Pydantic-модели сериализуются средствами pydantic-core, словари и списки (в том числе с моделями внутри) —
+    через orjson, а без него — стандартным json в том же компактном виде, что и JSONResponse.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.model_dump_json().encode("utf-8")
+        if orjson is not None:
+            try:
+                return orjson.dumps(content, default=_to_jsonable, option=orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                # Например, целые числа больше 64 бит: сериализуем стандартным json
+                pass
+        return json.dumps(
+            content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"), default=_to_jsonable
+        ).encode("utf-8")
+
+
+def make_etag(body: bytes) -> str:
+    """Строгий ETag тела ответа"""
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Совпадение заголовка If-None-Match с ETag ответа
+
+    Сравнение слабое (RFC 9110): префикс W/ не учитывается. Теги сжатых представлений (с суффиксом
+    кодировки, см. encoded_etag) совпадают с тегом исходного тела.
+    """
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    if "*" in tags:
+        return True
+    variants = {etag, *(encoded_etag(etag, encoding) for encoding in ("gzip", "br"))}
+    return any((tag[2:] if tag.startswith("W/") else tag) in variants for tag in tags)
+
+
+def encoded_etag(etag: str, encoding: Optional[str]) -> str:
+    """ETag сжатого представления: строгий валидатор должен отличаться для разных кодировок"""
+    return f'{etag[:-1]}-{encoding}"' if encoding else etag
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """Кодировки из заголовка Accept-Encoding с их весами q"""
+    encodings = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        encodings[name.strip().lower()] = quality
+    return encodings
+
+
+class ResponseOptimizationMiddleware:
+    """ASGI-промежуточный слой: ETag и 304 для GET/HEAD, сжатие тела ответа gzip или brotli"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = DEFAULT_COMPRESSION_MIN_SIZE,
+        gzip_level: int = DEFAULT_GZIP_LEVEL,
+        brotli_quality: int = DEFAULT_BROTLI_QUALITY,
+        compression: bool = True,
+        etags: bool = True,
+    ):
+        """
+        Инициализация
+
+        Args:
+            app: ASGI-приложение
+            minimum_size: Минимальный размер тела в байтах, начиная с которого ответ сжимается
+            gzip_level: Уровень сжатия gzip (1-9)
+            brotli_quality: Качество сжатия brotli (0-11)
+            compression: Сжимать ответы
+            etags: Добавлять ETag и отвечать 304 на условные запросы
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.compression = compression
+        self.etags = etags
+
+    @classmethod
+    def options_from_env(cls) -> Dict[str, Any]:
+        """Параметры по переменным окружения HTTP_* (для app.add_middleware)"""
+        options = {
+            "minimum_size": get_env_int("HTTP_COMPRESSION_MIN_SIZE", DEFAULT_COMPRESSION_MIN_SIZE, min_value=0),
+            "gzip_level": min(get_env_int("HTTP_GZIP_LEVEL", DEFAULT_GZIP_LEVEL, min_value=1), 9),
+            "brotli_quality": min(get_env_int("HTTP_BROTLI_QUALITY", DEFAULT_BROTLI_QUALITY, min_value=0), 11),
+            "compression": get_env_bool("HTTP_COMPRESSION", True),
+            "etags": get_env_bool("HTTP_ETAGS", True),
+        }
+        logger.info(
+            f"Ответы HTTP: сжатие {'включено' if options['compression'] else 'выключено'} "
+            f"(от {options['minimum_size']} байт, brotli: {brotli is not None}), ETag: {options['etags']}, "
+            f"orjson: {orjson is not None}"
+        )
+        return options
+
+    def choose_encoding(self, accept_encoding: str) -> Optional[str]:
+        """Кодировка сжатия, предпочитаемая клиентом (brotli при равных весах)"""
+        encodings = accepted_encodings(accept_encoding)
+        candidates = [("gzip", encodings.get("gzip", encodings.get("*", 0.0)))]
+        if brotli is not None:
+            candidates.insert(0, ("br", encodings.get("br", encodings.get("*", 0.0))))
+        name, quality = max(candidates, key=lambda candidate: candidate[1])
+        return name if quality > 0 else None
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        """Сжатие тела ответа выбранной кодировкой"""
+        # Кодировка br выбирается только при установленном brotli
+        if encoding == "br" and brotli is not None:
+            return brotli.compress(body, quality=self.brotli_quality)
+        # mtime=0: одинаковое тело дает одинаковый результат сжатия
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def _is_compressible(self, headers: MutableHeaders, body: bytes) -> bool:
+        content_type = headers.get("content-type", "")
+        return (
+            self.compression
+            and len(body) >= self.minimum_size
+            and "content-encoding" not in headers
+            and content_type.startswith(COMPRESSIBLE_TYPES)
+            and not content_type.startswith("text/event-stream")
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not (self.compression or self.etags):
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        method = scope["method"]
+        start: Optional[Message] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if passthrough or message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+            if message.get("more_body", False):
+                # Потоковый ответ отдается как есть: буферизация задержала бы события клиенту
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            status, body = start["status"], message.get("body", b"")
+            # Копия заголовков: ответ может отправляться повторно с тем же списком заголовков
+            headers = MutableHeaders(raw=list(start["headers"]))
+            encoding = self.choose_encoding(request_headers.get("accept-encoding", ""))
+            encoding = encoding if self._is_compressible(headers, body) else None
+            if encoding is not None:
+                headers.add_vary_header("Accept-Encoding")
+
+            if self.etags and status == 200 and "etag" not in headers:
+                etag = make_etag(body)
+                headers["ETag"] = encoded_etag(etag, encoding)
+                if_none_match = request_headers.get("if-none-match")
+                if method in ("GET", "HEAD") and if_none_match and etag_matches(if_none_match, etag):
+                    await send(self._not_modified(headers))
+                    await send({"type": "http.response.body", "body": b""})
+                    return
+
+            if encoding is not None:
+                body = self.compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+            await send({**start, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _not_modified(headers: MutableHeaders) -> Message:
+        """Начало ответа 304: только заголовки-валидаторы и заголовки кэширования"""
+        kept: List[Tuple[bytes, bytes]] = [
+            (key, value)
+            for key, value in headers.raw
+            if key in NOT_MODIFIED_HEADERS or key.startswith(b"access-control-")
+        ]
+        return {"type": "http.response.start", "status": 304, "headers": kept}
@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+"""
+Граф импортов Python-пакета.
+
+Для ИИ-анализа структуры пакета все файлы разбираются локально (ast) в граф зависимостей модулей:
+внутренние импорты, циклы (сильно связные компоненты), входящие и исходящие зависимости модулей
+и импорты «снизу вверх» между слоями. Модели отправляется компактная сводка графа вместо содержимого
+файлов, поэтому размер промпта ограничен даже для тысяч файлов.
+"""
+
+import ast
+import posixpath
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# Слои пакета сверху вниз: модуль нижнего слоя не должен импортировать модуль верхнего.
+# Слой модуля определяется по последней части его пути, совпавшей с одним из имен слоя.
+PACKAGE_LAYERS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("presentation", ("api", "views", "routes", "routers", "handlers", "endpoints", "cli", "ui", "main")),
+    ("application", ("services", "service", "use_cases", "usecases", "application")),
+    ("domain", ("domain", "models", "entities", "schemas")),
+    ("infrastructure", ("utils", "helpers", "common", "core", "config", "settings")),
+)
+
+# Сколько элементов каждого раздела попадает в сводку
+SUMMARY_TOP = 10
+
+
+@dataclass
+class ModuleImports:
+    """Импорты одного модуля"""
+
+    name: str
+    path: str
+    imports: List[str] = field(default_factory=list)
+    parsed: bool = True
+
+
+@dataclass
+class ImportGraph:
+    """Граф внутренних зависимостей модулей пакета"""
+
+    modules: Dict[str, str]
+    edges: Dict[str, Set[str]]
+    external: Dict[str, int]
+    unparsed: List[str]
+    other_files: List[str]
+
+    @property
+    def edge_count(self) -> int:
+        return sum(len(targets) for targets in self.edges.values())
+
+    def fan_in(self) -> Dict[str, int]:
+        """Количество модулей, импортирующих каждый модуль"""
+        counts = {module: 0 for module in self.modules}
+        for targets in self.edges.values():
+            for target in targets:
+                counts[target] += 1
+        return counts
+
+    def fan_out(self) -> Dict[str, int]:
+        """Количество внутренних модулей, которые импортирует каждый модуль"""
+        return {module: len(self.edges.get(module, ())) for module in self.modules}
+
+    def cycles(self) -> List[List[str]]:
+        """Циклы импортов: сильно связные компоненты из нескольких модулей (алгоритм Тарьяна без рекурсии)"""
+        index: Dict[str, int] = {}
+        low: Dict[str, int] = {}
+        stack: List[str] = []
+        on_stack: Set[str] = set()
+        components: List[List[str]] = []
+        counter = 0
+
+        for root in sorted(self.modules):
+            if root in index:
+                continue
+            work = [(root, iter(sorted(self.edges.get(root, ()))))]
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, targets = work[-1]
+                for target in targets:
+                    if target not in index:
+                        index[target] = low[target] = counter
+                        counter += 1
+                        stack.append(target)
+                        on_stack.add(target)
+                        work.append((target, iter(sorted(self.edges.get(target, ())))))
+                        break
+                    if target in on_stack:
+                        low[node] = min(low[node], index[target])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        if len(component) > 1:
+                            components.append(sorted(component))
+        return sorted(components, key=lambda component: (-len(component), component))
+
+    def layer_violations(self) -> List[Tuple[str, str]]:
+        """Импорты модулей верхних слоев из модулей нижних слоев"""
+        violations = []
+        for source, targets in sorted(self.edges.items()):
+            source_layer = layer_of(source)
+            if source_layer is None:
+                continue
+            for target in sorted(targets):
+                target_layer = layer_of(target)
+                if target_layer is not None and target_layer < source_layer:
+                    violations.append((source, target))
+        return violations
+
+    def report(self) -> Dict[str, Any]:
+        """Метрики графа для ответа API"""
+        fan_in, fan_out = self.fan_in(), self.fan_out()
+        return {
+            "modules": len(self.modules),
+            "dependencies": self.edge_count,
+            "unparsed": self.unparsed,
+            "cycles": self.cycles(),
+            "fan_in": dict(_top(fan_in)),
+            "fan_out": dict(_top(fan_out)),
+            "layer_violations": [f"{source} -> {target}" for source, target in self.layer_violations()],
+            "external": dict(_top(self.external)),
+        }
+
+
+def layer_of(module: str) -> Optional[int]:
+    """Номер слоя модуля (0 — верхний) или None, если слой не определен"""
+    for part in reversed(module.split(".")):
+        for number, (_, names) in enumerate(PACKAGE_LAYERS):
+            if part in names:
+                return number
+    return None
+
+
+def module_name(path: str) -> str:
+    """Имя модуля по относительному пути файла (package/__init__.py — имя пакета)"""
+    path = posixpath.normpath(path.replace("\\", "/")).lstrip("./")
+    parts = path[: -len(".py")].split("/") if path.endswith(".py") else path.split("/")
+    if parts[-1] == "__init__" and len(parts) > 1:
+        parts = parts[:-1]
+    return ".".join(part for part in parts if part)
+
+
+def parse_module(path: str, content: str) -> ModuleImports:
+    """
+    Импорты модуля с разрешенными относительными импортами
+
+    Выполняется в отдельном процессе или потоке, поэтому принимает и возвращает только простые данные.
+    """
+    name = module_name(path)
+    result = ModuleImports(name=name, path=path)
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        result.parsed = False
+        return result
+
+    package = name.split(".") if path.endswith("__init__.py") else name.split(".")[:-1]
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            result.imports.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package[: len(package) - node.level + 1] if node.level <= len(package) + 1 else []
+                prefix = ".".join(base + ([node.module] if node.module else []))
+            else:
+                prefix = node.module or ""
+            if not prefix:
+                continue
+            # from pkg import module — импорт подмодуля, если такой модуль есть в пакете
+            result.imports.extend(f"{prefix}.{alias.name}" for alias in node.names if alias.name != "*")
+            result.imports.append(prefix)
+    return result
+
+
+def _resolver(modules: Iterable[str]) -> Callable[[str], Optional[str]]:
+    """Поиск внутреннего модуля по имени импорта (точно или по окончанию пути, если корень пакета не загружен)"""
+    known = set(modules)
+    by_suffix: Dict[str, Optional[str]] = {}
+    for module in known:
+        parts = module.split(".")
+        for start in range(1, len(parts)):
+            suffix = ".".join(parts[start:])
+            # Неоднозначные окончания не используются
+            by_suffix[suffix] = None if suffix in by_suffix and by_suffix[suffix] != module else module
+
+    def resolve(imported: str) -> Optional[str]:
+        parts = imported.split(".")
+        for end in range(len(parts), 0, -1):
+            candidate = ".".join(parts[:end])
+            if candidate in known:
+                return candidate
+            # Однословные имена по окончанию не ищутся: import json не должен совпасть с utils.json
+            if end > 1 and by_suffix.get(candidate):
+                return by_suffix[candidate]
+        return None
+
+    return resolve
+
+
+def build_import_graph(files: List[Dict[str, Any]], executor: Optional[Executor] = None) -> ImportGraph:
+    """
+    Построение графа импортов пакета
+
+    Args:
+        files: Файлы пакета (словари с полями filename, content и relative_path)
+        executor: Пул, в котором разбираются файлы (если не указан, файлы разбираются в текущем потоке)
+    """
+    sources = []
+    other_files = []
+    for f in files:
+        path = f.get("relative_path") or f["filename"]
+        if path.endswith(".py"):
+            sources.append((path, f.get("content", "")))
+        else:
+            other_files.append(path)
+
+    if executor is not None and sources:
+        paths, contents = zip(*sources)
+        parsed = list(executor.map(parse_module, paths, contents, chunksize=max(1, len(sources) // 64)))
+    else:
+        parsed = [parse_module(path, content) for path, content in sources]
+
+    modules = {module.name: module.path for module in parsed}
+    resolve = _resolver(modules)
+    edges: Dict[str, Set[str]] = {}
+    external: Dict[str, int] = {}
+    for module in parsed:
+        targets = set()
+        external_roots = set()
+        for imported in module.imports:
+            target = resolve(imported)
+            if target is None:
+                external_roots.add(imported.split(".")[0])
+            elif target != module.name:
+                targets.add(target)
+        if targets:
+            edges[module.name] = targets
+        # Неразрешенный импорт из корня внутреннего пакета — это незагруженный модуль пакета, а не внешний пакет
+        for root in external_roots - {name.split(".")[0] for name in modules}:
+            external[root] = external.get(root, 0) + 1
+
+    return ImportGraph(
+        modules=modules,
+        edges=edges,
+        external=external,
+        unparsed=sorted(module.path for module in parsed if not module.parsed),
+        other_files=sorted(other_files),
+    )
+
+
+def _top(counts: Dict[str, int], limit: int = SUMMARY_TOP) -> List[Tuple[str, int]]:
+    return [item for item in sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit] if item[1] > 0]
+
+
+def _listed(items: List[str], limit: int = SUMMARY_TOP) -> str:
+    listed = "; ".join(items[:limit])
+    return listed + (f" и еще {len(items) - limit}" if len(items) > limit else "")
+
+
+def summarize_graph(graph: ImportGraph) -> str:
+    """
+    Текстовая сводка графа для промпта.
+
+    Сначала идут агрегированные метрики, в конце — список модулей с их внутренними зависимостями, поэтому при
+    обрезке сводки до лимита токенов теряются только хвостовые строки этого списка.
+    """
+    fan_in, fan_out = graph.fan_in(), graph.fan_out()
+    cycles = graph.cycles()
+    violations = graph.layer_violations()
+    lines = [
+        f"Python-модулей: {len(graph.modules)}, внутренних зависимостей: {graph.edge_count}, "
+        f"не удалось разобрать: {len(graph.unparsed)}, других файлов: {len(graph.other_files)}",
+        "Внешние пакеты (модулей-импортеров): "
+        + (", ".join(f"{name} ({count})" for name, count in _top(graph.external)) or "нет"),
+        f"Циклы импортов ({len(cycles)}): "
+        + (_listed(["{" + ", ".join(cycle) + "}" for cycle in cycles]) if cycles else "нет"),
+        "Больше всего импортируются (fan-in): "
+        + (", ".join(f"{name} ({count})" for name, count in _top(fan_in)) or "нет"),
+        "Больше всего импортируют (fan-out): "
+        + (", ".join(f"{name} ({count})" for name, count in _top(fan_out)) or "нет"),
+        f"Импорты верхних слоев из нижних ({len(violations)}): "
+        + (_listed([f"{source} -> {target}" for source, target in violations]) if violations else "нет"),
+    ]
+    if graph.unparsed:
+        lines.append(f"Не удалось разобрать: {_listed(graph.unparsed)}")
+    if graph.other_files:
+        lines.append(f"Другие файлы: {_listed(graph.other_files)}")
+    lines.append("Модули и их внутренние зависимости:")
+    lines.extend(
+        f"- {module}: {', '.join(sorted(graph.edges.get(module, ()))) or '—'}" for module in sorted(graph.modules)
+    )
+    return "\n".join(lines)
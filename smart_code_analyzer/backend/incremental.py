@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+"""
+Инкрементальный повторный анализ Python-модулей.
+
+Модуль делится на верхнеуровневые символы (классы, функции и блоки инструкций между ними). Отпечаток символа —
+хэш его текста, поэтому символ сохраняет отпечаток при сдвиге по файлу. Проблемы и рекомендации запоминаются
+по отпечатку символа с номерами строк относительно его начала, и при повторной загрузке измененного файла
+модели отправляются только изменившиеся символы.
+"""
+
+import ast
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from smart_code_analyzer.backend.chunking import CodeChunk, top_level_segments
+
+
+@dataclass
+class Symbol:
+    """Верхнеуровневый символ модуля"""
+
+    name: str
+    chunk: CodeChunk
+
+    @property
+    def title(self) -> str:
+        """Имя символа и его строки для ответа и логов"""
+        return f"{self.name} ({self.chunk.start_line}-{self.chunk.end_line})"
+
+    def contains(self, line: object) -> bool:
+        """Принадлежит ли строка с номером line символу"""
+        value = str(line).strip()
+        return value.isdigit() and self.chunk.start_line <= int(value) <= self.chunk.end_line
+
+
+def split_symbols(code: str) -> Optional[List[Symbol]]:
+    """
+    Символы модуля
+
+    Returns:
+        Optional[List[Symbol]]: Символы по порядку или None, если код не удалось разобрать как Python
+    """
+    try:
+        segments = top_level_segments(code)
+    except (SyntaxError, ValueError):
+        return None
+    symbols = []
+    for segment in segments:
+        if not segment.text.strip():
+            continue
+        name = segment.symbols[0] if segment.symbols else "<module>"
+        symbols.append(Symbol(name, segment))
+    return symbols
+
+
+def module_context(code: str) -> str:
+    """Контекст модуля для анализа отдельных символов: импорты и имена верхнеуровневых объявлений"""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return ""
+    imports = [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    names = [node.name for node in tree.body if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef))]
+    context = "\n".join(imports)
+    if names:
+        context += f"\n# Объявлены в модуле: {', '.join(names)}"
+    return context.strip()
+
+
+def group_symbols(symbols: List[Symbol], max_tokens: int, count_tokens) -> List[List[Symbol]]:
+    """Объединение символов в пакеты для одного запроса к модели (не больше max_tokens токенов в пакете)"""
+    batches: List[List[Symbol]] = []
+    current: List[Symbol] = []
+    current_tokens = 0
+    for symbol in symbols:
+        tokens = count_tokens(symbol.chunk.text)
+        if current and current_tokens + tokens > max_tokens:
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(symbol)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _relative_line(symbol: Symbol, line: object) -> Optional[int]:
+    match = re.match(r"^\s*(\d+)", str(line))
+    if match and symbol.contains(match.group(1)):
+        return int(match.group(1)) - symbol.chunk.start_line + 1
+    return None
+
+
+def to_memo(symbol: Symbol, issues: List[Dict[str, str]], recommendations: List[str]) -> Dict[str, Any]:
+    """Запись памяти символа: номера строк проблем хранятся относительно начала символа"""
+    stored = []
+    for issue in issues:
+        offset = _relative_line(symbol, issue.get("line"))
+        stored.append({**issue, "line": issue.get("line") if offset is None else None, "offset": offset})
+    return {"issues": stored, "recommendations": recommendations}
+
+
+def from_memo(symbol: Symbol, memo: Dict[str, Any]) -> Dict[str, Any]:
+    """Проблемы и рекомендации символа из памяти с номерами строк в текущей версии файла"""
+    issues = []
+    for issue in memo.get("issues", []):
+        issue = dict(issue)
+        offset = issue.pop("offset", None)
+        if offset is not None:
+            issue["line"] = str(symbol.chunk.start_line + offset - 1)
+        issues.append(issue)
+    return {"issues": issues, "recommendations": list(memo.get("recommendations", []))}
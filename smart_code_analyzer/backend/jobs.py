@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+"""
+Очередь фоновых заданий анализа.
+
+Тяжелые эндпоинты в фоновом режиме сразу возвращают идентификатор задания, а работа выполняется
+ограниченным пулом воркеров внутри процесса. Состояние задания (queued/running/done/failed, прогресс
+по этапам, итоговый результат) доступно через `/analyzer/status/{analysis_id}`.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from smart_code_analyzer.backend.env import get_env_int
+from smart_code_analyzer.backend.result_store import ResultStore
+
+# Настраиваем логирование
+logger = logging.getLogger("uvicorn.error")
+
+DEFAULT_JOB_WORKERS = 4
+DEFAULT_JOB_QUEUE_SIZE = 100
+DEFAULT_JOB_HISTORY = 1000
+
+
+class QueueFullError(RuntimeError):
+    """Очередь заданий заполнена"""
+
+
+@dataclass
+class Job:
+    """Фоновое задание анализа"""
+
+    job_id: str
+    kind: str
+    status: str = "queued"
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    progress: Dict[str, str] = field(default_factory=dict)
+    result: Any = None
+    error: Optional[str] = None
+    version: int = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Состояние задания в виде, пригодном для JSON"""
+        return jsonable_encoder(
+            {
+                "job_id": self.job_id,
+                "kind": self.kind,
+                "status": self.status,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "progress": self.progress,
+                "result": self.result,
+                "error": self.error,
+            }
+        )
+
+
+JobFunction = Callable[[Job], Awaitable[Any]]
+
+
+class JobQueue:
+    """Ограниченная очередь заданий с фиксированным пулом воркеров"""
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_JOB_WORKERS,
+        max_queue: int = DEFAULT_JOB_QUEUE_SIZE,
+        store: Optional[ResultStore] = None,
+        history: int = DEFAULT_JOB_HISTORY,
+    ):
+        """
+        Инициализация очереди
+
+        Args:
+            workers: Количество одновременно выполняемых заданий
+            max_queue: Максимальное количество заданий, ожидающих выполнения
+            store: Хранилище, в котором сохраняется состояние заданий для других процессов-воркеров
+            history: Сколько последних заданий хранить в памяти процесса
+        """
+        self.workers = workers
+        self.max_queue = max_queue
+        self.store = store
+        self.history = history
+        self._queue: "asyncio.Queue[Tuple[Job, JobFunction]]" = asyncio.Queue(maxsize=max_queue)
+        self._jobs: Dict[str, Job] = {}
+        self._tasks: List[asyncio.Task] = []
+        # Незавершенные сохранения состояния: ссылки не дают сборщику мусора удалить задачи до окончания записи
+        self._saves: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_env(cls, store: Optional[ResultStore] = None) -> "JobQueue":
+        """Создание очереди по переменным окружения JOB_*"""
+        queue = cls(
+            workers=get_env_int("JOB_WORKERS", DEFAULT_JOB_WORKERS, min_value=1),
+            max_queue=get_env_int("JOB_QUEUE_SIZE", DEFAULT_JOB_QUEUE_SIZE, min_value=1),
+            store=store,
+        )
+        logger.info(f"Очередь заданий: {queue.workers} воркеров, до {queue.max_queue} заданий в очереди")
+        return queue
+
+    async def start(self) -> None:
+        """Запуск воркеров"""
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """
+        Остановка воркеров с дозаписью состояния заданий в хранилище
+
+        Выполняемые задания прерываются, а ожидающие в очереди завершаются ошибкой: иначе их статус навсегда
+        остался бы queued.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while not self._queue.empty():
+            job, _ = self._queue.get_nowait()
+            job.status = "failed"
+            job.error = "Задание не выполнено: приложение остановлено"
+            job.finished_at = time.time()
+            self._persist(job)
+            self._queue.task_done()
+        await asyncio.gather(*self._saves, return_exceptions=True)
+
+    @property
+    def depth(self) -> int:
+        """Количество заданий, ожидающих выполнения"""
+        return self._queue.qsize()
+
+    def submit(self, kind: str, func: JobFunction) -> Job:
+        """
+        Постановка задания в очередь
+
+        Args:
+            kind: Вид задания (analyze, ai-analyze, ai-analyze-package)
+            func: Корутина-функция, выполняющая задание; получает объект задания для обновления прогресса
+
+        Raises:
+            QueueFullError: Если очередь заполнена
+        """
+        job = Job(job_id=uuid.uuid4().hex, kind=kind)
+        try:
+            self._queue.put_nowait((job, func))
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Очередь заданий заполнена ({self.max_queue})")
+
+        self._jobs[job.job_id] = job
+        self._prune()
+        self._persist(job)
+        logger.info(f"Задание {job.job_id} ({kind}) поставлено в очередь, в очереди: {self.depth}")
+        return job
+
+    def set_progress(self, job: Job, stage: str, status: str) -> None:
+        """Обновление прогресса этапа задания"""
+        job.progress[stage] = status
+        self._persist(job)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Состояние задания: из памяти процесса или из общего хранилища"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.snapshot()
+        if self.store is not None:
+            return await asyncio.to_thread(self.store.get_job, job_id)
+        return None
+
+    def _prune(self) -> None:
+        """Удаление из памяти самых старых завершенных заданий сверх лимита истории"""
+        finished = [job for job in self._jobs.values() if job.status in ("done", "failed")]
+        for job in sorted(finished, key=lambda j: j.created_at)[: max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job.job_id]
+
+    def _persist(self, job: Job) -> None:
+        """Фоновое сохранение состояния задания в общее хранилище"""
+        if self.store is None:
+            return
+        job.version += 1
+        # Порядок завершения записей не важен: хранилище не заменяет более новую версию состояния более старой
+        task = asyncio.ensure_future(self._save(self.store, job.job_id, job.version, job.snapshot()))
+        self._saves.add(task)
+        task.add_done_callback(self._saves.discard)
+
+    async def _save(self, store: ResultStore, job_id: str, version: int, snapshot: Dict[str, Any]) -> None:
+        try:
+            await asyncio.to_thread(store.save_job, job_id, version, snapshot)
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить состояние задания {job_id}: {str(e)}")
+
+    async def _worker(self) -> None:
+        """Воркер: выполняет задания из очереди по одному"""
+        while True:
+            job, func = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            self._persist(job)
+            try:
+                job.result = await func(job)
+                job.status = "done"
+            except asyncio.CancelledError:
+                job.status = "failed"
+                job.error = "Задание прервано остановкой приложения"
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(getattr(e, "detail", None) or e)
+                logger.error(f"Задание {job.job_id} ({job.kind}) завершилось ошибкой: {job.error}")
+            finally:
+                job.finished_at = time.time()
+                self._persist(job)
+                self._queue.task_done()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+"""
+Терпимый потоковый разбор JSON-ответов модели.
+
+Ответ модели приходит частями (stream) и не всегда является корректным JSON: он бывает обернут в markdown
+или пояснения, обрезан по лимиту токенов или испорчен в середине. JSONStreamParser получает текст по частям,
+пропускает все до начала корневого объекта или массива и отслеживает вложенность контейнеров. Каждый завершенный
+элемент массива (например, одна проблема из списка potential_issues) возвращается сразу, как только закрыт,
+вместе с путем — ключами объектов, в которых лежит массив. После окончания ответа result() разбирает документ
+целиком, а если это невозможно — восстанавливает наибольшее корректное начало: текст до последней границы
+элемента дополняется закрывающими скобками.
+"""
+
+import json
+from typing import Any, List, Optional, Tuple
+
+# Путь массива в документе: ключи объектов от корня (пустой кортеж — корневой массив)
+Path = Tuple[str, ...]
+
+# Сколько последних границ элементов проверяется при восстановлении начала документа
+MAX_RECOVERY_ATTEMPTS = 50
+
+# Границы поиска повтора конца предыдущей части ответа в начале продолжения, символы
+MIN_CONTINUATION_OVERLAP = 8
+MAX_CONTINUATION_OVERLAP = 200
+
+CLOSERS = {"{": "}", "[": "]"}
+
+
+class _Container:
+    """Открытый объект или массив"""
+
+    __slots__ = ("kind", "path", "item_start", "string", "pending_key")
+
+    def __init__(self, kind: str, path: Path):
+        self.kind = kind
+        # Ключи объектов от корня до контейнера
+        self.path = path
+        # Начало текущего элемента массива
+        self.item_start: Optional[int] = None
+        # Границы последней строки объекта (кандидат в ключ) и ключ текущего значения
+        self.string: Optional[Tuple[int, int]] = None
+        self.pending_key: Optional[str] = None
+
+
+class JSONStreamParser:
+    """Инкрементальный разбор JSON с выдачей завершенных элементов массивов и восстановлением начала"""
+
+    def __init__(self, root: Optional[str] = None):
+        """
+        Инициализация
+
+        Args:
+            root: Ожидаемый тип корня ("{" или "["), None — первый встреченный объект или массив
+        """
+        self.roots = root or "{["
+        self.buffer = ""
+        self.start: Optional[int] = None
+        self.end: Optional[int] = None
+        self.broken = False
+        self._position = 0
+        self._stack: List[_Container] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        # Позиции, до которых текст с добавленными закрывающими скобками является корректным JSON
+        self._checkpoints: List[Tuple[int, str]] = []
+
+    @property
+    def finished(self) -> bool:
+        """Корневой контейнер закрыт или разбор прекращен из-за несогласованных скобок"""
+        return self.end is not None or self.broken
+
+    def feed(self, text: str) -> List[Tuple[Path, Any]]:
+        """
+        Добавление очередной части ответа
+
+        Returns:
+            List[Tuple[Path, Any]]: Элементы массивов, завершенные в этой части, и пути массивов
+        """
+        self.buffer += text
+        items: List[Tuple[Path, Any]] = []
+        buffer = self.buffer
+        position = self._position
+        while position < len(buffer) and not self.finished:
+            self._step(buffer, position, buffer[position], items)
+            position += 1
+        self._position = position
+        return items
+
+    def _step(self, buffer: str, i: int, char: str, items: List[Tuple[Path, Any]]) -> None:
+        if self.start is None:
+            if char in self.roots:
+                self.start = i
+                self._stack.append(_Container(char, ()))
+                self._checkpoint(i + 1)
+            return
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                self._stack[-1].string = (self._string_start, i + 1)
+            return
+        top = self._stack[-1]
+        if char in " \t\r\n":
+            return
+        if char == '"':
+            self._in_string = True
+            self._string_start = i
+            self._begin_item(top, i)
+        elif char in CLOSERS:
+            self._begin_item(top, i)
+            key = top.pending_key if top.kind == "{" else None
+            self._stack.append(_Container(char, top.path + (key,) if key is not None else top.path))
+            self._checkpoint(i + 1)
+        elif char in "}]":
+            if CLOSERS[top.kind] != char:
+                self.broken = True
+                return
+            self._stack.pop()
+            if top.kind == "[" and top.item_start is not None:
+                self._emit(buffer[top.item_start : i], top.path, items)
+            if not self._stack:
+                self.end = i + 1
+                return
+            self._checkpoint(i + 1)
+        elif char == ":" and top.kind == "{":
+            if top.string is not None:
+                try:
+                    top.pending_key = json.loads(buffer[top.string[0] : top.string[1]])
+                except ValueError:
+                    top.pending_key = None
+        elif char == ",":
+            if top.kind == "[":
+                if top.item_start is not None:
+                    self._emit(buffer[top.item_start : i], top.path, items)
+                top.item_start = None
+            else:
+                top.pending_key = None
+                top.string = None
+            self._checkpoint(i)
+        else:
+            self._begin_item(top, i)
+
+    @staticmethod
+    def _begin_item(top: _Container, i: int) -> None:
+        if top.kind == "[" and top.item_start is None:
+            top.item_start = i
+
+    @staticmethod
+    def _emit(text: str, path: Path, items: List[Tuple[Path, Any]]) -> None:
+        try:
+            items.append((path, json.loads(text)))
+        except ValueError:
+            # Испорченный элемент пропускается, остальные элементы массива выдаются
+            pass
+
+    def _checkpoint(self, position: int) -> None:
+        # Недописанный элемент массива не восстанавливается: границы внутри элементов не запоминаются
+        if any(container.kind == "[" for container in self._stack[:-1]):
+            return
+        closers = "".join(CLOSERS[container.kind] for container in reversed(self._stack))
+        self._checkpoints.append((position, closers))
+
+    def result(self) -> Tuple[Any, bool]:
+        """
+        Разобранный документ
+
+        Returns:
+            Tuple[Any, bool]: Значение и признак того, что документ разобран целиком (False — восстановлено начало)
+
+        Raises:
+            json.JSONDecodeError: Если в ответе нет ни одного корректного начала JSON-документа
+        """
+        if self.start is None:
+            raise json.JSONDecodeError("В ответе нет JSON", self.buffer, 0)
+        if self.end is not None:
+            try:
+                return json.loads(self.buffer[self.start : self.end]), True
+            except ValueError:
+                pass
+        for position, closers in reversed(self._checkpoints[-MAX_RECOVERY_ATTEMPTS:]):
+            try:
+                return json.loads(self.buffer[self.start : position].rstrip().rstrip(",") + closers), False
+            except ValueError:
+                continue
+        raise json.JSONDecodeError("Не удалось восстановить JSON из ответа", self.buffer, self.start)
+
+
+def loads_lenient(text: str, root: Optional[str] = None) -> Tuple[Any, bool]:
+    """
+    Терпимый разбор полного ответа модели (см. JSONStreamParser.result)
+
+    Args:
+        text: Ответ модели
+        root: Ожидаемый тип корня ("{" или "["), None — любой
+    """
+    parser = JSONStreamParser(root)
+    parser.feed(text)
+    return parser.result()
+
+
+def continuation_text(text: str, continuation: Optional[str]) -> str:
+    """
+    Новая часть ответа из продолжения обрезанного ответа text: без markdown-обертки
+    и без повтора конца уже полученного текста
+    """
+    continuation = continuation or ""
+    if continuation.lstrip().startswith("```"):
+        continuation = continuation.lstrip().partition("\n")[2]
+    longest = min(len(text), len(continuation), MAX_CONTINUATION_OVERLAP)
+    for size in range(longest, MIN_CONTINUATION_OVERLAP - 1, -1):
+        if text.endswith(continuation[:size]):
+            return continuation[size:]
+    return continuation
@@ -1,8 +1,11 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 # ---------------------------------------------------------------------------------------------------------------------
+import asyncio
+import logging
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 import uvicorn
 from fastapi import FastAPI
@@ -15,22 +18,19 @@ from prometheus_fastapi_instrumentator import Instrumentator
 from pydantic import ValidationError
 from pydantic_settings import BaseSettings
 
+from smart_code_analyzer.backend import metrics
+from smart_code_analyzer.backend.ai_analyzer import AIAnalyzer
+from smart_code_analyzer.backend.ai_cache import AIResultCache
 from smart_code_analyzer.backend.analyzer_api import router as analyzer_router
+from smart_code_analyzer.backend.archive import ArchiveReader
+from smart_code_analyzer.backend.http_responses import FastJSONResponse, ResponseOptimizationMiddleware
+from smart_code_analyzer.backend.jobs import JobQueue
 from smart_code_analyzer.backend.models import ErrorResponse
+from smart_code_analyzer.backend.parse_pool import ParsePool
+from smart_code_analyzer.backend.result_store import ResultStore
 
-app = FastAPI(
-    title="Smart Code Analyzer",
-    description="""
-    Smart Code Analyzer — сервис для анализа исходного кода и архитектуры проектов с помощью статических методов и 
-    искусственного интеллекта.
-
-    **Возможности:**
-    - Анализ отдельных файлов и целых пакетов
-    - Проверка стиля, SOLID, поиск проблем
-    - ИИ-анализ структуры проекта
-    """,
-    version="0.0.13",
-)
+# Настраиваем логирование
+logger = logging.getLogger("uvicorn.error")
 
 
 class Settings(BaseSettings):
@@ -39,10 +39,13 @@ class Settings(BaseSettings):
         "http://localhost:3000",
     ]
     ALLOWED_METHODS: List[str] = ["GET", "POST"]
-    ALLOWED_HEADERS: List[str] = ["Content-Type", "Authorization"]
+    ALLOWED_HEADERS: List[str] = ["Content-Type", "Authorization", "If-None-Match"]
     OPENAI_API_KEY: str
-    PROXYAPI_KEY: str
+    # Ключ провайдера по умолчанию; не нужен, если ключи заданы в AI_PROVIDERS
+    PROXYAPI_KEY: Optional[str] = None
     AI_MODEL: str = "gpt-3.5-turbo"
+    AI_WARMUP: bool = True
+    EVENT_LOOP_LAG_INTERVAL: float = 0.5
 
     class Config:
         env_file = ".env"
@@ -51,6 +54,60 @@ class Settings(BaseSettings):
 
 settings = Settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Жизненный цикл приложения: общие для процесса-воркера ресурсы — хранилище результатов, очередь фоновых
+    заданий, пул процессов parsing-анализа, кэш, один ИИ-анализатор (с пулом HTTP-соединений) и измерение
+    задержки цикла событий для метрик.
+
+    Анализатор создается при старте, прогревает соединения и закрывается при остановке приложения.
+    Если анализатор не удалось настроить, приложение запускается без него, а ИИ-эндпоинты отвечают 503.
+    """
+    lag_monitor = asyncio.create_task(metrics.monitor_event_loop_lag(settings.EVENT_LOOP_LAG_INTERVAL))
+    app.state.result_store = ResultStore.from_env()
+    app.state.job_queue = JobQueue.from_env(store=app.state.result_store)
+    await app.state.job_queue.start()
+    app.state.parse_pool = ParsePool.from_env()
+    app.state.archive_reader = ArchiveReader.from_env()
+    app.state.ai_cache = AIResultCache.from_env()
+    try:
+        app.state.ai_analyzer = AIAnalyzer(cache=app.state.ai_cache)
+    except ValueError as e:
+        logger.error(f"ИИ-анализатор не настроен: {str(e)}")
+        app.state.ai_analyzer = None
+
+    if app.state.ai_analyzer is not None and settings.AI_WARMUP:
+        await app.state.ai_analyzer.warmup()
+    try:
+        yield
+    finally:
+        lag_monitor.cancel()
+        with suppress(asyncio.CancelledError):
+            await lag_monitor
+        await app.state.job_queue.stop()
+        app.state.parse_pool.shutdown()
+        if app.state.ai_analyzer is not None:
+            await app.state.ai_analyzer.close()
+
+
+app = FastAPI(
+    title="Smart Code Analyzer",
+    description="""
+    Smart Code Analyzer — сервис для анализа исходного кода и архитектуры проектов с помощью статических методов и 
+    искусственного интеллекта.
+
+    **Возможности:**
+    - Анализ отдельных файлов и целых пакетов
+    - Проверка стиля, SOLID, поиск проблем
+    - ИИ-анализ структуры проекта
+    """,
+    version="0.0.13",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
+
 # Настройка CORS
 app.add_middleware(
     CORSMiddleware,
@@ -58,8 +115,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=settings.ALLOWED_METHODS,
     allow_headers=settings.ALLOWED_HEADERS,
+    expose_headers=["X-Analysis-ID", "ETag"],
 )
 
+# Сжатие ответов и условные запросы (ETag, 304 Not Modified)
+app.add_middleware(ResponseOptimizationMiddleware, **ResponseOptimizationMiddleware.options_from_env())
+
 # Подключаем статические файлы
 BASE_DIR = Path(__file__).resolve().parent.parent
 TEMPLATES_DIR = BASE_DIR / "frontend" / "templates"
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+"""
+Метрики Prometheus конвейера анализа: запросы к API ИИ, кэш, parsing-анализ и цикл событий.
+
+Метрики регистрируются в общем реестре prometheus_client, поэтому отдаются на `/metrics` вместе с метриками
+HTTP-запросов от prometheus-fastapi-instrumentator.
+"""
+
+import asyncio
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Состояние предохранителя: 0 — закрыт (запросы идут), 1 — полуоткрыт (пробный запрос), 2 — открыт (отказ)
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+AI_CIRCUIT_STATE = Gauge("ai_circuit_breaker_state", "Состояние предохранителя API ИИ (0 closed, 1 half_open, 2 open)")
+AI_CIRCUIT_REJECTIONS = Counter(
+    "ai_circuit_breaker_rejections_total", "Запросы к API ИИ, отклоненные открытым предохранителем"
+)
+AI_CONCURRENCY_LIMIT = Gauge("ai_concurrency_limit", "Текущий адаптивный лимит одновременных запросов к API ИИ")
+AI_REQUESTS_IN_FLIGHT = Gauge("ai_requests_in_flight", "Выполняемые запросы к API ИИ")
+AI_RETRIES = Counter("ai_retries_total", "Повторные запросы к API ИИ", ["reason"])
+AI_RATE_LIMITED = Counter("ai_rate_limited_total", "Ответы API ИИ 429 Too Many Requests")
+AI_RATE_LIMIT_WAIT = Counter(
+    "ai_rate_limit_wait_seconds_total", "Время ожидания клиентского ограничителя скорости", ["limiter"]
+)
+
+AI_STAGE_LATENCY = Histogram(
+    "ai_stage_latency_seconds",
+    "Длительность запроса к API ИИ (с повторами) по модели и этапу анализа",
+    ["model", "stage"],
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300),
+)
+AI_TOKENS = Counter(
+    "ai_tokens_total",
+    "Токены запросов к API ИИ (prompt, completion; cached_prompt — часть prompt из кэша префиксов провайдера)",
+    ["model", "kind"],
+)
+AI_PARSE_FAILURES = Counter(
+    "ai_parse_failures_total", "Ответы модели, которые не удалось разобрать (использован ответ-заглушка)", ["parser"]
+)
+AI_PARSE_RECOVERIES = Counter(
+    "ai_parse_recoveries_total",
+    "Обрезанные или испорченные ответы модели, из которых восстановлено корректное начало JSON",
+    ["parser"],
+)
+AI_CONTINUATIONS = Counter(
+    "ai_continuations_total", "Запросы продолжения ответов модели, обрезанных по лимиту токенов", ["stage"]
+)
+AI_TRUNCATED_RESPONSES = Counter(
+    "ai_truncated_responses_total", "Ответы модели, оставшиеся обрезанными после всех продолжений", ["stage"]
+)
+AI_PROVIDER_REQUESTS = Counter(
+    "ai_provider_requests_total", "Запросы к провайдерам API ИИ (success, error, cancelled)", ["provider", "outcome"]
+)
+AI_PROVIDER_LATENCY = Histogram(
+    "ai_provider_latency_seconds",
+    "Длительность успешного запроса к провайдеру API ИИ (без повторов)",
+    ["provider"],
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300),
+)
+AI_PROVIDER_HEALTHY = Gauge(
+    "ai_provider_healthy", "Провайдер API ИИ доступен для выбора (1) или исключен (0)", ["provider"]
+)
+AI_HEDGED_REQUESTS = Counter(
+    "ai_hedged_requests_total", "Запросы, продублированные резервному провайдеру из-за медленного ответа", ["provider"]
+)
+AI_HEDGE_WINS = Counter("ai_hedge_wins_total", "Чей ответ на продублированный запрос пришел первым", ["winner"])
+AI_FAILOVERS = Counter("ai_failovers_total", "Переключения запроса на резервного провайдера после отказа", ["provider"])
+AI_ROUTING_DECISIONS = Counter(
+    "ai_routing_decisions_total",
+    "Выбор модели для этапа анализа файла (reason: simple, fast_stage, strong_stage или превышенный признак)",
+    ["stage", "model", "reason"],
+)
+AI_CACHE_LOOKUPS = Counter(
+    "ai_cache_lookups_total", "Обращения к кэшу результатов ИИ-анализа (memory_hit, disk_hit, miss)", ["result"]
+)
+
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Задержка цикла событий процесса-воркера",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+PARSING_DURATION = Histogram(
+    "parsing_analysis_duration_seconds",
+    "Длительность parsing-анализа загрузки по количеству файлов и суммарному размеру",
+    ["files", "size"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+
+# Границы групп для меток parsing-анализа: метки должны иметь небольшое число значений
+FILE_COUNT_BUCKETS = (1, 10, 100, 1000)
+SIZE_BUCKETS = ((64 * 1024, "64KB"), (1024 * 1024, "1MB"), (16 * 1024 * 1024, "16MB"))
+
+
+def files_label(count: int) -> str:
+    """Метка группы по количеству файлов: 1, 2-10, 11-100, 101-1000, >1000"""
+    lower = 1
+    for upper in FILE_COUNT_BUCKETS:
+        if count <= upper:
+            return str(upper) if lower == upper else f"{lower}-{upper}"
+        lower = upper + 1
+    return f">{FILE_COUNT_BUCKETS[-1]}"
+
+
+def size_label(size: int) -> str:
+    """Метка группы по суммарному размеру: <=64KB, <=1MB, <=16MB, >16MB"""
+    for upper, name in SIZE_BUCKETS:
+        if size <= upper:
+            return f"<={name}"
+    return f">{SIZE_BUCKETS[-1][1]}"
+
+
+async def monitor_event_loop_lag(interval: float) -> None:
+    """
+    Измерение задержки цикла событий
+
+    Задача засыпает на interval секунд; насколько позже она просыпается, настолько цикл событий был занят
+    синхронной работой. Выполняется до отмены.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - started - interval))
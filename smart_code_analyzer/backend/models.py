@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 # ---------------------------------------------------------------------------------------------------------------------
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, Field, field_validator
 
@@ -64,6 +64,46 @@ class AnalysisResponse(BaseModel):
     html: Optional[str] = None
 
 
+class AnalysisFileInfo(BaseModel):
+    """
+    Метаданные файла в оглавлении parsing-анализа.
+
+    Атрибуты:
+        file_id (int): Идентификатор файла внутри анализа.
+        filename (str): Имя файла.
+        status (str): Статус анализа файла.
+        size (int): Размер содержимого файла в байтах.
+        html_ready (bool): HTML файла уже отформатирован (иначе он будет отформатирован при первом запросе).
+    """
+
+    file_id: int
+    filename: str
+    status: str
+    size: int
+    html_ready: bool
+
+
+class AnalysisIndexResponse(BaseModel):
+    """
+    Модель компактного ответа parsing-анализа: сводка и страница оглавления файлов.
+
+    Атрибуты:
+        analysis_id (str): Идентификатор анализа.
+        total (int): Количество файлов в анализе.
+        offset (int): Количество пропущенных файлов.
+        limit (int): Максимальное количество файлов на странице.
+        summary (Optional[AnalysisResponse]): Сводная информация по всем файлам.
+        files (List[AnalysisFileInfo]): Метаданные файлов страницы.
+    """
+
+    analysis_id: str
+    total: int
+    offset: int
+    limit: int
+    summary: Optional[AnalysisResponse] = None
+    files: List[AnalysisFileInfo] = Field(default_factory=list)
+
+
 class AIAnalysisResponse(BaseModel):
     """
     Модель ответа для ИИ-анализа кода.
@@ -75,6 +115,17 @@ class AIAnalysisResponse(BaseModel):
         potential_issues (List[Dict[str, str]]): Список найденных потенциальных проблем с подробностями.
         recommendations (List[str]): Список рекомендаций по улучшению кода.
         overall_score (float): Общая оценка качества кода (от 0 до 100).
+        missing_stages (List[str]): Этапы анализа, не давшие результата (пустой список для полного анализа).
+            Для больших файлов сюда же попадают непроанализированные фрагменты в виде "этап:начало-конец".
+        token_usage (Dict[str, int]): Использованные токены (requests, prompt_tokens, completion_tokens, total_tokens,
+            cached_prompt_tokens — токены промпта из кэша префиксов провайдера).
+        compaction (Dict[str, Dict[str, int]]): Токены кода до и после сжатия по этапам
+            (original_tokens, compacted_tokens).
+        incremental (Dict[str, List[str]]): Для инкрементального анализа — части файла (этапы и символы),
+            пересчитанные моделью (recomputed) и взятые из результатов прошлых анализов (reused).
+        cached (bool): Результат взят из кэша без обращения к модели.
+        routing (Dict[str, Any]): Признаки сложности файла (signals) и выбранные для этапов модели с причинами
+            выбора (stages). Пустой, если выбор модели выключен или результат взят из кэша.
     """
 
     filename: str
@@ -83,6 +134,27 @@ class AIAnalysisResponse(BaseModel):
     potential_issues: List[Dict[str, str]]
     recommendations: List[str]
     overall_score: float = Field(..., ge=0, le=100)
+    missing_stages: List[str] = Field(default_factory=list)
+    token_usage: Dict[str, int] = Field(default_factory=dict)
+    compaction: Dict[str, Dict[str, int]] = Field(default_factory=dict)
+    incremental: Dict[str, List[str]] = Field(default_factory=dict)
+    cached: bool = False
+    routing: Dict[str, Any] = Field(default_factory=dict)
+
+
+class AIBulkAnalysisResponse(BaseModel):
+    """
+    Модель ответа для пакетного ИИ-анализа нескольких файлов.
+
+    Атрибуты:
+        results (Dict[str, AIAnalysisResponse]): Результаты ИИ-анализа по именам файлов.
+        errors (Dict[str, str]): Ошибки анализа по именам файлов (файлы, анализ которых не удался).
+        summary (Dict[str, Any]): Сводка: количество файлов, статистика и распределение оценок, суммарные токены.
+    """
+
+    results: Dict[str, AIAnalysisResponse] = Field(default_factory=dict)
+    errors: Dict[str, str] = Field(default_factory=dict)
+    summary: Dict[str, Any] = Field(default_factory=dict)
 
 
 class ErrorResponse(BaseModel):
@@ -109,6 +181,17 @@ class AIAnalysisResult(BaseModel):
         potential_issues (List[Dict[str, str]]): Список найденных потенциальных проблем с подробностями.
         recommendations (List[str]): Список рекомендаций по улучшению кода.
         overall_score (float): Общая оценка качества кода (от 0 до 1).
+        missing_stages (List[str]): Этапы анализа, не давшие результата (пустой список для полного анализа).
+            Для больших файлов сюда же попадают непроанализированные фрагменты в виде "этап:начало-конец".
+        token_usage (Dict[str, int]): Использованные токены (requests, prompt_tokens, completion_tokens, total_tokens,
+            cached_prompt_tokens — токены промпта из кэша префиксов провайдера).
+        compaction (Dict[str, Dict[str, int]]): Токены кода до и после сжатия по этапам
+            (original_tokens, compacted_tokens).
+        incremental (Dict[str, List[str]]): Для инкрементального анализа — части файла (этапы и символы),
+            пересчитанные моделью (recomputed) и взятые из результатов прошлых анализов (reused).
+        cached (bool): Результат взят из кэша без обращения к модели.
+        routing (Dict[str, Any]): Признаки сложности файла (signals) и выбранные для этапов модели с причинами
+            выбора (stages). Пустой, если выбор модели выключен или результат взят из кэша.
     """
 
     filename: str
@@ -117,3 +200,9 @@ class AIAnalysisResult(BaseModel):
     potential_issues: List[Dict[str, str]]
     recommendations: List[str]
     overall_score: float = Field(..., ge=0.0, le=1.0)
+    missing_stages: List[str] = Field(default_factory=list)
+    token_usage: Dict[str, int] = Field(default_factory=dict)
+    compaction: Dict[str, Dict[str, int]] = Field(default_factory=dict)
+    incremental: Dict[str, List[str]] = Field(default_factory=dict)
+    cached: bool = False
+    routing: Dict[str, Any] = Field(default_factory=dict)
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+"""
+Пул процессов для parsing-анализа.
+
+Разбор файлов (FileBatchAnalyzer) и форматирование HTML занимают процессор и, выполняясь в обработчике
+запроса, останавливают цикл событий воркера: пока разбирается большая загрузка, не отвечают даже `/metrics`.
+Файлы делятся на части примерно одинакового размера, части разбираются в отдельных процессах, а результаты
+по файлам и сводки частей собираются обратно в процессе приложения. Сводка анализатора состоит из счетчиков
+(файлы, строки кода, комментарии, пустые строки, классы, функции, константы), поэтому сводка загрузки — это сумма
+сводок частей; поле другого типа не объединяется наугад, а приводит к ошибке (см. merge_summaries).
+"""
+
+import asyncio
+import io
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import asdict, fields, is_dataclass, replace
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from code_analizer import FileBatchAnalyzer, HtmlFormatter, HtmlSummaryFormatter, LineProcessor
+from fastapi import UploadFile
+
+from smart_code_analyzer.backend import metrics
+from smart_code_analyzer.backend.env import get_env_int
+
+# Настраиваем логирование
+logger = logging.getLogger("uvicorn.error")
+
+# Частей на один процесс: несколько частей на процесс выравнивают нагрузку, если файлы разбираются неравномерно
+SHARDS_PER_WORKER = 2
+
+# Объем части при потоковом разборе: часть отправляется в пул, как только набрано столько байт
+STREAM_SHARD_BYTES = 256 * 1024
+
+Upload = Tuple[str, bytes]
+FileResult = Tuple[str, Dict[str, Any], Optional[str]]
+
+
+def _analyze_shard(uploads: List[Upload], render_html: bool = True) -> Tuple[List[FileResult], Any]:
+    """
+    Разбор части файлов в процессе пула
+
+    Args:
+        uploads: Имена и содержимое файлов
+        render_html: Форматировать HTML файлов (иначе html каждого файла — None)
+
+    Returns:
+        Tuple[List[FileResult], Any]: Данные и HTML каждого файла (имя, данные, html) и сводка части
+    """
+    files = [UploadFile(io.BytesIO(data), filename=name) for name, data in uploads]
+    # Анализатор хранит сводку последнего вызова, поэтому у каждой части свой экземпляр
+    batch_analyzer = FileBatchAnalyzer(LineProcessor)
+    datas_list = asyncio.run(batch_analyzer.analyze_files(files))
+    code_formatter = HtmlFormatter()
+    results = [
+        (code_data.filename, asdict(code_data), code_formatter.format(code_data) if render_html else None)
+        for code_data in datas_list
+    ]
+    return results, batch_analyzer.get_summary()
+
+
+def _render_file(filename: str, content: str) -> Optional[str]:
+    """HTML одного файла по его содержимому (None, если анализатор не вернул результат)"""
+    results, _ = _analyze_shard([(filename, content.encode("utf-8"))])
+    return results[0][2] if results else None
+
+
+def _format_summary(summary: Any) -> Tuple[Dict[str, Any], str]:
+    """Данные и HTML сводки"""
+    return asdict(summary), HtmlSummaryFormatter().format(summary)
+
+
+def split_shards(uploads: Sequence[Upload], shards: int) -> List[List[Upload]]:
+    """
+    Разбиение файлов на части примерно одинакового суммарного размера
+
+    Самые большие файлы распределяются первыми в наименее загруженную часть. Внутри части сохраняется исходный
+    порядок файлов.
+    """
+    shards = max(1, min(shards, len(uploads)))
+    buckets: List[List[int]] = [[] for _ in range(shards)]
+    sizes = [0] * shards
+    for index in sorted(range(len(uploads)), key=lambda i: -len(uploads[i][1])):
+        target = sizes.index(min(sizes))
+        buckets[target].append(index)
+        sizes[target] += len(uploads[index][1])
+    return [[uploads[i] for i in sorted(bucket)] for bucket in buckets if bucket]
+
+
+def merge_summaries(summaries: List[Any]) -> Any:
+    """
+    Объединение сводок частей в сводку всей загрузки
+
+    Правило объединения явное: целочисленные счетчики складываются, вложенные сводки объединяются по тем же
+    правилам. Для полей других типов (доли, средние, списки) сумма неверна, поэтому такое поле — ошибка,
+    а не значение первой части.
+
+    Raises:
+        TypeError: В сводке есть поле, для которого нет правила объединения
+    """
+    if len(summaries) == 1:
+        return summaries[0]
+    merged = {}
+    for item in fields(summaries[0]):
+        if not item.init:
+            continue
+        values = [getattr(summary, item.name) for summary in summaries]
+        if all(is_dataclass(value) and not isinstance(value, type) for value in values):
+            merged[item.name] = merge_summaries(values)
+        elif all(isinstance(value, int) and not isinstance(value, bool) for value in values):
+            merged[item.name] = sum(values)
+        else:
+            raise TypeError(f"Нет правила объединения поля сводки {item.name}: {type(values[0]).__name__}")
+    return replace(summaries[0], **merged)
+
+
+class ParsePool:
+    """Пул процессов для разбора файлов и форматирования HTML"""
+
+    def __init__(self, workers: int = 0):
+        """
+        Инициализация пула
+
+        Args:
+            workers: Количество процессов (0 — без процессов: разбор выполняется в потоке, не блокируя цикл событий)
+        """
+        self.workers = workers
+        self.executor: Optional[Executor] = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+
+    @classmethod
+    def from_env(cls) -> "ParsePool":
+        """Создание пула по переменной окружения PARSE_POOL_WORKERS (по умолчанию — количество ядер)"""
+        pool = cls(workers=get_env_int("PARSE_POOL_WORKERS", os.cpu_count() or 1, min_value=0))
+        logger.info(f"Пул parsing-анализа: {pool.workers or 'без'} процессов")
+        return pool
+
+    async def analyze(
+        self, uploads: List[Upload], render_html: bool = True
+    ) -> Tuple[List[FileResult], Dict[str, Any], str]:
+        """
+        Разбор файлов и форматирование HTML в пуле
+
+        Args:
+            uploads: Имена и содержимое файлов
+            render_html: Форматировать HTML файлов (HTML сводки форматируется всегда)
+
+        Returns:
+            Tuple[List[FileResult], Dict[str, Any], str]: Результаты по файлам, данные и HTML сводки
+        """
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        shards = split_shards(uploads, self.workers * SHARDS_PER_WORKER) if self.workers and uploads else [uploads]
+        outcomes = await asyncio.gather(
+            *(loop.run_in_executor(self.executor, _analyze_shard, shard, render_html) for shard in shards)
+        )
+        size = sum(len(data) for _, data in uploads)
+        return await self._collect([name for name, _ in uploads], size, outcomes, started)
+
+    async def analyze_stream(
+        self, uploads: Iterator[Upload], render_html: bool = True
+    ) -> Tuple[List[FileResult], Dict[str, Any], str]:
+        """
+        Разбор файлов по мере их поступления (например, при чтении архива)
+
+        Итератор читается в потоке, файлы собираются в части по STREAM_SHARD_BYTES, и каждая часть сразу
+        отправляется в пул. Количество частей в работе ограничено, поэтому чтение ждет, пока пул занят,
+        и в памяти не копятся непрочитанные файлы. После отправки содержимое части не хранится: для сводки
+        и метрик остаются только имена файлов и их суммарный размер.
+
+        Args:
+            uploads: Итератор имен и содержимого файлов
+            render_html: Форматировать HTML файлов (HTML сводки форматируется всегда)
+
+        Returns:
+            Tuple[List[FileResult], Dict[str, Any], str]: Результаты по файлам, данные и HTML сводки
+        """
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        in_flight = asyncio.Semaphore(max(1, self.workers) * SHARDS_PER_WORKER)
+        names: List[str] = []
+        size = 0
+        tasks: List["asyncio.Future[Tuple[List[FileResult], Any]]"] = []
+
+        async def submit(shard: List[Upload]) -> Tuple[List[FileResult], Any]:
+            try:
+                return await loop.run_in_executor(self.executor, _analyze_shard, shard, render_html)
+            finally:
+                in_flight.release()
+
+        async def dispatch(shard: List[Upload]) -> None:
+            await in_flight.acquire()
+            tasks.append(asyncio.ensure_future(submit(shard)))
+
+        shard: List[Upload] = []
+        shard_bytes = 0
+        try:
+            while True:
+                upload = await loop.run_in_executor(None, next, uploads, None)
+                if upload is None:
+                    # Пустой поток тоже разбирается, чтобы получить сводку
+                    if shard or not tasks:
+                        await dispatch(shard)
+                    break
+                names.append(upload[0])
+                shard.append(upload)
+                shard_bytes += len(upload[1])
+                size += len(upload[1])
+                if shard_bytes >= STREAM_SHARD_BYTES:
+                    await dispatch(shard)
+                    shard, shard_bytes = [], 0
+            outcomes = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return await self._collect(names, size, outcomes, started)
+
+    async def _collect(
+        self,
+        names: List[str],
+        size: int,
+        outcomes: List[Tuple[List[FileResult], Any]],
+        started: float,
+    ) -> Tuple[List[FileResult], Dict[str, Any], str]:
+        """
+        Результаты частей в исходном порядке файлов, общая сводка и ее HTML
+
+        size — суммарный размер файлов в байтах, started — начало разбора (для метрик).
+        """
+        order = {name: index for index, name in enumerate(names)}
+        results = sorted(
+            (result for shard_results, _ in outcomes for result in shard_results),
+            key=lambda result: order.get(result[0], len(order)),
+        )
+        summary = merge_summaries([summary for _, summary in outcomes])
+        summary_data, summary_html = await asyncio.get_running_loop().run_in_executor(
+            self.executor, _format_summary, summary
+        )
+
+        metrics.PARSING_DURATION.labels(files=metrics.files_label(len(names)), size=metrics.size_label(size)).observe(
+            time.perf_counter() - started
+        )
+        return results, summary_data, summary_html
+
+    async def render_file(self, filename: str, content: str) -> Optional[str]:
+        """
+        HTML одного файла, разобранного заново по сохраненному содержимому
+
+        Используется для результатов, сохраненных без HTML: файл форматируется при первом запросе.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.executor, _render_file, filename, content)
+
+    def shutdown(self) -> None:
+        """Остановка процессов пула"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
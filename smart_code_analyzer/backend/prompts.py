@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+"""
+Шаблоны промптов анализа.
+
+Провайдеры OpenAI-совместимого API кэшируют обработанное начало промпта: повторный запрос с тем же префиксом
+(у OpenAI — от 1024 токенов) обрабатывается быстрее и дешевле. Поэтому все промпты собираются в одном порядке:
+системное сообщение, затем контекст и код (самая большая и одинаковая для этапов одного файла часть),
+и только в конце — вопрос этапа со схемой ответа и уточнениями, которые зависят от этапа.
+Этапы SOLID, проблем и рекомендаций получают одинаково сжатый код, поэтому их запросы по одному файлу имеют общий
+префикс, а повторный анализ того же файла — общий префикс для всех этапов.
+
+Любое изменение текста шаблонов требует увеличения PROMPT_VERSION: версия входит в ключи кэша результатов.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Версия шаблонов промптов
+PROMPT_VERSION = "5"
+
+# Системное сообщение всех запросов к модели
+SYSTEM_PROMPT = (
+    "Ты - эксперт по анализу кода. Твоя задача - анализировать код и давать конкретные рекомендации. "
+    "Всегда отвечай в формате JSON."
+)
+
+CODE_TITLE = "Код для анализа:"
+CONTEXT_TITLE = "Контекст модуля (анализировать его не нужно):"
+
+# Схемы ответов, общие для нескольких этапов (фигурные скобки удвоены для str.format)
+ISSUES_SCHEMA = """[
+    {{
+        "type": "тип проблемы",
+        "description": "описание проблемы",
+        "line": "{line}",
+        "recommendation": "рекомендация по исправлению"
+    }}
+]"""
+
+SOLID_SCHEMA = """{{
+    "SRP": "оценка и объяснение",
+    "OCP": "оценка и объяснение",
+    "LSP": "оценка и объяснение",
+    "ISP": "оценка и объяснение",
+    "DIP": "оценка и объяснение"
+}}"""
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """Шаблон промпта: заголовок данных (идут в начале сообщения) и вопрос этапа (в конце)"""
+
+    question: str
+    code_title: str = CODE_TITLE
+
+    def render(self, code: str, context: Optional[str] = None, **params: str) -> List[Dict[str, str]]:
+        """
+        Сообщения запроса к модели
+
+        Args:
+            code: Код (или другие данные) для анализа
+            context: Контекст, общий для нескольких запросов (идет перед кодом)
+            **params: Параметры вопроса этапа
+        """
+        parts = [f"{CONTEXT_TITLE}\n{context}"] if context else []
+        parts += [f"{self.code_title}\n{code}", self.question.format(**params)]
+        return [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": "\n\n".join(parts)}]
+
+
+PROMPTS: Dict[str, PromptTemplate] = {
+    "code_style": PromptTemplate(
+        "Проанализируй стиль кода выше и дай рекомендации по улучшению.\n"
+        "Ответ должен быть в формате JSON:\n"
+        "{{\n"
+        '    "formatting": "оценка и рекомендации",\n'
+        '    "naming": "оценка и рекомендации",{documentation}\n'
+        '    "structure": "оценка и рекомендации"\n'
+        "}}"
+    ),
+    "solid_principles": PromptTemplate(
+        "Проверь соответствие кода выше принципам SOLID.\nОтвет должен быть в формате JSON:\n" + SOLID_SCHEMA
+    ),
+    "potential_issues": PromptTemplate(
+        "Найди потенциальные проблемы в коде выше.{static_note}\n"
+        "Ответ должен быть в формате JSON массив объектов:\n" + ISSUES_SCHEMA.replace("{line}", "строка кода")
+    ),
+    "recommendations": PromptTemplate(
+        "Дай рекомендации по улучшению кода выше.\n"
+        "Ответ должен быть в формате JSON массив строк:\n"
+        "[\n"
+        '    "рекомендация 1",\n'
+        '    "рекомендация 2",\n'
+        "    ...\n"
+        "]"
+    ),
+    "potential_issues_chunk": PromptTemplate(
+        "Код выше — фрагмент большого файла ({title}), слева от каждой строки указан ее номер в исходном файле.\n"
+        "Найди потенциальные проблемы во фрагменте.{static_note}\n"
+        "Ответ должен быть в формате JSON массив объектов:\n"
+        + ISSUES_SCHEMA.replace("{line}", "номер строки из левой колонки")
+    ),
+    "symbols": PromptTemplate(
+        "Найди потенциальные проблемы и дай рекомендации по улучшению для объявлений модуля в коде выше."
+        "{static_note}\n"
+        "Слева от каждой строки указан ее номер в исходном файле.\n"
+        "Ответ должен быть одним объектом в формате JSON:\n"
+        "{{\n"
+        '    "issues": '
+        + ISSUES_SCHEMA.replace("{line}", "номер строки из левой колонки").replace("\n", "\n    ")
+        + ",\n"
+        '    "recommendations": [\n'
+        "        {{\n"
+        '            "line": "номер строки объявления, к которому относится рекомендация",\n'
+        '            "text": "рекомендация"\n'
+        "        }}\n"
+        "    ]\n"
+        "}}"
+    ),
+    "fused": PromptTemplate(
+        "Проанализируй код выше: стиль, соответствие принципам SOLID, потенциальные проблемы и рекомендации "
+        "по улучшению.{static_note}\n"
+        "Ответ должен быть одним объектом в формате JSON:\n"
+        "{{\n"
+        '    "code_style": {{\n'
+        '        "formatting": "оценка и рекомендации",\n'
+        '        "naming": "оценка и рекомендации",\n'
+        '        "documentation": "оценка и рекомендации",\n'
+        '        "structure": "оценка и рекомендации"\n'
+        "    }},\n"
+        '    "solid_principles": ' + SOLID_SCHEMA.replace("\n", "\n    ") + ",\n"
+        '    "potential_issues": ' + ISSUES_SCHEMA.replace("{line}", "строка кода").replace("\n", "\n    ") + ",\n"
+        '    "recommendations": [\n'
+        '        "рекомендация 1",\n'
+        '        "рекомендация 2"\n'
+        "    ]\n"
+        "}}"
+    ),
+    "package": PromptTemplate(
+        "Ты — эксперт по архитектуре Python-проектов. Проанализируй структуру Python-пакета по сводке графа "
+        "импортов выше.\n"
+        "Оценивай архитектуру по зависимостям модулей: циклы импортов, модули с большим количеством входящих "
+        "и исходящих зависимостей, импорты верхних слоев из нижних.\n"
+        "Ответь строго в формате JSON, пример:\n"
+        "{{\n"
+        '    "architecture": "Краткое описание архитектуры и организации модулей.",\n'
+        '    "module_relations": "Как связаны модули между собой.",\n'
+        '    "strong_points": "Сильные стороны структуры.",\n'
+        '    "weak_points": "Слабые стороны структуры.",\n'
+        '    "recommendations": "Рекомендации по улучшению архитектуры."\n'
+        "}}\n"
+        'Если информации недостаточно, напиши в каждом поле: "Недостаточно данных для анализа".',
+        code_title="Сводка графа импортов пакета, построенная по содержимому всех его файлов:",
+    ),
+}
+
+
+def render_prompt(name: str, code: str, context: Optional[str] = None, **params: str) -> List[Dict[str, str]]:
+    """Сообщения запроса к модели по шаблону name (см. PromptTemplate.render)"""
+    return PROMPTS[name].render(code, context, **params)
@@ -0,0 +1,484 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+"""
+Провайдеры OpenAI-совместимого API ИИ: приоритеты, отложенное дублирование запросов и переключение при отказах.
+
+Анализатор отправляет запросы не одному клиенту, а пулу провайдеров (ProviderPool). Провайдеры упорядочиваются
+по приоритету, при равном приоритете — по медиане задержки. Для каждого провайдера хранится скользящее окно
+задержек успешных ответов (по этапам анализа и моделям). Если основной провайдер не ответил за заданный перцентиль своих
+задержек, тот же запрос отправляется следующему провайдеру и берется ответ, пришедший первым (hedged request),
+второй запрос отменяется. Ошибка соединения, ответ 5xx или 429 переключает запрос на следующего провайдера,
+а после серии отказов подряд провайдер исключается из выбора на время AI_PROVIDER_COOLDOWN.
+
+Если задан обработчик on_delta, ответ запрашивается потоком (stream=True) и обработчик получает текст по мере
+генерации. При дублировании текст передает только запрос, первым начавший отвечать, остальные отменяются;
+после начала передачи текста запрос на другого провайдера не переключается, чтобы части ответов не смешались.
+
+Список провайдеров задается переменной AI_PROVIDERS (JSON), без нее используется один провайдер
+AI_BASE_URL с ключом PROXYAPI_KEY.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set
+
+import httpx
+from openai import AsyncOpenAI
+
+from smart_code_analyzer.backend import metrics
+from smart_code_analyzer.backend.env import get_env_bool, get_env_float, get_env_int
+from smart_code_analyzer.backend.resilience import classify_error
+
+# Настраиваем логирование
+logger = logging.getLogger("uvicorn.error")
+
+DEFAULT_BASE_URL = "https://api.proxyapi.ru/openai/v1"
+DEFAULT_LATENCY_WINDOW = 200
+DEFAULT_HEDGE_PERCENTILE = 95.0
+DEFAULT_HEDGE_MIN_SAMPLES = 20
+DEFAULT_HEDGE_MIN_DELAY = 0.5
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_COOLDOWN = 30.0
+
+# Ключ общей статистики провайдера (по всем этапам)
+ALL_STAGES = "all"
+
+
+def latency_key(stage: str, model: Optional[str] = None) -> str:
+    """Ключ статистики задержек: этап и модель (задержки быстрой и основной моделей сильно различаются)"""
+    return f"{stage}:{model}" if model else stage
+
+
+# Обработчик очередной части текста ответа при потоковом запросе
+DeltaCallback = Callable[[str], None]
+
+
+class LatencyStats:
+    """Скользящее окно задержек успешных ответов"""
+
+    def __init__(self, window: int = DEFAULT_LATENCY_WINDOW):
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    @property
+    def count(self) -> int:
+        return len(self.samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Перцентиль q (0-100) окна по ближайшему рангу (None, если замеров нет)"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+        return ordered[index]
+
+
+class Provider:
+    """OpenAI-совместимый API: клиент, приоритет, статистика задержек и состояние"""
+
+    def __init__(
+        self,
+        name: str,
+        client: Any,
+        base_url: str = "",
+        priority: int = 0,
+        model: Optional[str] = None,
+        models: Optional[Dict[str, str]] = None,
+        window: int = DEFAULT_LATENCY_WINDOW,
+    ):
+        """
+        Инициализация
+
+        Args:
+            name: Имя провайдера (метка метрик)
+            client: Клиент AsyncOpenAI
+            base_url: Адрес API (для логов и статистики)
+            priority: Приоритет (меньше — выше)
+            model: Модель для запросов, в которых модель не указана
+            models: Модели провайдера, которые используются вместо запрошенных анализатором
+                (например, у локального сервера): {"gpt-4.1": "qwen2.5-coder:32b", "gpt-4.1-mini": "qwen2.5-coder:7b"}
+            window: Размер окна статистики задержек
+        """
+        self.name = name
+        self.client = client
+        self.base_url = base_url
+        self.priority = priority
+        self.model = model
+        self.models = dict(models or {})
+        self.window = window
+        self.latency: Dict[str, LatencyStats] = {ALL_STAGES: LatencyStats(window)}
+        self.requests = 0
+        self.errors = 0
+        self.failures = 0
+        self.down_until = 0.0
+
+    def resolve_model(self, requested: Optional[str]) -> Optional[str]:
+        """Модель запроса к провайдеру вместо запрошенной анализатором"""
+        if requested is None:
+            return self.model
+        return self.models.get(requested, requested)
+
+    def stats(self, stage: str, model: Optional[str] = None) -> LatencyStats:
+        """Статистика задержек этапа для модели"""
+        key = latency_key(stage, model)
+        if key not in self.latency:
+            self.latency[key] = LatencyStats(self.window)
+        return self.latency[key]
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def median_latency(self) -> float:
+        """Медиана задержки по всем этапам (для провайдера без замеров — 0, чтобы он получил запросы)"""
+        return self.latency[ALL_STAGES].percentile(50) or 0.0
+
+    def record_success(self, stage: str, seconds: float, model: Optional[str] = None) -> None:
+        self.requests += 1
+        self.failures = 0
+        self.down_until = 0.0
+        self.latency[ALL_STAGES].record(seconds)
+        self.stats(stage, model).record(seconds)
+        metrics.AI_PROVIDER_REQUESTS.labels(provider=self.name, outcome="success").inc()
+        metrics.AI_PROVIDER_LATENCY.labels(provider=self.name).observe(seconds)
+        metrics.AI_PROVIDER_HEALTHY.labels(provider=self.name).set(1)
+
+    def record_failure(self, threshold: int, cooldown: float, counts_against_health: bool = True) -> None:
+        """Отказ запроса. После threshold отказов подряд провайдер исключается из выбора на cooldown секунд"""
+        self.requests += 1
+        self.errors += 1
+        metrics.AI_PROVIDER_REQUESTS.labels(provider=self.name, outcome="error").inc()
+        if not counts_against_health:
+            return
+        self.failures += 1
+        if self.failures >= threshold:
+            if self.healthy:
+                logger.error(f"Провайдер API ИИ {self.name} недоступен ({self.failures} отказов подряд)")
+            self.down_until = time.monotonic() + cooldown
+            metrics.AI_PROVIDER_HEALTHY.labels(provider=self.name).set(0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Состояние и статистика провайдера"""
+
+        def milliseconds(value: Optional[float]) -> Optional[float]:
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "name": self.name,
+            "base_url": self.base_url,
+            "priority": self.priority,
+            "model": self.model,
+            "models": self.models,
+            "healthy": self.healthy,
+            "consecutive_failures": self.failures,
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_ms": {
+                stage: {
+                    "samples": stats.count,
+                    "p50": milliseconds(stats.percentile(50)),
+                    "p95": milliseconds(stats.percentile(95)),
+                }
+                for stage, stats in self.latency.items()
+            },
+        }
+
+
+class ProviderPool:
+    """Выбор провайдера, отложенное дублирование запросов и переключение на резервного провайдера"""
+
+    def __init__(
+        self,
+        providers: List[Provider],
+        hedging: bool = True,
+        hedge_percentile: float = DEFAULT_HEDGE_PERCENTILE,
+        hedge_min_samples: int = DEFAULT_HEDGE_MIN_SAMPLES,
+        hedge_min_delay: float = DEFAULT_HEDGE_MIN_DELAY,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        cooldown: float = DEFAULT_COOLDOWN,
+    ):
+        """
+        Инициализация
+
+        Args:
+            providers: Провайдеры (хотя бы один)
+            hedging: Дублировать запрос резервному провайдеру, если основной отвечает дольше обычного
+            hedge_percentile: Перцентиль задержек основного провайдера, после которого запрос дублируется
+            hedge_min_samples: Минимальное количество замеров этапа, начиная с которого запросы дублируются
+            hedge_min_delay: Минимальная задержка перед дублированием, секунды
+            failure_threshold: Количество отказов подряд, после которого провайдер исключается из выбора
+            cooldown: На сколько секунд провайдер исключается из выбора
+        """
+        if not providers:
+            raise ValueError("Не задан ни один провайдер API ИИ")
+        self.providers = providers
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        for provider in providers:
+            metrics.AI_PROVIDER_HEALTHY.labels(provider=provider.name).set(1)
+
+    @classmethod
+    def from_env(cls, http_client: httpx.AsyncClient) -> "ProviderPool":
+        """
+        Создание по переменным окружения AI_PROVIDERS, AI_HEDGE_*, AI_PROVIDER_*
+
+        AI_PROVIDERS — JSON-список объектов с полями name, base_url, priority (по умолчанию 0),
+        models (необязательная замена моделей анализатора моделями провайдера), model (модель для запросов
+        без указанной модели), api_key или api_key_env (имя переменной с ключом).
+
+        Raises:
+            ValueError: Если список провайдеров некорректен или не задан ключ API
+        """
+        window = get_env_int("AI_PROVIDER_LATENCY_WINDOW", DEFAULT_LATENCY_WINDOW, min_value=1)
+        raw = os.getenv("AI_PROVIDERS")
+        if raw:
+            try:
+                configs = json.loads(raw)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Некорректный JSON в AI_PROVIDERS: {str(e)}") from e
+            if not isinstance(configs, list) or not all(isinstance(config, dict) for config in configs):
+                raise ValueError("AI_PROVIDERS должен быть JSON-списком объектов")
+        else:
+            configs = [{"name": "default", "base_url": os.getenv("AI_BASE_URL") or DEFAULT_BASE_URL}]
+        providers = [cls._create_provider(config, index, http_client, window) for index, config in enumerate(configs)]
+
+        pool = cls(
+            providers,
+            hedging=get_env_bool("AI_HEDGE_ENABLED", True),
+            hedge_percentile=min(get_env_float("AI_HEDGE_PERCENTILE", DEFAULT_HEDGE_PERCENTILE, min_value=1.0), 100.0),
+            hedge_min_samples=get_env_int("AI_HEDGE_MIN_SAMPLES", DEFAULT_HEDGE_MIN_SAMPLES, min_value=1),
+            hedge_min_delay=get_env_float("AI_HEDGE_MIN_DELAY", DEFAULT_HEDGE_MIN_DELAY, min_value=0.0),
+            failure_threshold=get_env_int("AI_PROVIDER_FAILURE_THRESHOLD", DEFAULT_FAILURE_THRESHOLD, min_value=1),
+            cooldown=get_env_float("AI_PROVIDER_COOLDOWN", DEFAULT_COOLDOWN, min_value=0.0),
+        )
+        described = ", ".join(f"{p.name} ({p.base_url}, приоритет {p.priority})" for p in providers)
+        logger.info(f"Провайдеры API ИИ: {described}; дублирование запросов: {pool.hedging and len(providers) > 1}")
+        return pool
+
+    @staticmethod
+    def _create_provider(config: Dict[str, Any], index: int, http_client: httpx.AsyncClient, window: int) -> Provider:
+        name = str(config.get("name") or f"provider{index}")
+        base_url = config.get("base_url")
+        if not base_url:
+            raise ValueError(f"Для провайдера {name} не указан base_url")
+        api_key = config.get("api_key") or os.getenv(config.get("api_key_env", "PROXYAPI_KEY"))
+        if not api_key:
+            message = (
+                f"Ключ API провайдера {name} не найден. Укажите api_key или api_key_env (по умолчанию PROXYAPI_KEY)."
+            )
+            logger.error(message)
+            raise ValueError(message)
+        client = AsyncOpenAI(
+            api_key=api_key,
+            http_client=http_client,
+            base_url=base_url,
+            max_retries=0,  # Повторы с учетом Retry-After и адаптивного лимита выполняет RequestGuard
+        )
+        models = config.get("models") or {}
+        if not isinstance(models, dict):
+            raise ValueError(f"Поле models провайдера {name} должно быть JSON-объектом")
+        return Provider(
+            name,
+            client,
+            base_url,
+            priority=int(config.get("priority", 0)),
+            model=config.get("model"),
+            models={str(requested): str(model) for requested, model in models.items()},
+            window=window,
+        )
+
+    def ranked(self) -> List[Provider]:
+        """
+        Провайдеры в порядке выбора: доступные по приоритету и медиане задержки, затем исключенные
+        (по времени возвращения), чтобы при отказе всех провайдеров запрос все же был отправлен
+        """
+        healthy = sorted(
+            (provider for provider in self.providers if provider.healthy),
+            key=lambda provider: (provider.priority, provider.median_latency()),
+        )
+        down = sorted((provider for provider in self.providers if not provider.healthy), key=lambda p: p.down_until)
+        return healthy + down
+
+    def hedge_delay(self, provider: Provider, stage: str, model: Optional[str] = None) -> Optional[float]:
+        """Через сколько секунд дублировать запрос этапа к модели провайдера (None — не дублировать)"""
+        if not self.hedging:
+            return None
+        stats = provider.stats(stage, model)
+        delay = stats.percentile(self.hedge_percentile) if stats.count >= self.hedge_min_samples else None
+        if delay is None:
+            return None
+        return max(self.hedge_min_delay, delay)
+
+    async def _request(
+        self, provider: Provider, stage: str, kwargs: Dict[str, Any], on_delta: Optional[DeltaCallback] = None
+    ) -> Any:
+        requested = kwargs.get("model")
+        model = provider.resolve_model(requested)
+        if model is not None:
+            kwargs = {**kwargs, "model": model}
+        started = time.perf_counter()
+        try:
+            if on_delta is None:
+                response = await provider.client.chat.completions.create(**kwargs)
+            else:
+                response = await self._stream(provider, kwargs, on_delta)
+        except asyncio.CancelledError:
+            metrics.AI_PROVIDER_REQUESTS.labels(provider=provider.name, outcome="cancelled").inc()
+            raise
+        except Exception as e:
+            reason, _ = classify_error(e)
+            if reason is not None:
+                # 429 означает, что провайдер работает: запрос переключается, но провайдер не исключается
+                provider.record_failure(self.failure_threshold, self.cooldown, reason != "rate_limited")
+            raise
+        provider.record_success(stage, time.perf_counter() - started, requested)
+        return response
+
+    @staticmethod
+    async def _stream(provider: Provider, kwargs: Dict[str, Any], on_delta: DeltaCallback) -> Any:
+        """
+        Потоковый запрос chat.completions: части текста передаются on_delta, из них собирается ответ
+        с теми же полями, что у обычного (choices[0].message.content, choices[0].finish_reason, usage)
+        """
+        stream = await provider.client.chat.completions.create(
+            **kwargs, stream=True, stream_options={"include_usage": True}
+        )
+        parts: List[str] = []
+        finish_reason, usage = None, None
+        try:
+            async for chunk in stream:
+                # Количество токенов приходит последней частью без choices (если провайдер его поддерживает)
+                usage = getattr(chunk, "usage", None) or usage
+                for choice in chunk.choices or []:
+                    content = choice.delta.content if choice.delta is not None else None
+                    if content:
+                        parts.append(content)
+                        on_delta(content)
+                    finish_reason = choice.finish_reason or finish_reason
+        finally:
+            await stream.close()
+        message = SimpleNamespace(role="assistant", content="".join(parts))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=finish_reason)], usage=usage)
+
+    async def complete(self, stage: str = "other", on_delta: Optional[DeltaCallback] = None, **kwargs: Any) -> Any:
+        """
+        Запрос chat.completions с дублированием и переключением провайдеров
+
+        Args:
+            stage: Этап анализа (статистика задержек и порог дублирования ведутся по этапам и моделям)
+            on_delta: Обработчик частей текста ответа (если задан, ответ запрашивается потоком)
+            **kwargs: Параметры chat.completions.create
+
+        Raises:
+            Exception: Ошибка, которую бессмысленно повторять у другого провайдера, или ошибка последнего провайдера
+        """
+        candidates = iter(self.ranked())
+        tasks: Dict[asyncio.Task, Provider] = {}
+        last_error: Optional[BaseException] = None
+        # Потоковый запрос, первым начавший передавать текст
+        owner: List[asyncio.Task] = []
+
+        def forwarder(holder: List[asyncio.Task], callback: DeltaCallback) -> DeltaCallback:
+            def forward(text: str) -> None:
+                task = holder[0]
+                if not owner:
+                    owner.append(task)
+                    for other in tasks:
+                        if other is not task:
+                            other.cancel()
+                if owner[0] is task:
+                    callback(text)
+
+            return forward
+
+        def launch() -> bool:
+            provider = next(candidates, None)
+            if provider is None:
+                return False
+            holder: List[asyncio.Task] = []
+            task = asyncio.ensure_future(
+                self._request(provider, stage, kwargs, forwarder(holder, on_delta) if on_delta is not None else None)
+            )
+            holder.append(task)
+            tasks[task] = provider
+            return True
+
+        launch()
+        hedged = False
+        primary = next(iter(tasks.values()))
+        try:
+            while tasks:
+                delay = None if hedged or owner else self.hedge_delay(primary, stage, kwargs.get("model"))
+                done, _ = await asyncio.wait(set(tasks), timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Основной провайдер отвечает дольше обычного: тот же запрос отправляется следующему
+                    hedged = True
+                    if launch():
+                        metrics.AI_HEDGED_REQUESTS.labels(provider=primary.name).inc()
+                        logger.info(f"Провайдер {primary.name} отвечает дольше {delay:.1f} с, запрос продублирован")
+                    continue
+                for task in done:
+                    provider = tasks.pop(task)
+                    if task.cancelled():
+                        # Дублирующий потоковый запрос, отмененный после начала ответа другого провайдера
+                        continue
+                    error = task.exception()
+                    if error is None:
+                        if hedged:
+                            outcome = "primary" if provider is primary else "hedge"
+                            metrics.AI_HEDGE_WINS.labels(winner=outcome).inc()
+                        return task.result()
+                    reason, _ = classify_error(error)
+                    if reason is None or task in owner:
+                        # Часть ответа уже передана: повтор целиком выполняет вызывающий код (RequestGuard)
+                        raise error
+                    last_error = error
+                    logger.warning(f"Провайдер API ИИ {provider.name} не ответил ({reason}): {str(error)}")
+                if not tasks:
+                    if not launch():
+                        break
+                    metrics.AI_FAILOVERS.labels(provider=tasks[next(iter(tasks))].name).inc()
+                    hedged = True
+        finally:
+            await self._cancel(tasks)
+        if last_error is None:
+            raise RuntimeError("Ни один провайдер API ИИ не вернул ответ")
+        raise last_error
+
+    @staticmethod
+    async def _cancel(tasks: Iterable[asyncio.Task]) -> None:
+        pending: Set[asyncio.Task] = {task for task in tasks if not task.done()}
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def warmup(self) -> bool:
+        """Прогрев соединений со всеми провайдерами (True, если ответил хотя бы один)"""
+
+        async def ping(provider: Provider) -> bool:
+            try:
+                await provider.client.models.list()
+                logger.info(f"Соединение с провайдером API ИИ {provider.name} установлено")
+                return True
+            except Exception as e:
+                logger.warning(f"Не удалось прогреть соединение с провайдером {provider.name}: {str(e)}")
+                return False
+
+        return any(await asyncio.gather(*(ping(provider) for provider in self.providers)))
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Состояние и статистика провайдеров в порядке выбора"""
+        return [provider.snapshot() for provider in self.ranked()]
@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+"""
+Устойчивость обращений к API ИИ.
+
+Каждый запрос к модели проходит через RequestGuard:
+- клиентские ограничители скорости (запросы и токены в минуту) не дают превысить лимиты провайдера;
+- адаптивный лимит одновременных запросов уменьшается вдвое на ответ 429 и плавно растет на успешных ответах;
+- ответы 429/5xx и ошибки соединения повторяются с экспоненциальной задержкой и случайным разбросом,
+  заголовок Retry-After имеет приоритет;
+- предохранитель после серии отказов перестает отправлять запросы и сразу возвращает ошибку,
+  пока провайдер не восстановится.
+"""
+
+import asyncio
+import email.utils
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Optional, Tuple, TypeVar
+
+import httpx
+import openai
+
+from smart_code_analyzer.backend import metrics
+from smart_code_analyzer.backend.env import get_env_float, get_env_int
+
+# Настраиваем логирование
+logger = logging.getLogger("uvicorn.error")
+
+DEFAULT_RATE_LIMIT_RPM = 0
+DEFAULT_RATE_LIMIT_TPM = 0
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_RETRY_BASE_DELAY = 1.0
+DEFAULT_RETRY_MAX_DELAY = 30.0
+DEFAULT_MIN_CONCURRENCY = 1
+DEFAULT_MAX_CONCURRENCY = 32
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_RESET = 30.0
+
+# Коды ответа, после которых запрос имеет смысл повторить
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(RuntimeError):
+    """Предохранитель открыт: API ИИ недоступен, запрос не отправлялся"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"API ИИ временно недоступен, повторите через {retry_after:.0f} с")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Ведро токенов: не больше rate_per_minute единиц в минуту с равномерным пополнением"""
+
+    def __init__(self, rate_per_minute: float, name: str):
+        self.rate_per_minute = rate_per_minute
+        self.name = name
+        self._tokens = float(rate_per_minute)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.rate_per_minute, self._tokens + (now - self._updated) * self.rate_per_minute / 60.0)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """Ожидание, пока в ведре наберется amount единиц (запросы ждут по очереди)"""
+        # Запрос больше емкости ведра иначе ждал бы вечно, поэтому он ждет полного ведра
+        amount = min(amount, self.rate_per_minute)
+        async with self._lock:
+            self._refill()
+            while self._tokens < amount:
+                delay = (amount - self._tokens) * 60.0 / self.rate_per_minute
+                metrics.AI_RATE_LIMIT_WAIT.labels(limiter=self.name).inc(delay)
+                await asyncio.sleep(delay)
+                self._refill()
+            self._tokens -= amount
+
+    def refund(self, amount: float) -> None:
+        """Возврат неизрасходованных единиц (например, если фактически токенов ушло меньше оценки)"""
+        self._refill()
+        self._tokens = min(self.rate_per_minute, self._tokens + amount)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Адаптивный лимит одновременных запросов (AIMD): на каждом успешном ответе лимит растет примерно на единицу
+    за «окно» из limit запросов, на ответе 429 уменьшается вдвое (не чаще раза в секунду).
+    """
+
+    def __init__(self, min_limit: int, max_limit: int, cooldown: float = 1.0):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.cooldown = cooldown
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._decreased_at = 0.0
+        self._condition = asyncio.Condition()
+        metrics.AI_CONCURRENCY_LIMIT.set(self.limit)
+
+    async def __aenter__(self) -> "AdaptiveConcurrencyLimiter":
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+            metrics.AI_REQUESTS_IN_FLIGHT.set(self.in_flight)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            metrics.AI_REQUESTS_IN_FLIGHT.set(self.in_flight)
+            self._condition.notify_all()
+
+    def on_success(self) -> None:
+        """Аддитивное увеличение лимита"""
+        self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+        metrics.AI_CONCURRENCY_LIMIT.set(self.limit)
+
+    def on_throttle(self) -> None:
+        """Мультипликативное уменьшение лимита"""
+        now = time.monotonic()
+        if now - self._decreased_at < self.cooldown:
+            return
+        self._decreased_at = now
+        self.limit = max(float(self.min_limit), self.limit / 2)
+        metrics.AI_CONCURRENCY_LIMIT.set(self.limit)
+        logger.warning(f"API ИИ ограничивает частоту запросов, лимит одновременных запросов: {int(self.limit)}")
+
+
+class CircuitBreaker:
+    """
+    Предохранитель: после failure_threshold отказов подряд открывается на reset_timeout секунд.
+    Затем пропускает один пробный запрос (полуоткрытое состояние): успех закрывает предохранитель, отказ — снова
+    открывает.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        metrics.AI_CIRCUIT_STATE.set(metrics.CIRCUIT_STATES[self.CLOSED])
+
+    @property
+    def state(self) -> str:
+        """Текущее состояние предохранителя"""
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def retry_after(self) -> float:
+        """Сколько секунд осталось до пробного запроса"""
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def before_call(self) -> None:
+        """
+        Проверка перед запросом
+
+        Raises:
+            CircuitOpenError: Если предохранитель открыт или пробный запрос уже выполняется
+        """
+        state = self.state
+        metrics.AI_CIRCUIT_STATE.set(metrics.CIRCUIT_STATES[state])
+        if state == self.OPEN or (state == self.HALF_OPEN and self._probe_in_flight):
+            metrics.AI_CIRCUIT_REJECTIONS.inc()
+            raise CircuitOpenError(max(self.retry_after(), 1.0))
+        if state == self.HALF_OPEN:
+            self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        """Успешный ответ: предохранитель закрывается"""
+        if self._opened_at is not None:
+            logger.info("API ИИ снова доступен, предохранитель закрыт")
+        self.failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        metrics.AI_CIRCUIT_STATE.set(metrics.CIRCUIT_STATES[self.CLOSED])
+
+    def record_failure(self) -> None:
+        """Отказ API: после серии отказов (или отказа пробного запроса) предохранитель открывается"""
+        self.failures += 1
+        if self._probe_in_flight or self.failures >= self.failure_threshold:
+            if self._opened_at is None or self._probe_in_flight:
+                logger.error(f"API ИИ недоступен ({self.failures} отказов подряд), предохранитель открыт")
+            self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+            metrics.AI_CIRCUIT_STATE.set(metrics.CIRCUIT_STATES[self.OPEN])
+
+    def release_probe(self) -> None:
+        """Пробный запрос завершился без ответа о состоянии API (например, отменен)"""
+        self._probe_in_flight = False
+
+
+def parse_retry_after(headers: Any) -> Optional[float]:
+    """Задержка из заголовков retry-after-ms / Retry-After (секунды или HTTP-дата), None — если заголовка нет"""
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_error(error: BaseException) -> Tuple[Optional[str], Optional[float]]:
+    """
+    Причина повтора запроса и задержка из Retry-After
+
+    Returns:
+        Tuple[Optional[str], Optional[float]]: Причина ("rate_limited", "server_error", "connection") или None,
+            если ошибку повторять бессмысленно, и задержка из заголовков ответа
+    """
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError)):
+        return "connection", None
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        return None, None
+    response = getattr(error, "response", None)
+    retry_after = parse_retry_after(getattr(response, "headers", None))
+    if status_code == 429:
+        return "rate_limited", retry_after
+    if status_code >= 500 or status_code in RETRYABLE_STATUS_CODES:
+        return "server_error", retry_after
+    return None, None
+
+
+def _limit_text(bucket: Optional[TokenBucket]) -> str:
+    """Лимит ведра для логов"""
+    return "без ограничения" if bucket is None else str(int(bucket.rate_per_minute))
+
+
+class RequestGuard:
+    """Ограничение скорости, повторы, адаптивный лимит параллельности и предохранитель для запросов к API ИИ"""
+
+    def __init__(
+        self,
+        rpm: int = DEFAULT_RATE_LIMIT_RPM,
+        tpm: int = DEFAULT_RATE_LIMIT_TPM,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        base_delay: float = DEFAULT_RETRY_BASE_DELAY,
+        max_delay: float = DEFAULT_RETRY_MAX_DELAY,
+        min_concurrency: int = DEFAULT_MIN_CONCURRENCY,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        breaker_threshold: int = DEFAULT_BREAKER_THRESHOLD,
+        breaker_reset: float = DEFAULT_BREAKER_RESET,
+    ):
+        """
+        Инициализация
+
+        Args:
+            rpm: Лимит запросов в минуту (0 — без ограничения)
+            tpm: Лимит токенов в минуту (0 — без ограничения)
+            max_retries: Максимальное количество повторов одного запроса
+            base_delay: Начальная задержка перед повтором, секунды
+            max_delay: Максимальная задержка перед повтором, секунды
+            min_concurrency: Минимальный адаптивный лимит одновременных запросов
+            max_concurrency: Максимальный (начальный) лимит одновременных запросов
+            breaker_threshold: Количество отказов подряд, после которого предохранитель открывается
+            breaker_reset: Через сколько секунд открытый предохранитель пропускает пробный запрос
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.request_bucket = TokenBucket(rpm, "rpm") if rpm > 0 else None
+        self.token_bucket = TokenBucket(tpm, "tpm") if tpm > 0 else None
+        self.limiter = AdaptiveConcurrencyLimiter(min(min_concurrency, max_concurrency), max_concurrency)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+
+    @classmethod
+    def from_env(cls) -> "RequestGuard":
+        """Создание по переменным окружения AI_RATE_LIMIT_*, AI_RETRY_*, AI_*_CONCURRENCY, AI_BREAKER_*"""
+        guard = cls(
+            rpm=get_env_int("AI_RATE_LIMIT_RPM", DEFAULT_RATE_LIMIT_RPM, min_value=0),
+            tpm=get_env_int("AI_RATE_LIMIT_TPM", DEFAULT_RATE_LIMIT_TPM, min_value=0),
+            max_retries=get_env_int("AI_MAX_RETRIES", DEFAULT_MAX_RETRIES, min_value=0),
+            base_delay=get_env_float("AI_RETRY_BASE_DELAY", DEFAULT_RETRY_BASE_DELAY, min_value=0.0),
+            max_delay=get_env_float("AI_RETRY_MAX_DELAY", DEFAULT_RETRY_MAX_DELAY, min_value=0.0),
+            min_concurrency=get_env_int("AI_MIN_CONCURRENCY", DEFAULT_MIN_CONCURRENCY, min_value=1),
+            max_concurrency=get_env_int("AI_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY, min_value=1),
+            breaker_threshold=get_env_int("AI_BREAKER_THRESHOLD", DEFAULT_BREAKER_THRESHOLD, min_value=1),
+            breaker_reset=get_env_float("AI_BREAKER_RESET", DEFAULT_BREAKER_RESET, min_value=0.0),
+        )
+        logger.info(
+            f"Запросы к API ИИ: до {guard.limiter.max_limit} одновременно, повторов {guard.max_retries}, "
+            f"лимиты в минуту: запросы {_limit_text(guard.request_bucket)}, токены {_limit_text(guard.token_bucket)}"
+        )
+        return guard
+
+    def ensure_available(self) -> None:
+        """
+        Быстрый отказ до начала анализа, если предохранитель открыт
+
+        Raises:
+            CircuitOpenError: Если предохранитель открыт
+        """
+        if self.breaker.state == CircuitBreaker.OPEN:
+            metrics.AI_CIRCUIT_REJECTIONS.inc()
+            raise CircuitOpenError(max(self.breaker.retry_after(), 1.0))
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float]) -> float:
+        """Задержка перед повтором: Retry-After, если указан, иначе экспоненциальная с полным случайным разбросом"""
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay / 2)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    async def call(self, func: Callable[[], Awaitable[T]], estimated_tokens: int = 0) -> T:
+        """
+        Выполнение запроса с ограничением скорости, повторами и предохранителем
+
+        Args:
+            func: Функция, выполняющая один запрос к API
+            estimated_tokens: Оценка токенов запроса и ответа для ограничителя токенов в минуту
+
+        Raises:
+            CircuitOpenError: Если предохранитель открыт
+            Exception: Ошибка последней попытки или ошибка, которую бессмысленно повторять
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            if self.request_bucket is not None:
+                await self.request_bucket.acquire(1)
+            if self.token_bucket is not None and estimated_tokens:
+                await self.token_bucket.acquire(estimated_tokens)
+
+            try:
+                async with self.limiter:
+                    result = await func()
+            except asyncio.CancelledError:
+                self.breaker.release_probe()
+                raise
+            except Exception as e:
+                reason, retry_after = classify_error(e)
+                if reason == "rate_limited":
+                    metrics.AI_RATE_LIMITED.inc()
+                    self.limiter.on_throttle()
+                    # 429 означает, что провайдер работает, поэтому предохранитель он не открывает
+                    self.breaker.release_probe()
+                elif reason is not None:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+
+                if reason is None or attempt >= self.max_retries:
+                    raise
+                if retry_after is not None and retry_after > self.max_delay:
+                    logger.warning(f"API ИИ просит повторить через {retry_after:.0f} с, это дольше допустимого")
+                    raise
+                delay = self.backoff_delay(attempt, retry_after)
+                attempt += 1
+                metrics.AI_RETRIES.labels(reason=reason).inc()
+                logger.warning(f"Запрос к API ИИ не удался ({reason}), попытка {attempt} через {delay:.1f} с")
+                await asyncio.sleep(delay)
+                continue
+
+            self.limiter.on_success()
+            self.breaker.record_success()
+            return result
+
+    def settle_tokens(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Возврат в ограничитель токенов разницы между оценкой и фактическим расходом"""
+        if self.token_bucket is not None and estimated_tokens > actual_tokens:
+            self.token_bucket.refund(estimated_tokens - actual_tokens)
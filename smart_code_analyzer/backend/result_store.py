@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+"""
+Хранилище результатов parsing-анализа.
+
+Каждый вызов `/analyzer/analyze` сохраняется под собственным идентификатором анализа, поэтому одновременные
+пользователи не затирают результаты друг друга. Хранилище — локальный SQLite-файл, общий для всех
+процессов-воркеров uvicorn: последующий ИИ-запрос может попасть в любой воркер. Содержимое файлов
+хранится один раз на хэш, записи ограничены по количеству, суммарному объему (содержимое файлов и HTML) и
+времени жизни. Здесь же хранится состояние фоновых заданий, чтобы статус задания отдавал любой воркер.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from smart_code_analyzer.backend.env import get_env_int
+
+# Настраиваем логирование
+logger = logging.getLogger("uvicorn.error")
+
+DEFAULT_STORE_PATH = ".cache/results.sqlite3"
+DEFAULT_STORE_MAX_ANALYSES = 100
+DEFAULT_STORE_MAX_BYTES = 200 * 1024 * 1024
+DEFAULT_STORE_TTL = 3600
+
+# Имя записи сводки среди результатов анализа
+SUMMARY_KEY = "summary"
+
+
+class ResultStore:
+    """Ограниченное хранилище результатов анализа в SQLite, доступное из нескольких процессов"""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_STORE_PATH,
+        max_analyses: int = DEFAULT_STORE_MAX_ANALYSES,
+        max_bytes: int = DEFAULT_STORE_MAX_BYTES,
+        ttl: int = DEFAULT_STORE_TTL,
+    ):
+        """
+        Инициализация хранилища
+
+        Args:
+            path: Путь к SQLite-файлу
+            max_analyses: Максимальное количество хранимых анализов
+            max_bytes: Максимальный суммарный объем содержимого файлов и HTML в байтах
+            ttl: Время жизни анализа в секундах
+        """
+        self.path = path
+        self.max_analyses = max_analyses
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS analyses (
+                    analysis_id TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS analysis_files (
+                    analysis_id TEXT NOT NULL REFERENCES analyses (analysis_id) ON DELETE CASCADE,
+                    filename TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    html TEXT,
+                    content_hash TEXT,
+                    PRIMARY KEY (analysis_id, filename)
+                );
+                CREATE TABLE IF NOT EXISTS contents (
+                    content_hash TEXT PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    size INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    snapshot TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS analyses_created ON analyses (created_at);
+                CREATE INDEX IF NOT EXISTS analysis_files_hash ON analysis_files (content_hash);
+                """
+            )
+
+    @classmethod
+    def from_env(cls) -> "ResultStore":
+        """Создание хранилища по переменным окружения RESULT_STORE_*"""
+        store = cls(
+            path=os.getenv("RESULT_STORE_PATH", DEFAULT_STORE_PATH),
+            max_analyses=get_env_int("RESULT_STORE_MAX_ANALYSES", DEFAULT_STORE_MAX_ANALYSES, min_value=1),
+            max_bytes=get_env_int("RESULT_STORE_MAX_BYTES", DEFAULT_STORE_MAX_BYTES, min_value=1),
+            ttl=get_env_int("RESULT_STORE_TTL", DEFAULT_STORE_TTL, min_value=1),
+        )
+        logger.info(
+            f"Хранилище результатов: файл {store.path}, до {store.max_analyses} анализов, "
+            f"до {store.max_bytes} байт, время жизни {store.ttl} с"
+        )
+        return store
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Соединение с SQLite-файлом (транзакция фиксируется и соединение закрывается на выходе)"""
+        connection = sqlite3.connect(self.path, timeout=10.0)
+        connection.execute("PRAGMA foreign_keys=ON")
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def content_hash(content: str) -> str:
+        """Хэш содержимого файла"""
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def save_analysis(self, results: Dict[str, Dict[str, Any]]) -> str:
+        """
+        Сохранение результатов анализа
+
+        Args:
+            results: Словарь "имя файла -> результат" (status, data, html), включая ключ "summary".
+                Содержимое файла берется из data["file_content"] и хранится отдельно, один раз на хэш.
+
+        Returns:
+            str: Идентификатор анализа
+        """
+        analysis_id = uuid.uuid4().hex
+        now = time.time()
+        rows, contents = [], {}
+        for position, (filename, result) in enumerate(results.items()):
+            data = dict(result.get("data") or {})
+            content = data.pop("file_content", None)
+            content_hash = None
+            if content is not None:
+                content_hash = self.content_hash(content)
+                contents[content_hash] = content
+            rows.append(
+                (
+                    analysis_id,
+                    filename,
+                    position,
+                    result.get("status", "completed"),
+                    json.dumps(data, ensure_ascii=False),
+                    result.get("html"),
+                    content_hash,
+                )
+            )
+
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                "INSERT INTO analyses (analysis_id, created_at, expires_at) VALUES (?, ?, ?)",
+                (analysis_id, now, now + self.ttl),
+            )
+            connection.executemany(
+                "INSERT OR IGNORE INTO contents (content_hash, content, size) VALUES (?, ?, ?)",
+                [(h, c, len(c.encode("utf-8"))) for h, c in contents.items()],
+            )
+            connection.executemany(
+                "INSERT INTO analysis_files (analysis_id, filename, position, status, data, html, content_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._evict(connection, keep=analysis_id)
+        return analysis_id
+
+    def _evict(self, connection: sqlite3.Connection, keep: Optional[str] = None) -> None:
+        """Удаление просроченных и лишних (сверх лимитов) анализов, затем неиспользуемого содержимого"""
+        connection.execute("DELETE FROM analyses WHERE expires_at < ?", (time.time(),))
+        connection.execute("DELETE FROM jobs WHERE expires_at < ?", (time.time(),))
+        connection.execute(
+            "DELETE FROM analyses WHERE analysis_id IN ("
+            "SELECT analysis_id FROM analyses ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_analyses,),
+        )
+        connection.execute(
+            "DELETE FROM contents WHERE content_hash NOT IN ("
+            "SELECT content_hash FROM analysis_files WHERE content_hash IS NOT NULL)"
+        )
+
+        # Ограничение по объему: удаляем самые старые анализы, пока не уложимся в лимит
+        while True:
+            total = connection.execute(
+                "SELECT (SELECT COALESCE(SUM(size), 0) FROM contents) "
+                "+ (SELECT COALESCE(SUM(LENGTH(CAST(html AS BLOB))), 0) FROM analysis_files)"
+            ).fetchone()[0]
+            if total <= self.max_bytes:
+                break
+            oldest = connection.execute(
+                "SELECT analysis_id FROM analyses WHERE analysis_id != ? ORDER BY created_at LIMIT 1", (keep or "",)
+            ).fetchone()
+            if oldest is None:
+                logger.warning(f"Анализ {keep} больше лимита хранилища ({self.max_bytes} байт), он сохранен целиком")
+                break
+            connection.execute("DELETE FROM analyses WHERE analysis_id = ?", (oldest[0],))
+            connection.execute(
+                "DELETE FROM contents WHERE content_hash NOT IN ("
+                "SELECT content_hash FROM analysis_files WHERE content_hash IS NOT NULL)"
+            )
+
+    def save_job(self, job_id: str, version: int, snapshot: Dict[str, Any]) -> None:
+        """
+        Сохранение состояния фонового задания, чтобы его статус мог отдать любой процесс-воркер.
+
+        Более старая версия состояния не перезаписывает более новую.
+        """
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO jobs (job_id, version, expires_at, snapshot) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (job_id) DO UPDATE SET version = excluded.version, expires_at = excluded.expires_at, "
+                "snapshot = excluded.snapshot WHERE excluded.version > jobs.version",
+                (job_id, version, time.time() + self.ttl, json.dumps(snapshot, ensure_ascii=False)),
+            )
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Последнее сохраненное состояние фонового задания (None, если задание не найдено)"""
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT snapshot FROM jobs WHERE job_id = ? AND expires_at >= ?", (job_id, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def purge_expired(self) -> None:
+        """Принудительная очистка просроченных анализов"""
+        with self._lock, self._connect() as connection:
+            self._evict(connection)
+
+    def exists(self, analysis_id: str) -> bool:
+        """Проверка, что анализ существует и не просрочен"""
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT 1 FROM analyses WHERE analysis_id = ? AND expires_at >= ?", (analysis_id, time.time())
+            ).fetchone()
+        return row is not None
+
+    def get_file_content(self, analysis_id: str, filename: str) -> Optional[str]:
+        """Содержимое файла из анализа (None, если анализ или файл не найден)"""
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT c.content FROM analysis_files f "
+                "JOIN analyses a ON a.analysis_id = f.analysis_id "
+                "JOIN contents c ON c.content_hash = f.content_hash "
+                "WHERE f.analysis_id = ? AND f.filename = ? AND a.expires_at >= ?",
+                (analysis_id, filename, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_file_contents(self, analysis_id: str) -> Dict[str, str]:
+        """Содержимое всех файлов анализа (без сводки)"""
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT f.filename, c.content FROM analysis_files f "
+                "JOIN analyses a ON a.analysis_id = f.analysis_id "
+                "JOIN contents c ON c.content_hash = f.content_hash "
+                "WHERE f.analysis_id = ? AND a.expires_at >= ? ORDER BY f.position",
+                (analysis_id, time.time()),
+            ).fetchall()
+        return {filename: content for filename, content in rows}
+
+    def get_index(self, analysis_id: str, offset: int = 0, limit: int = 100) -> Optional[Dict[str, Any]]:
+        """
+        Оглавление анализа: сводка и страница метаданных файлов без их данных и HTML
+
+        Args:
+            analysis_id: Идентификатор анализа
+            offset: Количество пропускаемых файлов
+            limit: Максимальное количество файлов на странице
+
+        Returns:
+            Optional[Dict[str, Any]]: analysis_id, total, offset, limit, summary и files
+                (file_id, filename, status, size, html_ready) или None, если анализ не найден
+        """
+        if not self.exists(analysis_id):
+            return None
+        with self._connect() as connection:
+            total = connection.execute(
+                "SELECT COUNT(*) FROM analysis_files WHERE analysis_id = ? AND filename != ?",
+                (analysis_id, SUMMARY_KEY),
+            ).fetchone()[0]
+            rows: List[Any] = connection.execute(
+                "SELECT f.position, f.filename, f.status, COALESCE(c.size, 0), f.html IS NOT NULL "
+                "FROM analysis_files f LEFT JOIN contents c ON c.content_hash = f.content_hash "
+                "WHERE f.analysis_id = ? AND f.filename != ? ORDER BY f.position LIMIT ? OFFSET ?",
+                (analysis_id, SUMMARY_KEY, limit, offset),
+            ).fetchall()
+            summary = connection.execute(
+                "SELECT status, data, html FROM analysis_files WHERE analysis_id = ? AND filename = ?",
+                (analysis_id, SUMMARY_KEY),
+            ).fetchone()
+
+        return {
+            "analysis_id": analysis_id,
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "summary": {"status": summary[0], "data": json.loads(summary[1]), "html": summary[2]} if summary else None,
+            "files": [
+                {"file_id": position, "filename": filename, "status": status, "size": size, "html_ready": bool(ready)}
+                for position, filename, status, size, ready in rows
+            ],
+        }
+
+    def get_file(self, analysis_id: str, file_id: int) -> Optional[Dict[str, Any]]:
+        """Результат одного файла анализа по его file_id: filename, status, data, html (None, если не найден)"""
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT f.filename, f.status, f.data, f.html, c.content FROM analysis_files f "
+                "JOIN analyses a ON a.analysis_id = f.analysis_id "
+                "LEFT JOIN contents c ON c.content_hash = f.content_hash "
+                "WHERE f.analysis_id = ? AND f.position = ? AND f.filename != ? AND a.expires_at >= ?",
+                (analysis_id, file_id, SUMMARY_KEY, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        filename, status, data, html, content = row
+        data = json.loads(data)
+        if content is not None:
+            data["file_content"] = content
+        return {"filename": filename, "status": status, "data": data, "html": html}
+
+    def set_file_html(self, analysis_id: str, file_id: int, html: str) -> None:
+        """Сохранение HTML файла, отформатированного по запросу (HTML учитывается в лимите объема)"""
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                "UPDATE analysis_files SET html = ? WHERE analysis_id = ? AND position = ?",
+                (html, analysis_id, file_id),
+            )
+            self._evict(connection, keep=analysis_id)
+
+    def get_analysis(self, analysis_id: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Полные результаты анализа в исходном виде (None, если анализ не найден)"""
+        if not self.exists(analysis_id):
+            return None
+        with self._connect() as connection:
+            rows: List[Any] = connection.execute(
+                "SELECT f.filename, f.status, f.data, f.html, c.content FROM analysis_files f "
+                "LEFT JOIN contents c ON c.content_hash = f.content_hash "
+                "WHERE f.analysis_id = ? ORDER BY f.position",
+                (analysis_id,),
+            ).fetchall()
+
+        results = {}
+        for filename, status, data, html, content in rows:
+            data = json.loads(data)
+            if content is not None:
+                data["file_content"] = content
+            results[filename] = {"status": status, "data": data, "html": html}
+        return results
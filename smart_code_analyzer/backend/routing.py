@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+"""
+Выбор модели для этапа анализа по сложности файла.
+
+Перед обращением к модели файл оценивается локально: количество строк и токенов, количество классов и функций,
+максимальная цикломатическая сложность функции (по AST, для Python-кода). Простые файлы, у которых все признаки
+не превышают порогов AI_ROUTING_MAX_*, анализируются быстрой моделью AI_ROUTING_FAST_MODEL, остальные — основной
+моделью анализатора. Этапы из AI_ROUTING_FAST_STAGES всегда отправляются быстрой модели, этапы из
+AI_ROUTING_STRONG_STAGES — всегда основной. Каждое решение записывается в результат анализа (поле `routing`)
+и в метрику ai_routing_decisions_total, чтобы пороги можно было подобрать по фактическим данным.
+"""
+
+import ast
+import logging
+import os
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+from smart_code_analyzer.backend import metrics
+from smart_code_analyzer.backend.env import get_env_bool, get_env_int
+from smart_code_analyzer.backend.token_budget import count_tokens
+
+# Настраиваем логирование
+logger = logging.getLogger("uvicorn.error")
+
+DEFAULT_FAST_MODEL = "gpt-4.1-mini"
+DEFAULT_MAX_TOKENS = 1500
+DEFAULT_MAX_LINES = 150
+DEFAULT_MAX_CLASSES = 1
+DEFAULT_MAX_COMPLEXITY = 10
+
+# Этапы фрагментов и символов больших файлов выбирают модель так же, как поиск проблем во всем файле
+STAGE_ALIASES = {"potential_issues_chunk": "potential_issues", "symbols": "potential_issues"}
+
+# Узлы AST, каждый из которых добавляет ветвление к цикломатической сложности
+BRANCH_NODES: Tuple[type, ...] = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.IfExp, ast.ExceptHandler, ast.Assert)
+if hasattr(ast, "match_case"):
+    BRANCH_NODES += (ast.match_case,)
+
+
+@dataclass
+class ComplexitySignals:
+    """Локальные признаки сложности файла"""
+
+    lines: int
+    tokens: int
+    classes: int = 0
+    functions: int = 0
+    max_complexity: int = 0
+    parsed: bool = False
+
+
+@dataclass
+class RouteDecision:
+    """Модель этапа и причина выбора"""
+
+    model: str
+    reason: str
+
+
+def function_complexity(node: ast.AST) -> int:
+    """Цикломатическая сложность функции: 1 + ветвления, условия в генераторах и дополнительные операнды and/or"""
+    complexity = 1
+    for child in ast.walk(node):
+        if isinstance(child, BRANCH_NODES):
+            complexity += 1
+        elif isinstance(child, ast.comprehension):
+            complexity += 1 + len(child.ifs)
+        elif isinstance(child, ast.BoolOp):
+            complexity += len(child.values) - 1
+    return complexity
+
+
+def measure_complexity(code: str, model: str) -> ComplexitySignals:
+    """Признаки сложности кода (классы и сложность функций — только для кода, который разбирается как Python)"""
+    signals = ComplexitySignals(lines=len(code.splitlines()), tokens=count_tokens(code, model))
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return signals
+    signals.parsed = True
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ClassDef):
+            signals.classes += 1
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            signals.functions += 1
+            signals.max_complexity = max(signals.max_complexity, function_complexity(node))
+    return signals
+
+
+class ModelRouter:
+    """Выбор модели этапа анализа по признакам сложности файла"""
+
+    def __init__(
+        self,
+        default_model: str,
+        fast_model: str = DEFAULT_FAST_MODEL,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        max_lines: int = DEFAULT_MAX_LINES,
+        max_classes: int = DEFAULT_MAX_CLASSES,
+        max_complexity: int = DEFAULT_MAX_COMPLEXITY,
+        fast_stages: Iterable[str] = (),
+        strong_stages: Iterable[str] = (),
+    ):
+        """
+        Инициализация
+
+        Args:
+            default_model: Основная модель анализатора (для сложных файлов)
+            fast_model: Быстрая модель для простых файлов
+            max_tokens: Максимальное количество токенов простого файла
+            max_lines: Максимальное количество строк простого файла
+            max_classes: Максимальное количество классов простого файла
+            max_complexity: Максимальная цикломатическая сложность функции простого файла
+            fast_stages: Этапы, которые всегда выполняет быстрая модель
+            strong_stages: Этапы, которые всегда выполняет основная модель
+        """
+        self.default_model = default_model
+        self.fast_model = fast_model
+        self.thresholds = {
+            "tokens": max_tokens,
+            "lines": max_lines,
+            "classes": max_classes,
+            "max_complexity": max_complexity,
+        }
+        self.fast_stages = set(fast_stages)
+        self.strong_stages = set(strong_stages)
+
+    @classmethod
+    def from_env(cls, default_model: str, available_models: Mapping[str, str]) -> Optional["ModelRouter"]:
+        """Создание по переменным окружения AI_ROUTING_* (None, если выбор модели выключен или не нужен)"""
+        if not get_env_bool("AI_ROUTING_ENABLED", True):
+            return None
+        fast_model = os.getenv("AI_ROUTING_FAST_MODEL", DEFAULT_FAST_MODEL)
+        if fast_model not in available_models:
+            logger.error(f"Модель AI_ROUTING_FAST_MODEL={fast_model} не поддерживается, выбор модели выключен")
+            return None
+        if fast_model == default_model:
+            return None
+
+        def stages(name: str) -> Iterable[str]:
+            return [stage.strip() for stage in os.getenv(name, "").split(",") if stage.strip()]
+
+        router = cls(
+            default_model,
+            fast_model,
+            max_tokens=get_env_int("AI_ROUTING_MAX_TOKENS", DEFAULT_MAX_TOKENS, min_value=0),
+            max_lines=get_env_int("AI_ROUTING_MAX_LINES", DEFAULT_MAX_LINES, min_value=0),
+            max_classes=get_env_int("AI_ROUTING_MAX_CLASSES", DEFAULT_MAX_CLASSES, min_value=0),
+            max_complexity=get_env_int("AI_ROUTING_MAX_COMPLEXITY", DEFAULT_MAX_COMPLEXITY, min_value=0),
+            fast_stages=stages("AI_ROUTING_FAST_STAGES"),
+            strong_stages=stages("AI_ROUTING_STRONG_STAGES"),
+        )
+        logger.info(f"Выбор модели: {fast_model} для простых файлов ({router.thresholds}), иначе {default_model}")
+        return router
+
+    def exceeded(self, signals: ComplexitySignals) -> Optional[str]:
+        """Первый признак, превысивший порог простого файла (None для простого файла)"""
+        for name, limit in self.thresholds.items():
+            if getattr(signals, name) > limit:
+                return name
+        return None
+
+    def route(self, stage: str, signals: ComplexitySignals) -> RouteDecision:
+        """Модель этапа для файла с заданными признаками"""
+        stage = STAGE_ALIASES.get(stage, stage)
+        if stage in self.strong_stages:
+            return RouteDecision(self.default_model, "strong_stage")
+        if stage in self.fast_stages:
+            return RouteDecision(self.fast_model, "fast_stage")
+        exceeded = self.exceeded(signals)
+        if exceeded is not None:
+            return RouteDecision(self.default_model, exceeded)
+        return RouteDecision(self.fast_model, "simple")
+
+    def plan(self, stages: Iterable[str], signals: ComplexitySignals) -> Dict[str, RouteDecision]:
+        """Модели этапов анализа файла"""
+        return {stage: self.route(stage, signals) for stage in stages}
+
+
+def plan_key(plan: Dict[str, RouteDecision], default_model: str) -> str:
+    """
+    Модельная часть ключа кэша результата: основная модель, если все этапы выполняет она
+    (ключи совпадают с ключами анализа без выбора модели), иначе модели всех этапов
+    """
+    if all(decision.model == default_model for decision in plan.values()):
+        return default_model
+    return ",".join(f"{stage}={decision.model}" for stage, decision in sorted(plan.items()))
+
+
+def record_plan(plan: Dict[str, RouteDecision], signals: ComplexitySignals) -> Dict[str, object]:
+    """Запись решений в метрики и отчет для поля routing результата анализа"""
+    for stage, decision in plan.items():
+        metrics.AI_ROUTING_DECISIONS.labels(stage=stage, model=decision.model, reason=decision.reason).inc()
+    return {"signals": asdict(signals), "stages": {stage: asdict(decision) for stage, decision in plan.items()}}
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+"""
+Локальный статический анализ Python-кода по AST.
+
+Отвечает без обращения к модели на вопросы, которые решаются детерминированно: покрытие docstring,
+соглашения об именовании PEP 8, слишком длинные функции, голые `except`, изменяемые значения аргументов
+по умолчанию, классы с чрезмерным количеством методов. Результаты дополняют ответ модели
+(а модели задаются только оставшиеся вопросы) или полностью заменяют его в режиме `fast`.
+"""
+
+import ast
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
+
+# Функции длиннее этого количества строк считаются слишком длинными
+MAX_FUNCTION_LINES = 50
+# Классы с большим количеством методов, вероятно, совмещают несколько ответственностей
+MAX_CLASS_METHODS = 15
+
+# Сколько имен перечислять в текстовых оценках
+MAX_LISTED_NAMES = 10
+
+NOT_EVALUATED = "Не оценивалось без ИИ"
+
+# Проблемы, для которых рекомендация одинакова для всех мест и попадает в общий список рекомендаций
+SIMPLE_FIXES = ("Голый except",)
+
+# Категории проблем, которые находит статический анализ (модели их искать не нужно)
+STATIC_ISSUE_TYPES = (
+    "голые except",
+    "изменяемые значения аргументов по умолчанию",
+    "слишком длинные функции",
+    "классы со слишком большим количеством методов",
+)
+
+CLASS_NAME = re.compile(r"^_*[A-Z][A-Za-z0-9]*$")
+FUNCTION_NAME = re.compile(r"^(_*[a-z][a-z0-9_]*|__[a-z0-9_]+__|visit_[A-Za-z0-9_]+)$")
+
+FunctionNode = Union[ast.FunctionDef, ast.AsyncFunctionDef]
+
+
+@dataclass
+class StaticFindings:
+    """Результаты статического анализа в терминах полей AIAnalysisResult"""
+
+    documentation: str
+    naming: str
+    structure: str
+    srp: str
+    issues: List[Dict[str, str]] = field(default_factory=list)
+    recommendations: List[str] = field(default_factory=list)
+
+    def code_style(self) -> Dict[str, str]:
+        """Оценка стиля кода без ИИ (форматирование не оценивается)"""
+        return {
+            "formatting": NOT_EVALUATED,
+            "naming": self.naming,
+            "documentation": self.documentation,
+            "structure": self.structure,
+        }
+
+    def solid_principles(self) -> Dict[str, str]:
+        """Оценка SOLID без ИИ: только SRP по количеству методов классов"""
+        return {"SRP": self.srp, "OCP": NOT_EVALUATED, "LSP": NOT_EVALUATED, "ISP": NOT_EVALUATED, "DIP": NOT_EVALUATED}
+
+
+def _names(names: List[str]) -> str:
+    listed = ", ".join(names[:MAX_LISTED_NAMES])
+    return listed + (f" и еще {len(names) - MAX_LISTED_NAMES}" if len(names) > MAX_LISTED_NAMES else "")
+
+
+def _issue(issue_type: str, description: str, line: int, recommendation: str) -> Dict[str, str]:
+    return {"type": issue_type, "description": description, "line": str(line), "recommendation": recommendation}
+
+
+def _mutable_defaults(node: FunctionNode) -> List[Tuple[str, ast.expr]]:
+    """Аргументы функции с изменяемыми значениями по умолчанию (литералы list/dict/set и их конструкторы)"""
+    positional = node.args.posonlyargs + node.args.args
+    pairs = list(zip(positional[len(positional) - len(node.args.defaults) :], node.args.defaults))
+    pairs += [(arg, default) for arg, default in zip(node.args.kwonlyargs, node.args.kw_defaults) if default]
+    mutable = []
+    for arg, default in pairs:
+        is_literal = isinstance(default, (ast.List, ast.Dict, ast.Set, ast.ListComp, ast.DictComp, ast.SetComp))
+        is_constructor = (
+            isinstance(default, ast.Call)
+            and isinstance(default.func, ast.Name)
+            and default.func.id in ("list", "dict", "set")
+        )
+        if is_literal or is_constructor:
+            mutable.append((arg.arg, default))
+    return mutable
+
+
+def analyze_static(code: str) -> Optional[StaticFindings]:
+    """
+    Статический анализ кода
+
+    Args:
+        code: Исходный код
+
+    Returns:
+        Optional[StaticFindings]: Результаты анализа или None, если код не удалось разобрать как Python
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+
+    undocumented: List[str] = []
+    documentable = 1
+    if not ast.get_docstring(tree):
+        undocumented.append("модуль")
+
+    bad_names: List[str] = []
+    issues: List[Dict[str, str]] = []
+    long_functions: List[str] = []
+    large_classes: List[str] = []
+    classes = functions = 0
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ClassDef):
+            classes += 1
+            if not CLASS_NAME.match(node.name):
+                bad_names.append(f"класс {node.name}")
+            methods = [n for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+            if len(methods) > MAX_CLASS_METHODS:
+                large_classes.append(f"{node.name} ({len(methods)})")
+                issues.append(
+                    _issue(
+                        "Слишком много методов",
+                        f"Класс {node.name} содержит {len(methods)} методов (больше {MAX_CLASS_METHODS}) "
+                        f"и, вероятно, совмещает несколько ответственностей",
+                        node.lineno,
+                        "Разделите класс на несколько классов с одной ответственностью",
+                    )
+                )
+
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions += 1
+            if not FUNCTION_NAME.match(node.name):
+                bad_names.append(f"функция {node.name}")
+            # end_lineno заполнен у всех узлов, разобранных ast.parse
+            length = (node.end_lineno or node.lineno) - node.lineno + 1
+            if length > MAX_FUNCTION_LINES:
+                long_functions.append(f"{node.name} ({length})")
+                issues.append(
+                    _issue(
+                        "Слишком длинная функция",
+                        f"Функция {node.name} занимает {length} строк (больше {MAX_FUNCTION_LINES})",
+                        node.lineno,
+                        "Разбейте функцию на несколько небольших функций",
+                    )
+                )
+            for name, default in _mutable_defaults(node):
+                issues.append(
+                    _issue(
+                        "Изменяемое значение по умолчанию",
+                        f"Аргумент {name} функции {node.name} по умолчанию равен изменяемому объекту, "
+                        f"который общий для всех вызовов",
+                        default.lineno,
+                        f"Используйте {name}=None и создавайте объект внутри функции",
+                    )
+                )
+
+        elif isinstance(node, ast.ExceptHandler) and node.type is None:
+            issues.append(
+                _issue(
+                    "Голый except",
+                    "except без типа исключения перехватывает в том числе KeyboardInterrupt и SystemExit",
+                    node.lineno,
+                    "Перехватывайте конкретные исключения (как минимум Exception)",
+                )
+            )
+
+        if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)) and not node.name.startswith("_"):
+            documentable += 1
+            if not ast.get_docstring(node):
+                undocumented.append(node.name)
+
+    if undocumented:
+        documentation = (
+            f"Плохо: docstring отсутствует у {len(undocumented)} из {documentable} объектов: {_names(undocumented)}"
+        )
+    else:
+        documentation = f"Хорошо: модуль и все публичные классы и функции ({documentable}) документированы"
+
+    if bad_names:
+        naming = f"Плохо: имена не соответствуют PEP 8: {_names(bad_names)}"
+    else:
+        naming = "Хорошо: имена классов и функций соответствуют PEP 8"
+
+    structure = f"Классов: {classes}, функций и методов: {functions}"
+    if long_functions:
+        structure = f"Плохо: слишком длинные функции (строк): {_names(long_functions)}. {structure}"
+
+    if large_classes:
+        srp = f"Не соответствует: классы с большим количеством методов: {_names(large_classes)}"
+    else:
+        srp = f"Соответствует по количеству методов в классах (не больше {MAX_CLASS_METHODS})"
+
+    recommendations = []
+    if undocumented:
+        recommendations.append(f"Добавьте docstring: {_names(undocumented)}")
+    if bad_names:
+        recommendations.append(f"Переименуйте в соответствии с PEP 8: {_names(bad_names)}")
+    if long_functions:
+        recommendations.append(f"Разбейте длинные функции: {_names(long_functions)}")
+    if large_classes:
+        recommendations.append(f"Разделите ответственность классов: {_names(large_classes)}")
+    recommendations.extend(dict.fromkeys(issue["recommendation"] for issue in issues if issue["type"] in SIMPLE_FIXES))
+
+    issues.sort(key=lambda issue: int(issue["line"]))
+    return StaticFindings(
+        documentation=documentation,
+        naming=naming,
+        structure=structure,
+        srp=srp,
+        issues=issues,
+        recommendations=recommendations,
+    )
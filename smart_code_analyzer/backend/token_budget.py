@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+"""
+Подсчет токенов и сжатие исходного кода перед отправкой модели.
+
+Каждому этапу анализа нужна своя часть кода: оценке стиля важны комментарии и docstring, а проверке SOLID
+и поиску проблем — нет. Сжатие убирает то, что этапу не нужно (комментарии, длинные docstring, лишние
+пустые строки, большие литеральные таблицы), и ограничивает размер кода потолком токенов на запрос.
+Токены считаются через tiktoken, если он установлен, иначе — приблизительно.
+"""
+
+import ast
+import importlib.util
+import io
+import logging
+import re
+import tokenize
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from smart_code_analyzer.backend.chunking import estimate_tokens
+
+# Настраиваем логирование
+logger = logging.getLogger("uvicorn.error")
+
+# Литералы длиннее этого количества элементов сокращаются до первых LITERAL_KEEP_ITEMS
+LITERAL_MAX_ITEMS = 8
+LITERAL_KEEP_ITEMS = 3
+
+TRUNCATION_MARKER = "# ... код сокращен до лимита токенов"
+
+# Сокращаемые литералы и узлы, которые заменяются при сжатии (docstring — инструкция, литерал — выражение)
+Literal = Union[ast.List, ast.Tuple, ast.Set, ast.Dict]
+Edit = Tuple[Union[ast.stmt, ast.expr], str, str]
+
+# Что можно убрать из кода для каждого этапа анализа
+STAGE_PROFILES: Dict[str, Dict[str, bool]] = {
+    "code_style": {"comments": False, "docstrings": False, "blank_lines": False, "literals": True},
+    "solid_principles": {"comments": True, "docstrings": True, "blank_lines": True, "literals": True},
+    "potential_issues": {"comments": True, "docstrings": True, "blank_lines": True, "literals": True},
+    "recommendations": {"comments": True, "docstrings": True, "blank_lines": True, "literals": True},
+    # Совмещенный запрос включает оценку стиля, поэтому сжимается так же осторожно
+    "fused": {"comments": False, "docstrings": False, "blank_lines": False, "literals": True},
+}
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: str) -> Optional[Any]:
+    """Токенизатор модели из tiktoken (None, если tiktoken не установлен)"""
+    if importlib.util.find_spec("tiktoken") is None:
+        logger.info("tiktoken не установлен, количество токенов оценивается приблизительно")
+        return None
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Количество токенов текста для модели"""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str) -> str:
+    """Обрезка текста по целым строкам до max_tokens токенов (с пометкой об обрезке)"""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    lines = text.split("\n")
+    low, high = 0, len(lines)
+    # Бинарный поиск максимального количества строк, укладывающихся в бюджет вместе с пометкой
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens("\n".join(lines[:middle] + [TRUNCATION_MARKER]), model) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return "\n".join(lines[:low] + [TRUNCATION_MARKER])
+
+
+def _byte_slice(line: str, start: Optional[int] = None, end: Optional[int] = None) -> str:
+    """Срез строки по смещениям в байтах UTF-8 (так считает смещения модуль ast)"""
+    return line.encode("utf-8")[start:end].decode("utf-8", errors="ignore")
+
+
+def _strip_comments(lines: List[str]) -> List[str]:
+    """Удаление комментариев (строки кода сохраняются, строка из одного комментария становится пустой)"""
+    try:
+        tokens = list(tokenize.generate_tokens(io.StringIO("\n".join(lines)).readline))
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return lines
+    result = list(lines)
+    for token in reversed(tokens):
+        if token.type == tokenize.COMMENT:
+            row, col = token.start
+            result[row - 1] = result[row - 1][:col].rstrip()
+    return result
+
+
+def _shortened_literal(node: Literal) -> Tuple[str, str]:
+    """
+    Сокращенная запись большого литерала (первые элементы) и комментарий с количеством пропущенных
+
+    Запись остается корректным Python: пропуск в словаре обозначается парой '...': ..., распаковка **x
+    сохраняется как есть.
+    """
+    if isinstance(node, ast.Dict):
+        items = [
+            f"{ast.unparse(k)}: {ast.unparse(v)}" if k is not None else f"**{ast.unparse(v)}"
+            for k, v in zip(node.keys, node.values)
+        ]
+        opening, closing, placeholder = "{", "}", "'...': ..."
+    else:
+        items = [ast.unparse(element) for element in node.elts]
+        opening, closing = {ast.List: ("[", "]"), ast.Set: ("{", "}"), ast.Tuple: ("(", ")")}[type(node)]
+        placeholder = "..."
+    kept = items[:LITERAL_KEEP_ITEMS]
+    return f"{opening}{', '.join(kept + [placeholder])}{closing}", f"# еще {len(items) - len(kept)} элементов"
+
+
+def _shortened_docstring(docstring: str) -> str:
+    """Первая строка docstring в виде строкового литерала (кавычки и обратная косая черта экранируются)"""
+    first_line = docstring.strip().split("\n")[0].replace("\\", "\\\\").replace('"', '\\"')
+    return f'"""{first_line}"""'
+
+
+def _collect_edits(tree: ast.Module, docstrings: bool, literals: bool) -> List[Edit]:
+    """
+    Узлы, которые нужно заменить: docstring (первой строкой) и большие литералы (сокращенной записью)
+
+    Returns:
+        List[Edit]: Узел, текст на месте узла и комментарий в конец строки (пустой, если не нужен)
+    """
+    edits: List[Edit] = []
+    # ast.walk обходит дерево в ширину, поэтому внешний литерал встречается раньше вложенных в него.
+    # Не сокращаются литералы внутри уже сокращенных и f-строк, а также индексы вида x[1:2, 3]:
+    # сокращенная запись там не является корректным Python
+    skipped: Set[int] = set()
+    for node in ast.walk(tree):
+        if docstrings and isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            docstring = ast.get_docstring(node)
+            if docstring and "\n" in docstring.strip():
+                edits.append((node.body[0], _shortened_docstring(docstring), ""))
+        if isinstance(node, ast.JoinedStr):
+            skipped.update(id(child) for child in ast.walk(node))
+        elif isinstance(node, ast.Subscript):
+            skipped.add(id(node.slice))
+        if not literals or not isinstance(node, (ast.List, ast.Tuple, ast.Set, ast.Dict)) or id(node) in skipped:
+            continue
+        # Цели присваивания, for и del (a, b, *rest = ...) не сокращаются: многоточию нельзя присвоить значение
+        if isinstance(node, (ast.List, ast.Tuple)) and not isinstance(node.ctx, ast.Load):
+            continue
+        size = len(node.keys) if isinstance(node, ast.Dict) else len(node.elts)
+        if size > LITERAL_MAX_ITEMS:
+            edits.append((node, *_shortened_literal(node)))
+            skipped.update(id(child) for child in ast.walk(node))
+    return edits
+
+
+def compact_code(code: str, stage: str, preserve_lines: bool = False) -> str:
+    """
+    Сжатие кода для этапа анализа
+
+    Args:
+        code: Исходный код
+        stage: Этап анализа (ключ STAGE_PROFILES)
+        preserve_lines: Сохранять нумерацию строк (удаленные строки становятся пустыми)
+
+    Returns:
+        str: Сжатый код. Код, который не удалось разобрать как Python, только очищается от лишних пустых строк.
+    """
+    profile = STAGE_PROFILES.get(stage, STAGE_PROFILES["code_style"])
+    lines = code.split("\n")
+
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        tree = None
+
+    if tree is not None and (profile["docstrings"] or profile["literals"]):
+        edits = _collect_edits(tree, profile["docstrings"], profile["literals"])
+        # Замены применяются с конца файла, чтобы смещения еще не обработанных узлов оставались верными
+        edits.sort(key=lambda edit: (edit[0].lineno, edit[0].col_offset), reverse=True)
+        last_start = None
+        for node, replacement, note in edits:
+            start, end = node.lineno, node.end_lineno or node.lineno
+            if last_start is not None and end >= last_start:
+                continue
+            last_start = start
+            first = _byte_slice(lines[start - 1], end=node.col_offset)
+            tail = _byte_slice(lines[end - 1], start=node.end_col_offset)
+            line = first + replacement + tail
+            # Заменяется только сам узел: код после него остается, а пометка идет в конец строки
+            # (после продолжения строки обратной косой чертой комментарий недопустим)
+            if note and not line.rstrip().endswith("\\"):
+                line = f"{line.rstrip()}  {note}"
+            new_lines = [line]
+            if preserve_lines:
+                new_lines += [""] * (end - start)
+            lines[start - 1 : end] = new_lines
+
+    if tree is not None and profile["comments"]:
+        lines = _strip_comments(lines)
+
+    if profile["blank_lines"] and not preserve_lines:
+        text = re.sub(r"\n\s*\n(\s*\n)+", "\n\n", "\n".join(line.rstrip() for line in lines))
+        return text.strip("\n")
+    return "\n".join(lines)
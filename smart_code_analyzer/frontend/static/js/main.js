@@ -79,6 +79,7 @@ document.getElementById('uploadForm').addEventListener('submit', async (e) => {
             body: formData
         });
         const data = await response.json();
+        const analysisId = response.headers.get('X-Analysis-ID');
         document.getElementById('results').classList.remove('hidden');
         const resultsDiv = document.getElementById('analysisResults');
         resultsDiv.innerHTML = '';
@@ -203,6 +204,9 @@ document.getElementById('uploadForm').addEventListener('submit', async (e) => {
                 }
                 const formData = new FormData();
                 formData.append('file', file);
+                if (analysisId) {
+                    formData.append('analysis_id', analysisId);
+                }
                 try {
                     const resp = await fetch('/analyzer/ai-analyze', {
                         method: 'POST',
@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from smart_code_analyzer.backend.ai_analyzer import CONTINUATION_PROMPT, AIAnalyzer
+from smart_code_analyzer.backend.ai_cache import AIResultCache
+from smart_code_analyzer.backend.resilience import CircuitOpenError
+
+CODE = "def add(a, b):\n    return a + b\n"
+
+STYLE = {"formatting": "хорошо", "naming": "хорошо", "documentation": "отсутствует", "structure": "хорошо"}
+SOLID = {"SRP": "соответствует", "OCP": "соответствует", "LSP": "соответствует", "ISP": "соответствует", "DIP": "да"}
+ISSUES = [{"type": "bug", "description": "нет проверки типов", "line": "2", "recommendation": "добавить"}]
+RECOMMENDATIONS = ["Добавить docstring"]
+FUSED = {"code_style": STYLE, "solid_principles": SOLID, "potential_issues": ISSUES, "recommendations": RECOMMENDATIONS}
+
+
+def stage_answers(**overrides):
+    """Ответы модели для всех этапов и для совмещенного запроса"""
+    answers = {stage: json.dumps(value, ensure_ascii=False) for stage, value in FUSED.items()}
+    answers["fused"] = json.dumps(FUSED, ensure_ascii=False)
+    return {**answers, **overrides}
+
+
+def api_error(status_code: int) -> openai.APIStatusError:
+    response = httpx.Response(status_code, request=httpx.Request("POST", "http://api/chat"))
+    return openai.APIStatusError("error", response=response, body=None)
+
+
+def completion(content: str, finish_reason: str = "stop", prompt_tokens: int = 10, completion_tokens: int = 5):
+    usage = SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=prompt_tokens // 2),
+    )
+    message = SimpleNamespace(role="assistant", content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=finish_reason)], usage=usage)
+
+
+class Broken:
+    """Потоковый ответ, прерванный ошибкой после передачи части текста"""
+
+    def __init__(self, text: str, error: Exception):
+        self.text = text
+        self.error = error
+
+
+class Hang:
+    """Ответ, который не приходит"""
+
+
+class StubProviders:
+    """Пул провайдеров с заранее заданными ответами этапов: запоминает запросы, потоковые ответы передает частями"""
+
+    def __init__(self, answers):
+        self.answers = {
+            stage: list(answer) if isinstance(answer, list) else [answer] for stage, answer in answers.items()
+        }
+        self.calls = []
+
+    async def complete(self, stage="other", on_delta=None, **kwargs):
+        self.calls.append({"stage": stage, **kwargs})
+        queue = self.answers[stage]
+        answer = queue.pop(0) if len(queue) > 1 else queue[0]
+        if isinstance(answer, Hang):
+            await asyncio.Event().wait()
+        if isinstance(answer, Exception):
+            raise answer
+        if isinstance(answer, Broken):
+            self._feed(answer.text, on_delta)
+            raise answer.error
+        if isinstance(answer, str):
+            answer = completion(answer)
+        self._feed(answer.choices[0].message.content, on_delta)
+        return answer
+
+    @staticmethod
+    def _feed(text, on_delta, size: int = 7):
+        if on_delta is not None:
+            for start in range(0, len(text), size):
+                on_delta(text[start : start + size])
+
+    def stages(self):
+        return [call["stage"] for call in self.calls]
+
+
+@pytest.fixture
+def make_analyzer(monkeypatch):
+    for name in ("AI_PROVIDERS", "AI_ANALYSIS_MODE", "AI_MODEL"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("PROXYAPI_KEY", "test")
+    monkeypatch.setenv("AI_TEMPERATURE", "0.3")
+    monkeypatch.setenv("AI_ROUTING_ENABLED", "false")
+    monkeypatch.setenv("AI_STATIC_TIER_ENABLED", "false")
+    monkeypatch.setenv("AI_RETRY_BASE_DELAY", "0")
+
+    def make(answers, cache=None, **env) -> AIAnalyzer:
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        analyzer = AIAnalyzer(api_key="test", cache=cache)
+        analyzer.providers = StubProviders(answers)
+        return analyzer
+
+    return make
+
+
+def test_streamed_items_are_not_repeated_after_retry(make_analyzer):
+    fused = {
+        "code_style": STYLE,
+        "solid_principles": SOLID,
+        "potential_issues": [{"type": "a"}, {"type": "b"}, {"type": "c"}],
+        "recommendations": ["первая", "вторая"],
+    }
+    text = json.dumps(fused, ensure_ascii=False)
+    # Первая попытка успевает передать две проблемы и обрывается, повтор передает ответ с начала
+    broken = Broken(text[: text.index('{"type": "c"}')], api_error(503))
+    analyzer = make_analyzer({"fused": [broken, text]})
+    items = []
+
+    result = asyncio.run(
+        analyzer.analyze_code_text(CODE, "a.py", mode="fused", on_item=lambda *item: items.append(item))
+    )
+
+    assert analyzer.providers.stages() == ["fused", "fused"]
+    assert [item["type"] for stage, item in items if stage == "potential_issues"] == ["a", "b", "c"]
+    assert [item for stage, item in items if stage == "recommendations"] == ["первая", "вторая"]
+    assert [issue["type"] for issue in result.potential_issues] == ["a", "b", "c"]
+
+
+def test_cached_file_results_are_kept_per_mode(make_analyzer):
+    analyzer = make_analyzer(stage_answers(), cache=AIResultCache(path=None))
+
+    async def scenario():
+        fused = await analyzer.analyze_code_text(CODE, "a.py", mode="fused")
+        concurrent = await analyzer.analyze_code_text(CODE, "a.py", mode="concurrent")
+        repeated = await analyzer.analyze_code_text(CODE, "b.py", mode="fused")
+        return fused, concurrent, repeated
+
+    fused, concurrent, repeated = asyncio.run(scenario())
+
+    assert not fused.cached and not concurrent.cached
+    assert concurrent.token_usage["requests"] == 4
+    assert repeated.cached and repeated.filename == "b.py"
+    assert sorted(analyzer.providers.stages()) == sorted(["fused", *AIAnalyzer.STAGES])
+
+
+def test_cached_file_result_is_served_while_circuit_is_open(make_analyzer):
+    analyzer = make_analyzer(stage_answers(), cache=AIResultCache(path=None), AI_BREAKER_THRESHOLD=1)
+
+    async def scenario():
+        await analyzer.analyze_code_text(CODE, "a.py", mode="fused")
+        analyzer.guard.breaker.record_failure()
+        cached = await analyzer.analyze_code_text(CODE, "a.py", mode="fused")
+        with pytest.raises(CircuitOpenError):
+            await analyzer.analyze_code_text(CODE + "\n\nx = 1\n", "a.py", mode="fused")
+        return cached
+
+    assert asyncio.run(scenario()).cached
+    assert analyzer.providers.stages() == ["fused"]
+
+
+def test_concurrent_stages_run_in_parallel(make_analyzer):
+    analyzer = make_analyzer(stage_answers())
+    running, peak = 0, 0
+    complete = analyzer.providers.complete
+
+    async def tracked(**kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+        return await complete(**kwargs)
+
+    analyzer.providers.complete = tracked
+    result = asyncio.run(analyzer.analyze_code_text(CODE, "a.py", mode="concurrent"))
+
+    assert peak == len(AIAnalyzer.STAGES)
+    assert result.missing_stages == []
+    assert result.code_style == STYLE and result.recommendations == RECOMMENDATIONS
+
+
+def test_failed_and_hanging_stages_give_partial_result(make_analyzer):
+    analyzer = make_analyzer(stage_answers(solid_principles=api_error(400), recommendations=Hang()), AI_STAGE_TIMEOUT=1)
+    stages = {}
+
+    result = asyncio.run(analyzer.analyze_code_text(CODE, "a.py", mode="concurrent", on_stage=stages.__setitem__))
+
+    assert sorted(result.missing_stages) == ["recommendations", "solid_principles"]
+    assert result.code_style == STYLE
+    assert result.potential_issues == ISSUES
+    assert result.solid_principles == {} and result.recommendations == []
+    assert stages["solid_principles"] is None and stages["recommendations"] is None
+
+
+def test_sequential_mode_stops_on_first_failure(make_analyzer):
+    analyzer = make_analyzer(stage_answers(solid_principles=api_error(400)))
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(analyzer.analyze_code_text(CODE, "a.py", mode="sequential"))
+    assert analyzer.providers.stages() == ["code_style", "solid_principles"]
+
+
+def test_fused_mode_splits_one_answer_into_stages(make_analyzer):
+    analyzer = make_analyzer(stage_answers())
+
+    result = asyncio.run(analyzer.analyze_code_text(CODE, "a.py", mode="fused"))
+
+    assert analyzer.providers.stages() == ["fused"]
+    assert result.code_style == STYLE
+    assert result.solid_principles == SOLID
+    assert result.potential_issues == ISSUES
+    assert result.recommendations == RECOMMENDATIONS
+    assert result.token_usage == {
+        "requests": 1,
+        "prompt_tokens": 10,
+        "completion_tokens": 5,
+        "total_tokens": 15,
+        "cached_prompt_tokens": 5,
+    }
+
+
+def test_fused_mode_falls_back_on_malformed_answer(make_analyzer):
+    analyzer = make_analyzer(stage_answers(fused="Не могу проанализировать этот код"))
+
+    result = asyncio.run(analyzer.analyze_code_text(CODE, "a.py", mode="fused"))
+
+    assert result.missing_stages == []
+    assert set(result.solid_principles.values()) == {"Ошибка парсинга ответа"}
+    assert result.potential_issues[0]["type"] == "Ошибка парсинга"
+    assert result.recommendations == ["Ошибка парсинга ответа"]
+
+
+def test_fused_mode_reports_missing_sections(make_analyzer):
+    partial = {"code_style": STYLE, "potential_issues": ISSUES}
+    analyzer = make_analyzer(stage_answers(fused=json.dumps(partial, ensure_ascii=False)))
+
+    result = asyncio.run(analyzer.analyze_code_text(CODE, "a.py", mode="fused"))
+
+    assert result.missing_stages == ["solid_principles", "recommendations"]
+    assert result.potential_issues == ISSUES
+
+
+def test_token_usage_is_summed_over_stage_requests(make_analyzer):
+    analyzer = make_analyzer(stage_answers())
+
+    result = asyncio.run(analyzer.analyze_code_text(CODE, "a.py", mode="sequential"))
+
+    assert result.token_usage["requests"] == 4
+    assert result.token_usage["total_tokens"] == 4 * 15
+    assert result.token_usage["cached_prompt_tokens"] == 4 * 5
+
+
+def test_truncated_answer_is_continued_and_stitched(make_analyzer):
+    head = '[{"type": "bug", "description": "Деление на но'
+    tail = 'ль"}, {"type": "style"}]'
+    analyzer = make_analyzer(
+        stage_answers(potential_issues=[completion(head, finish_reason="length"), completion(tail)])
+    )
+    items = []
+
+    result = asyncio.run(
+        analyzer.analyze_code_text(CODE, "a.py", mode="sequential", on_item=lambda *item: items.append(item))
+    )
+
+    calls = [call for call in analyzer.providers.calls if call["stage"] == "potential_issues"]
+    assert len(calls) == 2
+    assert calls[1]["messages"][-2] == {"role": "assistant", "content": head}
+    assert calls[1]["messages"][-1]["content"] == CONTINUATION_PROMPT
+    assert [(issue["type"], issue["description"]) for issue in result.potential_issues] == [
+        ("bug", "Деление на ноль"),
+        ("style", "Нет описания"),
+    ]
+    # Элементы из добавленной продолжением части передаются потоковому разбору
+    assert [item["type"] for stage, item in items if stage == "potential_issues"] == ["bug", "style"]
+    assert result.token_usage["requests"] == 5
+
+
+def test_continuations_stop_at_the_limit(make_analyzer):
+    answers = [completion('[{"type": "a"}, {"type": "b', "length"), completion('"}, {"type": "c', "length")]
+    analyzer = make_analyzer(stage_answers(potential_issues=answers), AI_MAX_CONTINUATIONS=1)
+
+    result = asyncio.run(analyzer.analyze_code_text(CODE, "a.py", mode="sequential"))
+
+    assert analyzer.providers.stages().count("potential_issues") == 2
+    assert [issue["type"] for issue in result.potential_issues] == ["a", "b"]
+
+
+def test_package_files_are_parsed_in_the_given_executor(make_analyzer):
+    answer = {"architecture": "слои", "recommendations": "нет"}
+    analyzer = make_analyzer({"package": json.dumps(answer, ensure_ascii=False)})
+    files = [
+        {"filename": "a.py", "relative_path": "pkg/a.py", "content": "from pkg import b\n"},
+        {"filename": "b.py", "relative_path": "pkg/b.py", "content": "import os\n"},
+    ]
+    mapped = []
+
+    class RecordingExecutor(ThreadPoolExecutor):
+        def map(self, fn, *iterables, **kwargs):
+            mapped.append(fn.__name__)
+            return super().map(fn, *iterables, **kwargs)
+
+    with RecordingExecutor(max_workers=2) as executor:
+        result = asyncio.run(analyzer.analyze_package_structure(files, executor=executor))
+
+    assert mapped == ["parse_module"]
+    assert result["architecture"] == "слои"
+    assert result["import_graph"]["modules"] == 2
+    assert result["import_graph"]["external"] == {"os": 1}
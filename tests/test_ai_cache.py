@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+from smart_code_analyzer.backend.ai_cache import AIResultCache
+
+
+def test_key_ignores_whitespace_noise():
+    key = AIResultCache.make_key("file", "x = 1\r\ny = 2   \n\n", "gpt-4.1", 0.3, "1")
+    assert key == AIResultCache.make_key("file", "x = 1\ny = 2", "gpt-4.1", 0.3, "1")
+    assert key != AIResultCache.make_key("file", "x = 1\ny = 2", "gpt-4.1-mini", 0.3, "1")
+    assert key != AIResultCache.make_key("file", "x = 1\ny = 2", "gpt-4.1", 0.3, "2")
+
+
+def test_memory_tier_is_bounded_lru():
+    cache = AIResultCache(max_entries=2, path=None)
+    cache.set("a", {"v": 1}, "1")
+    cache.set("b", {"v": 2}, "1")
+    assert cache.get("a") == {"v": 1}
+    cache.set("c", {"v": 3}, "1")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.stats()["memory_entries"] == 2
+
+
+def test_disk_tier_survives_restart_and_invalidation(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = AIResultCache(path=path)
+    cache.set("old", {"v": 1}, "1")
+    cache.set("new", {"v": 2}, "2")
+
+    restarted = AIResultCache(path=path)
+    assert restarted.get("old") == {"v": 1}
+    assert restarted.stats()["disk_hits"] == 1
+
+    assert restarted.invalidate("1") == 1
+    assert AIResultCache(path=path).get("old") is None
+    assert AIResultCache(path=path).get("new") == {"v": 2}
+
+
+def test_invalidation_reaches_memory_of_other_workers(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    worker, other_worker = AIResultCache(path=path), AIResultCache(path=path)
+    worker.set("a", {"v": 1}, "1")
+    assert other_worker.get("a") == {"v": 1}
+
+    assert worker.invalidate("1") == 1
+    assert other_worker.get("a") is None
+
+
+def test_cached_value_is_not_shared_with_callers():
+    cache = AIResultCache(path=None)
+    value = {"issues": ["a"]}
+    cache.set("a", value, "1")
+    value["issues"].append("b")
+    cache.get("a")["issues"].append("c")
+
+    assert cache.get("a") == {"issues": ["a"]}
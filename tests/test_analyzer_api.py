@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+import asyncio
+import io
+import json
+import zipfile
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from smart_code_analyzer.backend.analyzer_api import router
+from smart_code_analyzer.backend.archive import ArchiveReader
+from smart_code_analyzer.backend.models import AIAnalysisResult
+from smart_code_analyzer.backend.result_store import ResultStore
+
+ISSUE = {"type": "bug", "description": "d", "line": "1", "recommendation": "r"}
+STAGE_RESULTS = {
+    "code_style": {"formatting": "хорошо"},
+    "solid_principles": None,
+    "potential_issues": [ISSUE],
+    "recommendations": ["rec"],
+}
+
+
+class StubAnalyzer:
+    """Анализатор, который передает элементы и этапы в заданном порядке"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def analyze_code_text(self, code, filename, mode=None, on_stage=None, on_item=None):
+        self.calls.append((code, filename, mode))
+        on_item("potential_issues", ISSUE)
+        for stage, result in STAGE_RESULTS.items():
+            await asyncio.sleep(0)
+            on_stage(stage, result)
+        results = {stage: result for stage, result in STAGE_RESULTS.items() if result is not None}
+        return AIAnalysisResult(
+            filename=filename,
+            code_style=results["code_style"],
+            solid_principles={},
+            potential_issues=results["potential_issues"],
+            recommendations=results["recommendations"],
+            overall_score=0.9,
+            missing_stages=["solid_principles"],
+        )
+
+
+def parse_sse(text: str):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_sends_items_stages_and_final_result(tmp_path):
+    store = ResultStore(path=str(tmp_path / "store.sqlite3"))
+    analysis_id = store.save_analysis(
+        {"a.py": {"status": "completed", "data": {"filename": "a.py", "file_content": "x = 1\n"}}}
+    )
+    app = FastAPI()
+    app.include_router(router)
+    app.state.ai_analyzer = StubAnalyzer()
+    app.state.result_store = store
+
+    response = TestClient(app).post(
+        "/analyzer/ai-analyze/stream?mode=fused",
+        files={"file": ("a.py", b"", "text/x-python")},
+        data={"analysis_id": analysis_id},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+    assert [event for event, _ in events] == ["item", *STAGE_RESULTS, "result"]
+    assert events[0][1] == {"stage": "potential_issues", "item": ISSUE}
+    assert events[1][1] == {"stage": "code_style", "status": "done", "result": {"formatting": "хорошо"}}
+    assert events[2][1]["status"] == "failed"
+    assert events[-1][1]["overall_score"] == 0.9
+    assert events[-1][1]["missing_stages"] == ["solid_principles"]
+    assert app.state.ai_analyzer.calls == [("x = 1\n", "a.py", "fused")]
+
+
+def test_ai_analysis_requires_analysis_id(tmp_path):
+    store = ResultStore(path=str(tmp_path / "store.sqlite3"))
+    store.save_analysis({"a.py": {"status": "completed", "data": {"filename": "a.py", "file_content": "x = 1\n"}}})
+    app = FastAPI()
+    app.include_router(router)
+    app.state.ai_analyzer = StubAnalyzer()
+    app.state.result_store = store
+
+    response = TestClient(app).post("/analyzer/ai-analyze/stream", files={"file": ("a.py", b"", "text/x-python")})
+
+    assert response.status_code == 400
+    assert app.state.ai_analyzer.calls == []
+
+
+class StubPool:
+    """Пул parsing-анализа, который только читает участники архива"""
+
+    def __init__(self):
+        self.members = []
+
+    async def analyze_stream(self, members, render_html=True):
+        self.members = list(members)
+        return [(path, {"lines": data.count(b"\n")}, None) for path, data in self.members], {}, ""
+
+
+def make_archive_app(tmp_path, max_bytes: int) -> FastAPI:
+    app = FastAPI()
+    app.include_router(router)
+    app.state.result_store = ResultStore(path=str(tmp_path / "store.sqlite3"))
+    app.state.parse_pool = StubPool()
+    app.state.archive_reader = ArchiveReader(max_bytes=max_bytes)
+    return app
+
+
+def zip_bytes(files) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def test_archive_is_read_from_the_request_stream(tmp_path):
+    app = make_archive_app(tmp_path, max_bytes=10_000)
+
+    response = TestClient(app).post(
+        "/analyzer/analyze-archive", files={"archive": ("p.zip", zip_bytes({"pkg/a.py": b"x = 1\n"}))}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["X-Analysis-ID"]
+    assert response.json()["pkg/a.py"]["data"] == {"lines": 1}
+    assert app.state.parse_pool.members == [("pkg/a.py", b"x = 1\n")]
+
+
+def test_too_large_archive_is_rejected_before_parsing(tmp_path):
+    app = make_archive_app(tmp_path, max_bytes=1000)
+    client = TestClient(app)
+
+    response = client.post("/analyzer/analyze-archive", files={"archive": ("p.zip", b"x" * 2000)})
+    missing = client.post("/analyzer/analyze-archive", files={"other": ("p.zip", b"x")})
+
+    assert response.status_code == 413
+    assert app.state.parse_pool.members == []
+    assert missing.status_code == 400
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+import asyncio
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from smart_code_analyzer.backend.archive import ArchiveError, ArchiveLimitError, ArchiveReader, member_path
+
+FILES = {
+    "pkg/__init__.py": b"",
+    "pkg/api.py": b"import os\n",
+    "pkg/__pycache__/api.py": b"",
+    "../evil.py": b"",
+    "README.md": b"# pkg",
+    "big.py": b"x = 1\n" * 100,
+}
+
+
+def make_zip() -> io.BytesIO:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in FILES.items():
+            archive.writestr(name, data)
+    return buffer
+
+
+def make_tar() -> io.BytesIO:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in FILES.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer
+
+
+def test_member_paths_are_filtered():
+    assert member_path("./pkg/api.py") == "pkg/api.py"
+    assert member_path("/abs/mod.py") == "abs/mod.py"
+    assert member_path("../evil.py") is None
+    assert member_path("pkg/__pycache__/api.py") is None
+    assert member_path("README.md") is None
+
+
+@pytest.mark.parametrize("make_archive", [make_zip, make_tar])
+def test_python_members_are_read_within_limits(make_archive):
+    reader = ArchiveReader(max_file_bytes=100)
+
+    members = dict(reader.iter_members(make_archive()))
+
+    assert members == {"pkg/__init__.py": b"", "pkg/api.py": b"import os\n"}
+
+
+def test_limits_and_bad_archives_are_rejected():
+    with pytest.raises(ArchiveLimitError):
+        list(ArchiveReader(max_members=2).iter_members(make_zip()))
+    with pytest.raises(ArchiveLimitError):
+        list(ArchiveReader(max_bytes=10).iter_members(make_tar()))
+    with pytest.raises(ArchiveError):
+        list(ArchiveReader().iter_members(io.BytesIO(b"not an archive")))
+
+
+def test_request_size_is_limited_before_and_while_reading():
+    reader = ArchiveReader(max_bytes=100)
+    received = []
+
+    async def body():
+        for _ in range(10):
+            received.append(b"x" * 30)
+            yield received[-1]
+
+    async def read():
+        return [chunk async for chunk in reader.limit_stream(body())]
+
+    reader.check_length("100")
+    reader.check_length(None)
+    with pytest.raises(ArchiveLimitError):
+        reader.check_length("101")
+    with pytest.raises(ArchiveLimitError):
+        asyncio.run(read())
+    assert len(received) == 4
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+import json
+
+from fastapi.testclient import TestClient
+
+from benchmarks.load_test import compare, percentile
+from benchmarks.mock_openai import MockSettings, create_app, detect_stage
+
+
+def chat(client: TestClient, prompt: str, **body):
+    messages = [{"role": "user", "content": prompt}]
+    return client.post("/v1/chat/completions", json={"model": "gpt-4.1", "messages": messages, **body})
+
+
+def test_percentiles_are_interpolated():
+    values = [float(value) for value in range(1, 101)]
+
+    assert percentile(values, 50) == 50.5
+    assert percentile(values, 99) == 99.01
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 95) == 0.0
+
+
+def test_stage_is_detected_from_response_schema():
+    assert detect_stage('{"code_style": {}, "solid_principles": {}}') == "fused"
+    assert detect_stage('{"SRP": "оценка"}') == "solid_principles"
+    assert detect_stage('{"issues": [], "recommendations": []}') == "symbols"
+    assert detect_stage('[{"type": "", "recommendation": ""}]') == "potential_issues"
+    assert detect_stage('["рекомендация 1"]') == "recommendations"
+
+
+def test_mock_answers_with_stage_json():
+    client = TestClient(create_app(MockSettings(latency=0, jitter=0)))
+
+    response = chat(client, 'Ответ в формате JSON: {"SRP": "оценка и объяснение"}')
+
+    body = response.json()
+    assert response.status_code == 200
+    assert body["choices"][0]["finish_reason"] == "stop"
+    assert set(json.loads(body["choices"][0]["message"]["content"])) == {"SRP", "OCP", "LSP", "ISP", "DIP"}
+    assert body["usage"]["total_tokens"] > 0
+
+
+def test_mock_rate_limits_and_truncates():
+    limited = TestClient(create_app(MockSettings(latency=0, jitter=0, rate_limit_rate=1.0, retry_after=2)))
+    truncated = TestClient(create_app(MockSettings(latency=0, jitter=0, truncation_rate=1.0)))
+
+    response = chat(limited, "[]")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+
+    choice = chat(truncated, '{"formatting": ""}').json()["choices"][0]
+    assert choice["finish_reason"] == "length"
+    assert not choice["message"]["content"].endswith("}")
+
+
+def test_mock_continues_truncated_answer():
+    client = TestClient(create_app(MockSettings(latency=0, jitter=0)))
+    prompt = 'Ответ в формате JSON: {"SRP": "оценка и объяснение"}'
+
+    head = chat(client, prompt, max_tokens=10).json()["choices"][0]
+    messages = [
+        {"role": "user", "content": prompt},
+        {"role": "assistant", "content": head["message"]["content"]},
+        {"role": "user", "content": "Продолжи"},
+    ]
+    tail = client.post("/v1/chat/completions", json={"model": "gpt-4.1", "messages": messages}).json()["choices"][0]
+
+    assert head["finish_reason"] == "length" and tail["finish_reason"] == "stop"
+    answer = json.loads(head["message"]["content"] + tail["message"]["content"])
+    assert set(answer) == {"SRP", "OCP", "LSP", "ISP", "DIP"}
+
+
+def test_mock_reports_cached_prompt_prefix():
+    client = TestClient(create_app(MockSettings(latency=0, jitter=0)))
+    code = "x = 1\n" * 1200
+
+    first = chat(client, code + '{"SRP": ""}').json()["usage"]
+    second = chat(client, code + '{"formatting": ""}').json()["usage"]
+
+    assert first["prompt_tokens_details"]["cached_tokens"] == 0
+    assert 1024 <= second["prompt_tokens_details"]["cached_tokens"] <= second["prompt_tokens"]
+    assert second["prompt_tokens_details"]["cached_tokens"] % 128 == 0
+
+
+def test_mock_streams_chunks_with_usage():
+    client = TestClient(create_app(MockSettings(latency=0, jitter=0)))
+
+    response = chat(client, '["рекомендация 1"]', stream=True, stream_options={"include_usage": True})
+
+    events = [line[len("data: ") :] for line in response.text.splitlines() if line.startswith("data: ")]
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(event) for event in events[:-1]]
+    content = "".join(choice["delta"].get("content") or "" for chunk in chunks for choice in chunk["choices"])
+    assert json.loads(content)
+    assert chunks[-2]["choices"][0]["finish_reason"] == "stop"
+    assert chunks[-1]["usage"]["total_tokens"] > 0
+
+
+def test_regressions_are_reported():
+    baseline = [
+        {"scenario": "analyze", "concurrency": 4, "throughput_rps": 100.0, "errors": 0, "latency_ms": {"p95": 50}}
+    ]
+    current = [
+        {"scenario": "analyze", "concurrency": 4, "throughput_rps": 70.0, "errors": 2, "latency_ms": {"p95": 55}}
+    ]
+
+    regressions = compare(current, baseline, max_regression=0.2)
+
+    assert len(regressions) == 2
+    assert compare(baseline, baseline, max_regression=0.2) == []
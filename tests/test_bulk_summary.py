@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+from smart_code_analyzer.backend.ai_analyzer import AIAnalyzer
+from smart_code_analyzer.backend.models import AIAnalysisResult
+
+
+def make_result(filename: str, score: float, **kwargs) -> AIAnalysisResult:
+    return AIAnalysisResult(
+        filename=filename,
+        code_style={},
+        solid_principles={},
+        potential_issues=[],
+        recommendations=[],
+        overall_score=score,
+        **kwargs,
+    )
+
+
+def test_summary_counts_files_and_score_distribution():
+    results = {
+        "a.py": make_result("a.py", 1.0, token_usage={"requests": 4, "total_tokens": 100}),
+        "b.py": make_result("b.py", 0.5, missing_stages=["code_style"], token_usage={"requests": 3}),
+        "c.py": make_result("c.py", 0.0, cached=True),
+    }
+
+    summary = AIAnalyzer.summarize_batch(results, {"d.py": "Код пуст"})
+
+    assert summary["total_files"] == 4
+    assert summary["analyzed"] == 3
+    assert summary["failed"] == 1
+    assert summary["partial"] == 1
+    assert summary["cached"] == 1
+    assert summary["score_mean"] == 0.5
+    assert summary["score_median"] == 0.5
+    assert summary["score_distribution"] == {"0.0-0.2": 1, "0.2-0.4": 0, "0.4-0.6": 1, "0.6-0.8": 0, "0.8-1.0": 1}
+    assert summary["token_usage"] == {"requests": 7, "total_tokens": 100}
+
+
+def test_summary_of_failed_batch_has_no_scores():
+    summary = AIAnalyzer.summarize_batch({}, {"a.py": "ошибка"})
+
+    assert summary["analyzed"] == 0
+    assert summary["score_mean"] is None
+    assert sum(summary["score_distribution"].values()) == 0
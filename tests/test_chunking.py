@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+from smart_code_analyzer.backend.chunking import build_skeleton, merge_issues, merge_recommendations, split_code
+
+CODE = "import os\n\n" + "\n\n".join(f"def f{i}(x):\n    '''Функция {i}.'''\n    return x * {i}\n" for i in range(40))
+
+
+def test_chunks_cover_file_and_respect_symbol_boundaries():
+    chunks = split_code(CODE, max_tokens=150)
+
+    assert len(chunks) > 1
+    assert "\n".join(chunk.text for chunk in chunks) == CODE
+    for chunk in chunks[1:]:
+        assert chunk.text.startswith("def ")
+    assert chunks[-1].end_line == len(CODE.split("\n"))
+
+
+def test_chunk_maps_lines_back_to_original_file():
+    chunk = split_code(CODE, max_tokens=150)[1]
+
+    assert chunk.map_line(str(chunk.start_line + 1)) == str(chunk.start_line + 1)
+    assert chunk.map_line("2") == str(chunk.start_line + 1)
+    assert chunk.map_line(chunk.text.split("\n")[2].strip()) == str(chunk.start_line + 2)
+
+
+def test_unparsable_code_is_split_by_lines():
+    chunks = split_code("x = (\n" * 200, max_tokens=50)
+
+    assert len(chunks) > 1
+    assert chunks[0].start_line == 1
+
+
+def test_skeleton_drops_function_bodies():
+    skeleton = build_skeleton(CODE)
+
+    assert "def f0(x):" in skeleton
+    assert "Функция 0." in skeleton
+    assert "return x" not in skeleton
+
+
+def test_merge_removes_duplicates():
+    issues = [
+        {"type": "Bug", "description": "Деление на ноль", "line": "12"},
+        {"type": "bug", "description": "деление  на ноль", "line": "12"},
+        {"type": "Bug", "description": "Деление на ноль", "line": "3"},
+    ]
+
+    assert [issue["line"] for issue in merge_issues(issues)] == ["3", "12"]
+    assert merge_recommendations(["Добавьте тесты", "добавьте тесты ", ""]) == ["Добавьте тесты"]
+
+
+def test_chunks_are_sized_with_the_given_token_counter():
+    # Счетчик, по которому каждый символ — токен: фрагменты должны получиться меньше, чем по грубой оценке
+    chunks = split_code(CODE, max_tokens=150, count_tokens=len)
+
+    assert len(chunks) > len(split_code(CODE, max_tokens=150))
+    assert all(len(chunk.text) <= 150 for chunk in chunks)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+import asyncio
+import gzip
+
+from smart_code_analyzer.backend.http_responses import (
+    FastJSONResponse,
+    ResponseOptimizationMiddleware,
+    accepted_encodings,
+    etag_matches,
+)
+from smart_code_analyzer.backend.models import AnalysisResponse
+
+BODY = FastJSONResponse({"main.py": AnalysisResponse(status="completed", data={"lines": 1}, html="<p></p>" * 500)})
+
+
+def _request(method="GET", **headers):
+    middleware = ResponseOptimizationMiddleware(BODY, minimum_size=100)
+    scope = {
+        "type": "http",
+        "method": method,
+        "headers": [(key.replace("_", "-").encode(), value.encode()) for key, value in headers.items()],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    return messages[0]["status"], dict(messages[0]["headers"]), messages[1]["body"]
+
+
+def test_json_is_rendered_with_nested_models():
+    assert BODY.body.startswith(b'{"main.py":{"status":"completed","data":{"lines":1}')
+
+
+def test_responses_are_compressed_and_revalidated():
+    status, headers, body = _request(accept_encoding="gzip")
+    assert status == 200
+    assert headers[b"content-encoding"] == b"gzip"
+    assert gzip.decompress(body) == BODY.body
+    etag = headers[b"etag"].decode()
+    assert etag.endswith('-gzip"')
+
+    status, headers, body = _request(accept_encoding="gzip", if_none_match=etag)
+    assert (status, body) == (304, b"")
+    assert headers[b"etag"].decode() == etag
+
+    status, headers, body = _request(method="POST", if_none_match=etag)
+    assert status == 200 and body == BODY.body
+    assert b"content-encoding" not in headers
+
+
+def test_header_parsing():
+    assert accepted_encodings("gzip;q=0.5, br") == {"gzip": 0.5, "br": 1.0}
+    assert etag_matches('W/"abc", "x"', '"abc"')
+    assert etag_matches('"abc-br"', '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+from concurrent.futures import ProcessPoolExecutor
+
+from smart_code_analyzer.backend.import_graph import build_import_graph, module_name, summarize_graph
+
+FILES = [
+    {"filename": "__init__.py", "relative_path": "pkg/api/__init__.py", "content": "from . import routes\n"},
+    {"filename": "routes.py", "relative_path": "pkg/api/routes.py", "content": "from ..models import user\n"},
+    {
+        "filename": "user.py",
+        "relative_path": "pkg/models/user.py",
+        "content": "import os\nfrom pkg.api import routes\n",
+    },
+    {"filename": "broken.py", "relative_path": "pkg/broken.py", "content": "def f(:\n"},
+    {"filename": "README.md", "relative_path": "README.md", "content": "# pkg"},
+]
+
+
+def test_module_names_follow_paths():
+    assert module_name("pkg/api/__init__.py") == "pkg.api"
+    assert module_name("./pkg/models/user.py") == "pkg.models.user"
+
+
+def test_graph_reports_cycles_fan_and_layer_violations():
+    report = build_import_graph(FILES).report()
+
+    assert report["modules"] == 4
+    assert report["cycles"] == [["pkg.api", "pkg.api.routes", "pkg.models.user"]]
+    assert report["fan_in"]["pkg.api.routes"] == 2
+    assert report["layer_violations"] == ["pkg.models.user -> pkg.api", "pkg.models.user -> pkg.api.routes"]
+    assert report["external"] == {"os": 1}
+    assert report["unparsed"] == ["pkg/broken.py"]
+
+
+def test_summary_lists_metrics_before_module_dependencies():
+    summary = summarize_graph(build_import_graph(FILES))
+
+    assert "Циклы импортов (1): {pkg.api, pkg.api.routes, pkg.models.user}" in summary
+    assert summary.index("Циклы импортов") < summary.index("Модули и их внутренние зависимости")
+    assert "- pkg.api: pkg.api.routes" in summary
+    assert "Другие файлы: README.md" in summary
+
+
+def test_graph_built_in_process_pool_matches_serial_graph():
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        report = build_import_graph(FILES, executor=executor).report()
+
+    assert report == build_import_graph(FILES).report()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+from smart_code_analyzer.backend.incremental import from_memo, group_symbols, module_context, split_symbols, to_memo
+
+CODE = "import os\n\n\ndef first():\n    return 1\n\n\nclass Second:\n    def method(self):\n        return os.sep\n"
+
+
+def test_symbols_follow_top_level_declarations():
+    symbols = split_symbols(CODE)
+
+    assert [symbol.name for symbol in symbols] == ["<module>", "first", "Second"]
+    assert symbols[2].contains("9") and not symbols[2].contains("3")
+    assert split_symbols("def broken(:\n") is None
+
+
+def test_memo_lines_follow_shifted_symbol():
+    symbol = split_symbols(CODE)[-1]
+    issue = {"type": "t", "description": "d", "line": "10", "recommendation": "r"}
+    memo = to_memo(symbol, [issue, {**issue, "line": "где-то"}], ["rec"])
+
+    shifted = split_symbols("# комментарий\n\n" + CODE)[-1]
+    restored = from_memo(shifted, memo)
+
+    assert shifted.chunk.text == symbol.chunk.text
+    assert [issue["line"] for issue in restored["issues"]] == ["12", "где-то"]
+    assert restored["recommendations"] == ["rec"]
+
+
+def test_group_and_context():
+    symbols = split_symbols(CODE)
+
+    assert len(group_symbols(symbols, max_tokens=10**6, count_tokens=len)) == 1
+    assert len(group_symbols(symbols, max_tokens=1, count_tokens=len)) == len(symbols)
+    assert module_context(CODE) == "import os\n# Объявлены в модуле: first, Second"
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+import asyncio
+
+import pytest
+
+from smart_code_analyzer.backend.jobs import JobQueue, QueueFullError
+from smart_code_analyzer.backend.result_store import ResultStore
+
+
+def test_job_lifecycle_is_visible_through_store(tmp_path):
+    async def scenario():
+        store = ResultStore(path=str(tmp_path / "store.sqlite3"))
+        queue = JobQueue(workers=1, max_queue=2, store=store)
+        await queue.start()
+
+        async def ok(job):
+            queue.set_progress(job, "code_style", "done")
+            return {"answer": 42}
+
+        async def fail(job):
+            raise RuntimeError("boom")
+
+        done, failed = queue.submit("ai-analyze", ok), queue.submit("ai-analyze", fail)
+        with pytest.raises(QueueFullError):
+            queue.submit("ai-analyze", ok)
+
+        await queue._queue.join()
+        await queue.stop()
+        return store, done.job_id, failed.job_id
+
+    store, done_id, failed_id = asyncio.run(scenario())
+
+    done = store.get_job(done_id)
+    assert done["status"] == "done"
+    assert done["result"] == {"answer": 42}
+    assert done["progress"] == {"code_style": "done"}
+    failed = store.get_job(failed_id)
+    assert failed["status"] == "failed"
+    assert failed["error"] == "boom"
+
+
+def test_stop_fails_running_and_queued_jobs(tmp_path):
+    async def scenario():
+        store = ResultStore(path=str(tmp_path / "store.sqlite3"))
+        queue = JobQueue(workers=1, max_queue=2, store=store)
+        await queue.start()
+        started = asyncio.Event()
+
+        async def hang(job):
+            started.set()
+            await asyncio.Event().wait()
+
+        running, queued = queue.submit("ai-analyze", hang), queue.submit("ai-analyze", hang)
+        await started.wait()
+        await queue.stop()
+        return store, running.job_id, queued.job_id
+
+    store, running_id, queued_id = asyncio.run(scenario())
+
+    assert store.get_job(running_id)["status"] == "failed"
+    queued = store.get_job(queued_id)
+    assert queued["status"] == "failed"
+    assert queued["error"] == "Задание не выполнено: приложение остановлено"
+    assert queued["started_at"] is None
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+import json
+
+import pytest
+
+from smart_code_analyzer.backend.json_stream import JSONStreamParser, continuation_text, loads_lenient
+
+FUSED = (
+    'Вот результат анализа:\n```json\n{"code_style": {"naming": "хорошо"}, '
+    '"potential_issues": [{"type": "bug", "line": "1"}, {"type": "скобка } в строке", "line": 2}], '
+    '"recommendations": ["первая", "вторая \\"в кавычках\\""]}\n```\nНадеюсь, это поможет.'
+)
+
+
+def test_items_are_emitted_as_soon_as_they_close():
+    parser = JSONStreamParser("{")
+    emitted = []
+    for start in range(0, len(FUSED), 5):
+        emitted.extend(parser.feed(FUSED[start : start + 5]))
+
+    assert emitted == [
+        (("potential_issues",), {"type": "bug", "line": "1"}),
+        (("potential_issues",), {"type": "скобка } в строке", "line": 2}),
+        (("recommendations",), "первая"),
+        (("recommendations",), 'вторая "в кавычках"'),
+    ]
+    value, complete = parser.result()
+    assert complete and value["code_style"] == {"naming": "хорошо"}
+
+
+def test_first_item_is_available_before_the_array_closes():
+    parser = JSONStreamParser("[")
+
+    assert parser.feed('[{"type": "a"}, {"ty') == [((), {"type": "a"})]
+    assert parser.feed('pe": "b"}]') == [((), {"type": "b"})]
+
+
+def test_valid_prefix_of_truncated_output_is_recovered():
+    assert loads_lenient('[{"a": 1}, {"a": 2}, {"a": "обре', "[") == ([{"a": 1}, {"a": 2}], False)
+    assert loads_lenient('{"SRP": "да", "OCP": "нет", "LSP": "час', "{") == ({"SRP": "да", "OCP": "нет"}, False)
+    assert loads_lenient('{"issues": [{"line": 3}], "recommendations": [{"li', "{") == (
+        {"issues": [{"line": 3}], "recommendations": []},
+        False,
+    )
+
+
+def test_malformed_output_keeps_items_before_the_error():
+    assert loads_lenient('[{"a": 1}, {"a": 2} {"a": 3}]', "[") == ([{"a": 1}, {"a": 2}], False)
+    assert loads_lenient('[1, 2, 3}, 4]', "[") == ([1, 2], False)
+    assert loads_lenient(json.dumps(["a", "b"])) == (["a", "b"], True)
+
+
+def test_text_without_json_is_an_error():
+    with pytest.raises(json.JSONDecodeError):
+        loads_lenient("Не могу проанализировать этот код", "[")
+    with pytest.raises(json.JSONDecodeError):
+        loads_lenient('{"a": 1}', "[")
+
+
+def test_continuation_is_stitched_without_repeats_and_fences():
+    head = '[{"type": "bug", "description": "Деление на но'
+    tail = 'ль"}, {"type": "style"}]'
+
+    issues = [{"type": "bug", "description": "Деление на ноль"}, {"type": "style"}]
+    assert json.loads(head + continuation_text(head, tail)) == issues
+    assert continuation_text(head, "описание: Деление на но" + tail) == "описание: Деление на но" + tail
+    assert continuation_text(head, '"description": "Деление на но' + tail) == tail
+    assert continuation_text(head, "```json\n" + tail) == tail
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+import importlib
+
+from fastapi.testclient import TestClient
+
+from smart_code_analyzer.backend.ai_analyzer import AIAnalyzer
+
+
+def test_one_analyzer_per_worker_is_reused_and_closed(monkeypatch, tmp_path):
+    for name, value in {
+        "OPENAI_API_KEY": "test",
+        "PROXYAPI_KEY": "test",
+        "AI_CACHE_PATH": "",
+        "RESULT_STORE_PATH": str(tmp_path / "store.sqlite3"),
+        "PARSE_POOL_WORKERS": "0",
+    }.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.delenv("AI_PROVIDERS", raising=False)
+    main = importlib.import_module("smart_code_analyzer.backend.main")
+    monkeypatch.setattr(main.settings, "AI_WARMUP", False)
+    created = []
+
+    class CountingAnalyzer(AIAnalyzer):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            created.append(self)
+
+    monkeypatch.setattr(main, "AIAnalyzer", CountingAnalyzer)
+
+    with TestClient(main.app) as client:
+        responses = [client.get("/analyzer/providers") for _ in range(3)]
+
+        assert [response.status_code for response in responses] == [200, 200, 200]
+        assert len(created) == 1
+        analyzer = created[0]
+        assert main.app.state.ai_analyzer is analyzer
+        assert analyzer.cache is main.app.state.ai_cache
+        assert not analyzer.http_client.is_closed
+
+    assert len(created) == 1
+    assert analyzer.http_client.is_closed
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+import asyncio
+import time
+
+from prometheus_client import REGISTRY
+
+from smart_code_analyzer.backend import metrics
+
+
+def test_parsing_labels_are_bucketed():
+    assert [metrics.files_label(count) for count in (1, 2, 10, 11, 500, 5000)] == [
+        "1",
+        "2-10",
+        "2-10",
+        "11-100",
+        "101-1000",
+        ">1000",
+    ]
+    assert metrics.size_label(1000) == "<=64KB"
+    assert metrics.size_label(2 * 1024 * 1024) == "<=16MB"
+    assert metrics.size_label(10**9) == ">16MB"
+
+
+def test_event_loop_lag_is_observed():
+    def samples() -> float:
+        return REGISTRY.get_sample_value("event_loop_lag_seconds_count") or 0.0
+
+    async def scenario():
+        monitor = asyncio.create_task(metrics.monitor_event_loop_lag(0.01))
+        await asyncio.sleep(0.02)
+        time.sleep(0.05)  # Блокирующая работа в цикле событий
+        await asyncio.sleep(0.05)
+        monitor.cancel()
+
+    before = samples()
+    asyncio.run(scenario())
+    assert samples() > before
+    assert REGISTRY.get_sample_value("event_loop_lag_seconds_bucket", {"le": "0.025"}) < samples()
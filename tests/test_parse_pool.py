@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List
+
+import pytest
+
+from smart_code_analyzer.backend import parse_pool
+from smart_code_analyzer.backend.parse_pool import ParsePool, merge_summaries, split_shards
+
+
+@dataclass
+class CodeData:
+    filename: str
+    lines: int
+    comments: int
+
+
+@dataclass
+class Entities:
+    classes: int = 0
+    functions: int = 0
+
+
+@dataclass
+class Summary:
+    total_files: int
+    total_lines: int
+    comment_lines: int
+    entities: Entities = field(default_factory=Entities)
+
+
+class BatchAnalyzer:
+    """Анализатор, сводка которого — счетчики по разобранным файлам"""
+
+    batches: List[List[str]] = []
+
+    def __init__(self, processor):
+        self.summary = None
+
+    async def analyze_files(self, files):
+        datas = []
+        for f in files:
+            data = await f.read()
+            datas.append(CodeData(f.filename, data.count(b"\n"), data.count(b"#")))
+        self.batches.append([data.filename for data in datas])
+        self.summary = Summary(
+            total_files=len(datas),
+            total_lines=sum(data.lines for data in datas),
+            comment_lines=sum(data.comments for data in datas),
+            entities=Entities(classes=len(datas), functions=2 * len(datas)),
+        )
+        return datas
+
+    def get_summary(self):
+        return self.summary
+
+
+class Formatter:
+    def format(self, data):
+        return f"<pre>{getattr(data, 'filename', 'summary')}</pre>"
+
+
+def test_shards_are_balanced_and_keep_order():
+    uploads = [("a.py", b"x" * 100), ("b.py", b"x" * 10), ("c.py", b"x" * 90), ("d.py", b"x" * 20)]
+
+    shards = split_shards(uploads, 2)
+
+    assert sorted(name for shard in shards for name, _ in shard) == ["a.py", "b.py", "c.py", "d.py"]
+    assert [sum(len(data) for _, data in shard) for shard in shards] == [110, 110]
+    assert all([name for name, _ in shard] == sorted(name for name, _ in shard) for shard in shards)
+    assert len(split_shards(uploads[:1], 8)) == 1
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_pooled_summary_matches_serial_summary(monkeypatch, stream):
+    for name, value in {
+        "FileBatchAnalyzer": BatchAnalyzer,
+        "HtmlFormatter": Formatter,
+        "HtmlSummaryFormatter": Formatter,
+        "STREAM_SHARD_BYTES": 64,
+    }.items():
+        monkeypatch.setattr(parse_pool, name, value)
+    monkeypatch.setattr(BatchAnalyzer, "batches", [])
+    uploads = [(f"m{i}.py", b"# x\nx = 1\n" * (i * 7 % 11 + 1)) for i in range(12)]
+
+    async def run(pool):
+        if stream:
+            return await pool.analyze_stream(iter(uploads))
+        return await pool.analyze(uploads)
+
+    serial = asyncio.run(run(ParsePool(workers=0)))
+    pool = ParsePool(workers=0)
+    # Пул потоков вместо процессов: подмененный анализатор виден разбору частей
+    pool.workers, pool.executor = 3, ThreadPoolExecutor(max_workers=3)
+    BatchAnalyzer.batches.clear()
+    try:
+        pooled = asyncio.run(run(pool))
+    finally:
+        pool.shutdown()
+
+    assert pooled == serial
+    assert pooled[1]["entities"] == {"classes": 12, "functions": 24}
+    # Каждый файл разбирается один раз: сводка собирается из сводок частей, а не повторным разбором
+    assert len(BatchAnalyzer.batches) > 1
+    assert sorted(name for batch in BatchAnalyzer.batches for name in batch) == sorted(name for name, _ in uploads)
+
+
+def test_summaries_without_merge_rule_are_rejected():
+    @dataclass
+    class Averages:
+        total_files: int
+        average_lines: float
+
+    assert merge_summaries([Averages(2, 1.0)]) == Averages(2, 1.0)
+    with pytest.raises(TypeError, match="average_lines"):
+        merge_summaries([Averages(2, 1.0), Averages(1, 4.0)])
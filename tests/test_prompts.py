@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+import json
+import os
+
+from smart_code_analyzer.backend.prompts import PROMPTS, SYSTEM_PROMPT, render_prompt
+
+CODE = "def handler(event):\n    return {'status': event['status']}\n"
+PARAMS = {"documentation": "", "static_note": "", "title": "handler (строки 1-2)"}
+
+
+def test_code_comes_before_the_stage_question():
+    for name in PROMPTS:
+        system, user = render_prompt(name, CODE, **PARAMS)
+        content = user["content"]
+
+        assert system == {"role": "system", "content": SYSTEM_PROMPT}
+        assert content.index(CODE) < content.index("JSON")
+
+
+def test_stages_share_the_prompt_prefix_up_to_the_question():
+    prompts = [
+        render_prompt(name, CODE, **PARAMS)[1]["content"]
+        for name in ("solid_principles", "potential_issues", "recommendations", "fused")
+    ]
+    prefix = os.path.commonprefix(prompts)
+
+    assert prefix == "Код для анализа:\n" + CODE + "\n\n"
+    assert render_prompt("symbols", CODE, context="import os", **PARAMS)[1]["content"].startswith(
+        "Контекст модуля (анализировать его не нужно):\nimport os\n\nКод для анализа:\n" + CODE
+    )
+
+
+def test_response_schemas_are_valid_json():
+    for name in ("solid_principles", "fused", "symbols", "package"):
+        content = render_prompt(name, CODE, **PARAMS)[1]["content"]
+        question = content[len(content) - content[::-1].index("\n\n") :]
+        schema = question[question.index("{") : question.rindex("}") + 1]
+
+        assert isinstance(json.loads(schema), dict)
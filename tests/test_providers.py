@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from smart_code_analyzer.backend.providers import LatencyStats, Provider, ProviderPool
+
+
+def api_error(status_code: int) -> openai.APIStatusError:
+    response = httpx.Response(status_code, request=httpx.Request("POST", "http://api/chat"))
+    return openai.APIStatusError("error", response=response, body=None)
+
+
+def chunk(content=None, finish_reason=None, usage=None):
+    choices = [] if usage else [SimpleNamespace(delta=SimpleNamespace(content=content), finish_reason=finish_reason)]
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class FakeStream:
+    """Потоковый ответ: части текста с паузой перед каждой"""
+
+    def __init__(self, parts, pause: float):
+        self.parts = parts
+        self.pause = pause
+        self.closed = False
+
+    async def __aiter__(self):
+        for part in self.parts:
+            await asyncio.sleep(self.pause)
+            yield chunk(part)
+        yield chunk(finish_reason="stop")
+        yield chunk(usage=SimpleNamespace(prompt_tokens=3, completion_tokens=len(self.parts), total_tokens=5))
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    """Клиент с заданной задержкой и ошибкой: запоминает запросы и отмены"""
+
+    def __init__(self, name: str, delay: float = 0.0, error: Exception = None):
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.calls = []
+        self.cancelled = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        if kwargs.get("stream"):
+            return FakeStream([self.name, "-", "ответ"], pause=self.delay)
+        return self.name
+
+
+def pool_of(*clients, **options) -> ProviderPool:
+    providers = [Provider(client.name, client, priority=index) for index, client in enumerate(clients)]
+    return ProviderPool(providers, **options)
+
+
+def test_latency_percentiles():
+    stats = LatencyStats(window=3)
+    for seconds in (5.0, 1.0, 2.0, 3.0):
+        stats.record(seconds)
+
+    assert stats.count == 3
+    assert stats.percentile(50) == 2.0
+    assert stats.percentile(95) == 3.0
+    assert LatencyStats().percentile(50) is None
+
+
+def test_fails_over_to_next_provider_and_excludes_unhealthy():
+    async def scenario():
+        primary, secondary = FakeClient("primary", error=api_error(503)), FakeClient("secondary")
+        pool = pool_of(primary, secondary, failure_threshold=2, cooldown=60)
+
+        assert await pool.complete(model="gpt-4.1") == "secondary"
+        assert await pool.complete(model="gpt-4.1") == "secondary"
+        assert [provider.name for provider in pool.ranked()] == ["secondary", "primary"]
+        assert await pool.complete(model="gpt-4.1") == "secondary"
+        assert len(primary.calls) == 2
+
+    asyncio.run(scenario())
+
+
+def test_client_errors_are_not_failed_over():
+    async def scenario():
+        primary, secondary = FakeClient("primary", error=api_error(400)), FakeClient("secondary")
+
+        with pytest.raises(openai.APIStatusError):
+            await pool_of(primary, secondary).complete(model="gpt-4.1")
+        assert secondary.calls == []
+
+    asyncio.run(scenario())
+
+
+def test_slow_primary_is_hedged_and_loser_cancelled():
+    async def scenario():
+        primary, secondary = FakeClient("primary"), FakeClient("secondary")
+        pool = pool_of(primary, secondary, hedge_min_samples=5, hedge_min_delay=0.0)
+        for _ in range(5):
+            await pool.complete(stage="recommendations", model="gpt-4.1")
+        assert secondary.calls == []
+
+        primary.delay = 1.0
+        assert await pool.complete(stage="recommendations", model="gpt-4.1") == "secondary"
+        assert primary.cancelled == 1
+
+    asyncio.run(scenario())
+
+
+def test_hedge_threshold_is_kept_per_model():
+    async def scenario():
+        primary, secondary = FakeClient("primary"), FakeClient("secondary")
+        pool = pool_of(primary, secondary, hedge_min_samples=5, hedge_min_delay=0.0)
+        for _ in range(5):
+            await pool.complete(stage="solid_principles", model="gpt-4.1-mini")
+
+        primary.delay = 0.2
+        assert await pool.complete(stage="solid_principles", model="gpt-4.1") == "primary"
+        assert secondary.calls == []
+        assert pool.hedge_delay(pool.providers[0], "solid_principles", "gpt-4.1") is None
+
+    asyncio.run(scenario())
+
+
+def test_provider_maps_requested_models():
+    async def scenario():
+        local = FakeClient("local")
+        models = {"gpt-4.1": "qwen2.5-coder:32b", "gpt-4.1-mini": "qwen2.5-coder:7b"}
+        pool = ProviderPool([Provider("local", local, model="qwen2.5-coder:7b", models=models)])
+
+        await pool.complete(model="gpt-4.1", messages=[])
+        await pool.complete(model="gpt-4.1-mini", messages=[])
+        await pool.complete(model="gpt-4o", messages=[])
+        await pool.complete(messages=[])
+
+        assert [call["model"] for call in local.calls] == [
+            "qwen2.5-coder:32b",
+            "qwen2.5-coder:7b",
+            "gpt-4o",
+            "qwen2.5-coder:7b",
+        ]
+        assert pool.snapshot()[0]["latency_ms"]["other:gpt-4.1"]["samples"] == 1
+        assert pool.snapshot()[0]["latency_ms"]["all"]["samples"] == 4
+
+    asyncio.run(scenario())
+
+
+def test_stream_deltas_come_from_one_provider_and_are_assembled():
+    async def scenario():
+        primary, secondary = FakeClient("primary"), FakeClient("secondary")
+        pool = pool_of(primary, secondary, hedge_min_samples=1, hedge_min_delay=0.0)
+        await pool.complete(stage="fused", model="gpt-4.1")
+
+        primary.delay = 0.5
+        deltas = []
+        response = await pool.complete(stage="fused", on_delta=deltas.append, model="gpt-4.1")
+
+        assert deltas == ["secondary", "-", "ответ"]
+        assert response.choices[0].message.content == "secondary-ответ"
+        assert response.choices[0].finish_reason == "stop"
+        assert response.usage.total_tokens == 5
+        assert secondary.calls[0]["stream"] is True
+        assert primary.cancelled == 1
+
+    asyncio.run(scenario())
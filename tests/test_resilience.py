@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from smart_code_analyzer.backend.resilience import (
+    AdaptiveConcurrencyLimiter,
+    CircuitBreaker,
+    CircuitOpenError,
+    RequestGuard,
+    TokenBucket,
+    parse_retry_after,
+)
+
+
+def api_error(status_code: int, headers=None) -> openai.APIStatusError:
+    response = httpx.Response(status_code, headers=headers, request=httpx.Request("POST", "http://api/chat"))
+    error_class = openai.RateLimitError if status_code == 429 else openai.APIStatusError
+    return error_class("error", response=response, body=None)
+
+
+def failing_then_ok(errors):
+    calls = []
+
+    async def func():
+        calls.append(time.monotonic())
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return "ok"
+
+    return func, calls
+
+
+def test_retries_rate_limit_and_server_errors_honoring_retry_after():
+    async def scenario():
+        guard = RequestGuard(max_retries=3, base_delay=0.01, max_delay=1.0, max_concurrency=8)
+        func, calls = failing_then_ok([api_error(429, {"retry-after-ms": "200"}), api_error(503)])
+
+        assert await guard.call(func) == "ok"
+        assert len(calls) == 3
+        assert calls[1] - calls[0] >= 0.2
+        assert guard.limiter.limit < 8
+
+    asyncio.run(scenario())
+
+
+def test_client_errors_are_not_retried():
+    async def scenario():
+        guard = RequestGuard(max_retries=3, base_delay=0.01)
+        func, calls = failing_then_ok([api_error(400)])
+
+        with pytest.raises(openai.APIStatusError):
+            await guard.call(func)
+        assert len(calls) == 1
+
+    asyncio.run(scenario())
+
+
+def test_circuit_breaker_fails_fast_and_recovers():
+    async def scenario():
+        guard = RequestGuard(max_retries=0, breaker_threshold=2, breaker_reset=0.2)
+        func, calls = failing_then_ok([api_error(500), api_error(500)])
+
+        for _ in range(2):
+            with pytest.raises(openai.APIStatusError):
+                await guard.call(func)
+        assert guard.breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            await guard.call(func)
+        with pytest.raises(CircuitOpenError):
+            guard.ensure_available()
+        assert len(calls) == 2
+
+        await asyncio.sleep(0.25)
+        assert guard.breaker.state == CircuitBreaker.HALF_OPEN
+        assert await guard.call(func) == "ok"
+        assert guard.breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_adaptive_limiter_decreases_and_recovers():
+    limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=8, cooldown=0.0)
+
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.limit == 2
+    for _ in range(20):
+        limiter.on_success()
+    assert 2 < limiter.limit <= 8
+
+
+def test_token_bucket_waits_for_refill():
+    async def scenario():
+        bucket = TokenBucket(600, "rpm")
+        await bucket.acquire(600)
+        started = time.monotonic()
+        await bucket.acquire(1)
+        assert time.monotonic() - started >= 0.09
+
+    asyncio.run(scenario())
+
+
+def test_parse_retry_after():
+    assert parse_retry_after({"retry-after": "3"}) == 3.0
+    assert parse_retry_after({"retry-after-ms": "1500"}) == 1.5
+    assert parse_retry_after({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0.0
+    assert parse_retry_after({}) is None
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+from smart_code_analyzer.backend.result_store import ResultStore
+
+
+def _results(*names, content="x = 1\n"):
+    results = {name: {"status": "completed", "data": {"filename": name, "file_content": content}} for name in names}
+    results["summary"] = {"status": "completed", "data": {"total": len(names)}, "html": "<div></div>"}
+    return results
+
+
+def test_analyses_are_isolated_and_contents_deduplicated(tmp_path):
+    store = ResultStore(path=str(tmp_path / "store.sqlite3"))
+    first = store.save_analysis(_results("a.py", "b.py"))
+    second = store.save_analysis(_results("a.py", content="y = 2\n"))
+
+    assert store.get_file_content(first, "a.py") == "x = 1\n"
+    assert store.get_file_content(second, "a.py") == "y = 2\n"
+    assert store.get_file_contents(first) == {"a.py": "x = 1\n", "b.py": "x = 1\n"}
+    assert store.get_analysis(first)["summary"]["data"] == {"total": 2}
+
+
+def test_limits_evict_oldest_analyses(tmp_path):
+    store = ResultStore(path=str(tmp_path / "store.sqlite3"), max_analyses=2)
+    ids = [store.save_analysis(_results("a.py", content=f"x = {i}\n")) for i in range(3)]
+
+    assert not store.exists(ids[0])
+    assert store.exists(ids[1]) and store.exists(ids[2])
+
+
+def test_html_counts_towards_the_size_limit(tmp_path):
+    store = ResultStore(path=str(tmp_path / "store.sqlite3"), max_bytes=1000)
+    first = store.save_analysis(_results("a.py"))
+    second = store.save_analysis(_results("a.py", content="y = 2\n"))
+    assert store.exists(first)
+
+    store.set_file_html(second, 0, "<pre>" + "x" * 1000 + "</pre>")
+
+    assert not store.exists(first)
+    assert store.get_file(second, 0)["html"].startswith("<pre>")
+
+
+def test_expired_analyses_are_not_served(tmp_path):
+    store = ResultStore(path=str(tmp_path / "store.sqlite3"), ttl=-1)
+    analysis_id = store.save_analysis(_results("a.py"))
+
+    assert store.get_file_content(analysis_id, "a.py") is None
+    assert store.get_analysis(analysis_id) is None
+
+
+def test_index_pages_files_and_html_is_stored_on_demand(tmp_path):
+    store = ResultStore(path=str(tmp_path / "store.sqlite3"))
+    analysis_id = store.save_analysis(_results("a.py", "b.py", "c.py"))
+
+    index = store.get_index(analysis_id, offset=1, limit=1)
+    assert index["total"] == 3
+    assert index["summary"]["data"] == {"total": 3}
+    assert index["files"] == [{"file_id": 1, "filename": "b.py", "status": "completed", "size": 6, "html_ready": False}]
+
+    assert store.get_file(analysis_id, 1)["data"] == {"filename": "b.py", "file_content": "x = 1\n"}
+    store.set_file_html(analysis_id, 1, "<pre>b</pre>")
+    assert store.get_file(analysis_id, 1)["html"] == "<pre>b</pre>"
+    assert store.get_index(analysis_id)["files"][1]["html_ready"] is True
+    assert store.get_file(analysis_id, 3) is None
+    assert store.get_index("missing") is None
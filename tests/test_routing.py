@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+from smart_code_analyzer.backend.routing import ComplexitySignals, ModelRouter, measure_complexity, plan_key
+
+SIMPLE = '''
+def add(a, b):
+    return a + b
+'''
+
+BRANCHY = '''
+class Parser:
+    def parse(self, items):
+        for item in items:
+            if item and item.ok or item is None:
+                continue
+            while item.next:
+                item = item.next
+        return [x for x in items if x]
+
+
+class Writer:
+    pass
+'''
+
+
+def test_signals_are_measured_from_ast():
+    simple = measure_complexity(SIMPLE, "gpt-4.1")
+    branchy = measure_complexity(BRANCHY, "gpt-4.1")
+
+    assert simple.parsed and simple.functions == 1 and simple.max_complexity == 1
+    assert branchy.classes == 2
+    # 1 + for + if + and/or (2) + while + comprehension с условием (2)
+    assert branchy.max_complexity == 8
+    assert not measure_complexity("function f() { return 1; }", "gpt-4.1").parsed
+
+
+def test_simple_files_go_to_fast_model_and_decisions_have_reasons():
+    router = ModelRouter("gpt-4.1", "gpt-4.1-mini", max_classes=1, strong_stages=["potential_issues"])
+    simple = measure_complexity(SIMPLE, "gpt-4.1")
+    branchy = measure_complexity(BRANCHY, "gpt-4.1")
+
+    plan = router.plan(("code_style", "potential_issues"), simple)
+
+    assert (plan["code_style"].model, plan["code_style"].reason) == ("gpt-4.1-mini", "simple")
+    assert (plan["potential_issues"].model, plan["potential_issues"].reason) == ("gpt-4.1", "strong_stage")
+    assert router.route("code_style", branchy).reason == "classes"
+    assert router.route("symbols", ComplexitySignals(lines=10, tokens=50)).reason == "strong_stage"
+
+
+def test_plan_key_matches_default_model_when_nothing_is_routed():
+    router = ModelRouter("gpt-4.1", "gpt-4.1-mini", max_tokens=10)
+    big = ComplexitySignals(lines=5, tokens=100)
+    small = ComplexitySignals(lines=5, tokens=5)
+
+    assert plan_key(router.plan(("code_style", "recommendations"), big), "gpt-4.1") == "gpt-4.1"
+    assert plan_key(router.plan(("code_style",), small), "gpt-4.1") == "code_style=gpt-4.1-mini"
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+from smart_code_analyzer.backend.static_analyzer import MAX_CLASS_METHODS, MAX_FUNCTION_LINES, analyze_static
+
+CODE = (
+    '''"""Модуль."""
+
+
+def collect(item, items=[], *, seen={}):
+    """Сбор элементов."""
+    try:
+        items.append(item)
+    except:
+        pass
+    return items
+
+
+def BadName():
+    return None
+
+
+class Service:
+    """Сервис."""
+
+'''
+    + "\n".join(f"    def method_{i}(self):\n        return {i}\n" for i in range(MAX_CLASS_METHODS + 1))
+    + '''
+
+def long_function():
+    """Длинная функция."""
+'''
+    + "\n".join(f"    x{i} = {i}" for i in range(MAX_FUNCTION_LINES))
+    + "\n"
+)
+
+
+def issue_types(findings):
+    return [issue["type"] for issue in findings.issues]
+
+
+def test_deterministic_issues_are_found_with_lines():
+    findings = analyze_static(CODE)
+    lines = CODE.split("\n")
+
+    assert issue_types(findings).count("Изменяемое значение по умолчанию") == 2
+    assert "Голый except" in issue_types(findings)
+    assert "Слишком много методов" in issue_types(findings)
+    assert "Слишком длинная функция" in issue_types(findings)
+    bare_except = next(issue for issue in findings.issues if issue["type"] == "Голый except")
+    assert lines[int(bare_except["line"]) - 1].strip() == "except:"
+    assert [int(issue["line"]) for issue in findings.issues] == sorted(int(issue["line"]) for issue in findings.issues)
+
+
+def test_style_and_srp_assessments():
+    findings = analyze_static(CODE)
+
+    assert "BadName" in findings.documentation
+    assert "method_0" in findings.documentation
+    assert "функция BadName" in findings.naming
+    assert "long_function" in findings.structure
+    assert findings.srp.lower().startswith("не соответствует")
+    assert findings.code_style()["formatting"] == findings.solid_principles()["OCP"]
+    assert any("Перехватывайте конкретные исключения" in rec for rec in findings.recommendations)
+
+
+def test_clean_code_has_no_findings():
+    findings = analyze_static('"""Модуль."""\n\n\ndef add(a, b=None):\n    """Сумма."""\n    return a + (b or 0)\n')
+
+    assert findings.issues == []
+    assert findings.documentation.startswith("Хорошо")
+    assert findings.naming.startswith("Хорошо")
+
+
+def test_non_python_code_is_skipped():
+    assert analyze_static("function f() { return 1; }") is None
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------------------------------------------------------
+import ast
+
+import pytest
+
+from smart_code_analyzer.backend.token_budget import TRUNCATION_MARKER, compact_code, count_tokens, truncate_to_tokens
+
+CODE = '''"""Модуль.
+
+Подробное описание модуля на несколько строк.
+"""
+# Таблица кодов
+CODES = {"a": 1, "b": 2, "c": 3, "d": 4, "e": 5, "f": 6, "g": 7, "h": 8, "i": 9, "j": 10}
+
+
+def process(value):  # обработка значения
+    """Обработка значения.
+
+    Длинное описание, которое не нужно для проверки SOLID.
+    """
+
+
+    # Возвращаем результат
+    return CODES.get(value)
+'''
+
+
+def test_style_stage_keeps_comments_and_docstrings():
+    compacted = compact_code(CODE, "code_style")
+
+    assert "# обработка значения" in compacted
+    assert "Длинное описание" in compacted
+    assert '"j": 10' not in compacted
+    assert "еще 7 элементов" in compacted
+
+
+def test_solid_stage_strips_comments_and_shortens_docstrings():
+    compacted = compact_code(CODE, "solid_principles")
+
+    assert "#" not in compacted.replace("# еще", "")
+    assert "Длинное описание" not in compacted
+    assert '"""Обработка значения."""' in compacted
+    assert "\n\n\n" not in compacted
+    assert "return CODES.get(value)" in compacted
+    assert count_tokens(compacted, "gpt-4.1") < count_tokens(CODE, "gpt-4.1")
+
+
+def test_preserve_lines_keeps_line_numbers():
+    compacted = compact_code(CODE, "potential_issues", preserve_lines=True)
+
+    assert len(compacted.split("\n")) == len(CODE.split("\n"))
+    line = CODE.split("\n").index("    return CODES.get(value)")
+    assert compacted.split("\n")[line] == "    return CODES.get(value)"
+
+
+def test_code_after_shortened_literal_is_kept():
+    code = (
+        "x = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]; y = 1\nprint(f([0] * 2, (1, 2, 3, 4, 5, 6, 7, 8, 9)), end='')  # вывод\n"
+    )
+
+    style = compact_code(code, "code_style")
+    solid = compact_code(code, "solid_principles")
+
+    assert style.split("\n")[:2] == [
+        "x = [1, 2, 3, ...]; y = 1  # еще 7 элементов",
+        "print(f([0] * 2, (1, 2, 3, ...)), end='')  # вывод  # еще 6 элементов",
+    ]
+    assert solid == "x = [1, 2, 3, ...]; y = 1\nprint(f([0] * 2, (1, 2, 3, ...)), end='')"
+    compile(style, "<compacted>", "exec")
+
+
+@pytest.mark.parametrize("stage", ["code_style", "solid_principles"])
+def test_compacted_code_stays_valid_python(stage):
+    code = (
+        'def f():\n    """Первая строка заканчивается кавычкой "\\\\"\n\n    Подробности.\n    """\n'
+        "d = {" + ", ".join(f"'k{i}': {i}" for i in range(12)) + "}\n"
+        "e = {**base, " + ", ".join(f"'k{i}': {i}" for i in range(10)) + "}\n"
+        "(a, b, c, d, e, f, g, h, i, j) = range(10)\n"
+        "[a, b, c, d, e, f, g, h, i, j] = range(10)\n"
+        "for a, b, c, d, e, f, g, h, i, j in rows: pass\n"
+        "x = m[1:2, 3, 4, 5, 6, 7, 8, 9, 10, 11]\n"
+        "s = f'{[1, 2, 3, 4, 5, 6, 7, 8, 9, 10]}'\n"
+    )
+
+    compacted = compact_code(code, stage)
+
+    compile(compacted, "<compacted>", "exec")
+    assert "d = {'k0': 0, 'k1': 1, 'k2': 2, '...': ...}" in compacted
+    assert "e = {**base, 'k0': 0, 'k1': 1, '...': ...}" in compacted
+    assert "(a, b, c, d, e, f, g, h, i, j) = range(10)" in compacted
+
+
+def test_docstring_ending_in_quote_is_shortened_to_valid_string():
+    code = 'def f():\n    """Вернуть "ok"\n\n    Подробности.\n    """\n'
+
+    compacted = compact_code(code, "solid_principles")
+
+    compile(compacted, "<compacted>", "exec")
+    assert ast.get_docstring(ast.parse(compacted).body[0]) == 'Вернуть "ok"'
+
+
+def test_unparsable_code_is_returned_without_changes():
+    code = "def broken(:\n    # комментарий\n    pass"
+
+    assert compact_code(code, "code_style") == code
+
+
+def test_truncate_to_tokens_respects_ceiling():
+    code = "\n".join(f"x{i} = {i}" for i in range(1000))
+
+    truncated = truncate_to_tokens(code, 100, "gpt-4.1")
+
+    assert count_tokens(truncated, "gpt-4.1") <= 100
+    assert truncated.endswith(TRUNCATION_MARKER)
+    assert truncate_to_tokens("x = 1", 100, "gpt-4.1") == "x = 1"